@@ -82,6 +82,7 @@ class TextBanner:
 
 
 @Cog.export
+@Cog.single_shard
 class BannerCog(Cog):
     """Handle a guilds banner channels."""
     klass: T = TextBanner
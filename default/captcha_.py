@@ -37,22 +37,21 @@ class Captcha(Cog):
 
     # Internals
 
-    def _generate_captcha(self) -> Tuple[Path, str]:
+    @Cog.cpu_bound
+    def _generate_captcha() -> Tuple[Path, str]:
         """Generate a secret and an image captcha."""
         secret = "".join(choice(ASCII) for _ in range(8))
 
         desc, filepath = mkstemp(suffix=".png")
         close(desc)
 
-        self.__captcha.write(secret, filepath)
+        Captcha.__captcha.write(secret, filepath)
 
         return Path(filepath), secret
 
     async def _start_flow(self, member: Member, invite: Optional[Invite] = None):
         """Begin the captcha flow for a given :class:`discord.Member`."""
-        path, secret = await self.client.loop.run_in_executor(
-            None, self._generate_captcha
-        )
+        path, secret = await self._generate_captcha()
 
         self.client.logger.info(
             "Started captcha auth flow for %s with secret %s", str(member), repr(secret)
@@ -13,12 +13,18 @@ __all__ = ("Disassembler",)
 class Disassembler(Cog):
     """Interactively disassemble Python code."""
 
-    @Cog.regex(r"^(?:dis(?:assemble)?) ((```)|(`))(?(2)(?:py(?:thon)?)\n|)(?P<source>[\w\W]{1,2000})\1$")
-    async def disassemble(self, message: Message, *, source: str) -> None:
-        """Disassemble some Python source."""
+    @Cog.cpu_bound
+    def _disassemble(source: str) -> str:
+        """Disassemble some Python source into a string."""
         output = StringIO()
 
         with redirect_stdout(output):
-            dis(source.strip("`"))
+            dis(source)
+
+        return output.getvalue()
 
-        await message.channel.send(codeblock(output.getvalue(), style="py"))
+    @Cog.regex(r"^(?:dis(?:assemble)?) ((```)|(`))(?(2)(?:py(?:thon)?)\n|)(?P<source>[\w\W]{1,2000})\1$")
+    async def disassemble(self, message: Message, *, source: str) -> None:
+        """Disassemble some Python source."""
+        output = await self._disassemble(source.strip("`"))
+        await message.channel.send(codeblock(output, style="py"))
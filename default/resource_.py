@@ -29,7 +29,9 @@ class Resource(Cog):
         self._hook_lock = Event()
         self._temporary_paths = set()
         self._filepath_cache = {}
-        self.client.schedule_task(self._hook_index_paths(self._paths))
+
+    async def cog_setup(self):
+        await self._hook_index_paths(self._paths)
 
     @Cog.destructor
     def _remove_stubs(self) -> None:
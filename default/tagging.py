@@ -46,8 +46,7 @@ class Tagging(Cog):
 
     _repository_url: str = ConfigValue("default", "tagging", "repository")
 
-    @Cog.task
-    async def __ainit__(self):
+    async def cog_setup(self):
         repository_path: str = mkdtemp()
         path = await clone_repository(self._repository_url, repository_path)
         self.logger.info("Cloned tagging repository into %s", repr(path))
@@ -1,6 +1,7 @@
 import os
 import asyncio
 import sys
+import time
 from functools import partial
 from asyncio import run as await_
 from pathlib import Path
@@ -19,6 +20,10 @@ from ep import (
     get_logger,
     infer_token,
 )
+from ep.bench import KINDS, gateway_payloads, parse_mix, run as run_bench, run_codecs, run_predicates
+from ep.core.codec import CODECS, COMPRESSIONS
+from ep.core.replay import GatewayReplayer, read_log
+from ep.core.shard import ShardSupervisor
 
 __all__ = ("Mutex", "main")
 
@@ -46,17 +51,27 @@ class Mutex(click.Option):
 
 
 # Process arguments
-@click.command()
+@click.group(invoke_without_command=True)
 @click.option("-c", "--config-path", cls=Mutex, type=Path, not_required_if=["generate_config"])
 @click.option("-C", "--generate-config", is_flag=True, cls=Mutex, not_required_if=["config_path"])
 @click.option("--disable", is_flag=True, default=False)
 @click.option("--ws-port", type=int, default=WebsocketServer.port)
 @click.option("--ws-addr", type=str, default=WebsocketServer.host)
+@click.option("--profile", type=Path, default=None, help="Sample the event loop and write a folded stack profile here.")
+@click.option("--shards", type=int, default=None, help="Run this many shards, each in its own process.")
 # Configuration overloads
 @click.option("--socket-channel", type=str, default=None)
 @click.option("--socket-emit", type=bool, default=None)
 @click.option("--cog-path", type=Path, default=None)
+@click.option("--eager-dispatch", type=bool, default=None)
+@click.option("--lazy-cogs", type=bool, default=None)
+@click.option("--hot-reload", type=bool, default=None)
+@click.option("--watch-config", type=bool, default=None)
+@click.option("--record", type=str, default=None)
 def main(**kwargs):  # fmt: on
+    if click.get_current_context().invoked_subcommand is not None:
+        return
+
     if kwargs["generate_config"]:
         print(Config.default)
         return
@@ -77,16 +92,129 @@ def main(**kwargs):  # fmt: on
         for value in overloads
         if kwargs.get(value, None) is not None
     ]:
-        config["ep"][key] = value
+        config.override("ep", key, value=value)
 
 
     get_logger(
         "discord", "WARN", fmt="[[ discord ]] [%(asctime)s] %(levelname)s - %(message)s"
     )
 
-    config["disabled"] = disable = kwargs["disable"]
+    disable = kwargs["disable"]
+    config.override("disabled", value=disable)
+
+    if kwargs["shards"] is not None:
+        if kwargs["profile"] is not None:
+            raise UsageError("Illegal usage: `profile` is mutually exclusive with shards.")
+
+        ShardSupervisor(config, kwargs["shards"]).run()
+        return
+
     with Client(config=config, disable=disable) as client:
-        client.run()
+        if kwargs["profile"] is not None:
+            client.profiler.start()
+
+        try:
+            client.run()
+        finally:
+            if kwargs["profile"] is not None:
+                client.profiler.stop()
+                client.profiler.dump(kwargs["profile"])
+
+
+@main.command()
+@click.option("-m", "--mix", "mixes", multiple=True, help='A handler mix such as "event=2,regex=10", may be repeated.')
+@click.option("-n", "--events", type=int, default=10_000)
+@click.option("--warmup", type=int, default=1_000)
+@click.option("--batch", type=int, default=100)
+@click.option("--hit-rate", type=float, default=0.1)
+@click.option("--eager-dispatch", "eager", type=bool, default=None)
+@click.option("--seed", type=int, default=0)
+def bench(mixes, **kwargs):
+    """Benchmark dispatching synthetic messages to handler mixes, offline."""
+    try:
+        mixes = [parse_mix(mix) for mix in mixes or (*KINDS, ",".join(KINDS))]
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--mix")
+
+    click.echo(f"{'mix':<40} {'events/s':>12} {'p50 us':>10} {'p99 us':>10} {'peak B/ev':>10}")
+
+    for mix in mixes:
+        result = run_bench(mix, **kwargs)
+        click.echo(
+            f"{result.mix:<40} {result.events_per_sec:>12.0f} {result.p50 * 1e6:>10.1f}"
+            f" {result.p99 * 1e6:>10.1f} {result.peak_bytes_per_event:>10.0f}"
+        )
+
+
+@main.command("bench-predicates")
+@click.option("-n", "--number", type=int, default=100_000, help="The evaluations per round.")
+def bench_predicates(number):
+    """Benchmark evaluating handler predicates reflectively and compiled, offline."""
+    for name, nanoseconds in run_predicates(number).items():
+        click.echo(f"{name:>12}: {nanoseconds:8.1f} ns per handler per message")
+
+
+@main.command("bench-codecs")
+@click.argument("log", type=Path, required=False)
+@click.option("-n", "--events", type=int, default=10_000, help="The amount of payloads, when no log is given.")
+@click.option("-e", "--encoding", "codecs", multiple=True, type=click.Choice(list(CODECS)))
+@click.option("-z", "--compress", "compressions", multiple=True, type=click.Choice(["none", *COMPRESSIONS]))
+@click.option("--seed", type=int, default=0)
+def bench_codecs(log, events, codecs, compressions, seed):
+    """Benchmark the websocket wire formats on a gateway log or synthetic payloads, offline."""
+    if log is not None:
+        payloads = [payload for _, payload in read_log(log)]
+    else:
+        payloads = gateway_payloads(events, seed)
+
+    compressions = [None if compress == "none" else compress for compress in compressions] or None
+
+    click.echo(f"{'encoding':<10} {'compress':<10} {'events':>8} {'encode us':>10} {'bytes/ev':>10}")
+
+    for result in run_codecs(payloads, codecs=codecs or None, compressions=compressions):
+        click.echo(
+            f"{result.codec:<10} {result.compress or '-':<10} {result.events:>8}"
+            f" {result.encode_us:>10.2f} {result.bytes_per_event:>10.1f}"
+        )
+
+
+@main.command()
+@click.argument("log", type=Path)
+@click.option("-c", "--config-path", type=Path, required=True)
+@click.option("--speed", type=float, default=1.0, help="A multiplier of the original pace.")
+@click.option("--fast", is_flag=True, default=False, help="Replay as fast as possible.")
+def replay(log, config_path, speed, fast):
+    """Replay a recorded gateway log into the cogs of a config, offline."""
+    if not config_path.exists():
+        sys.exit(f"Configuration file does not exist! {config_path!r}")
+
+    config = Config.from_file(config_path)
+    config.override("ep", "record", value="")
+    config.override("ep", "socket_emit", value=False)
+
+    client = Client(config=config, disable=True)
+    replayer = GatewayReplayer(client, log, speed=None if fast else speed, logger=client.logger)
+
+    started = time.perf_counter()
+    client.loop.run_until_complete(replayer.replay())
+    elapsed = time.perf_counter() - started
+
+    click.echo(
+        f"Replayed {replayer.replayed} payloads ({replayer.failed} failed)"
+        f" in {elapsed:.2f}s, {replayer.replayed / elapsed:.0f}/s"
+    )
+
+    if client.metrics is None:
+        return
+
+    click.echo(f"{'handler':<40} {'calls':>8} {'total s':>10} {'p99 ms':>10} {'rejected':>10} {'errors':>8}")
+
+    for name, handler in sorted(client.metrics.handlers.items(), key=lambda item: -item[1].latency.sum):
+        latency = handler.latency
+        click.echo(
+            f"{name:<40} {latency.count:>8} {latency.sum:>10.3f} {latency.quantile(0.99) * 1e3:>10.1f}"
+            f" {handler.rejected:>10} {handler.exceptions:>8}"
+        )
 
 
 if __name__ == "__main__":
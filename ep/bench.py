@@ -0,0 +1,442 @@
+"""Offline dispatch benchmarks, see ``ep bench --help``."""
+import asyncio
+import gc
+import tracemalloc
+from functools import reduce
+from random import Random
+from statistics import quantiles
+from time import perf_counter
+from timeit import repeat
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+import discord
+
+from .config import ConfigValue
+from .core.base import BaseClient
+from .core.codec import CODECS, COMPRESSIONS, Compressor
+from .core.cog import Cog
+from .core.event import Event
+
+__all__ = (
+    "KINDS",
+    "BenchResult",
+    "CodecResult",
+    "gateway_payloads",
+    "parse_mix",
+    "run",
+    "run_codecs",
+    "run_predicates",
+)
+
+KINDS = ("event", "filtered", "regex", "formatted")
+
+# Channel ids and message contents that no handler of any mix listens for.
+_MISS_CHANNEL: int = 0
+_MISS_CONTENT: str = "nothing to see here"
+
+
+class BenchResult(NamedTuple):
+    """The figures of a single benchmarked handler mix."""
+
+    mix: str
+    events: int
+    events_per_sec: float
+    p50: float
+    p99: float
+    peak_bytes_per_event: float
+
+
+class CodecResult(NamedTuple):
+    """The figures of a single benchmarked codec and compression pair."""
+
+    codec: str
+    compress: Optional[str]
+    events: int
+    encode_us: float
+    bytes_per_event: float
+
+
+class _BenchClient(BaseClient):
+    """A client that never connects and remembers the tasks dispatching scheduled."""
+
+    def __init__(self, config: Dict[str, Any], loop: asyncio.AbstractEventLoop, **kwargs):
+        if hasattr(discord, "Intents"):
+            kwargs.setdefault("intents", discord.Intents.none())
+
+        super().__init__(loop=loop, **kwargs)
+        self.loop = loop
+        self.scheduled: List[asyncio.Task] = []
+        self._config = config
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        return self._config
+
+    def _schedule_event(self, coro, event_name, *args, **kwargs):
+        task = super()._schedule_event(coro, event_name, *args, **kwargs)
+        self.scheduled.append(task)
+        return task
+
+
+def _callback(name: str):
+    async def callback(self, message, **_):  # pylint: disable=unused-argument
+        pass
+
+    callback.__name__ = callback.__qualname__ = name
+    return callback
+
+
+def _formatter(client: _BenchClient) -> Dict[str, Any]:
+    return client.config["bench"]
+
+
+def _cog(mix: Dict[str, int]) -> type:
+    namespace: Dict[str, Any] = {}
+
+    for index in range(mix.get("event", 0)):
+        name = f"event_{index}"
+        namespace[name] = Cog.event(tp="on_message")(_callback(name))
+
+    for index in range(mix.get("filtered", 0)):
+        name = f"filtered_{index}"
+        namespace[name] = Cog.event(tp="on_message", message_channel_id=index + 1)(_callback(name))
+
+    for index in range(mix.get("regex", 0)):
+        name = f"regex_{index}"
+        namespace[name] = Cog.regex(fr"!cmd{index} (?P<arg>\w+)")(_callback(name))
+
+    for index in range(mix.get("formatted", 0)):
+        name = f"formatted_{index}"
+        namespace[name] = Cog.formatted_regex(_formatter, fr"${{prefix}}fmt{index} (?P<arg>\w+)")(
+            _callback(name)
+        )
+
+    return type("Bench", (Cog,), namespace)
+
+
+def _messages(mix: Dict[str, int], count: int, hit_rate: float, seed: int) -> List[SimpleNamespace]:
+    rng = Random(seed)
+    guild = SimpleNamespace(id=1, get_member=lambda _: None, get_channel=lambda _: None)
+    author = SimpleNamespace(id=2, bot=False)
+
+    # Every kind is hit through its own field, so a message can be made to
+    # hit a single handler of one kind and miss every other handler.
+    hits = [
+        *((index + 1, _MISS_CONTENT) for index in range(mix.get("filtered", 0))),
+        *((_MISS_CHANNEL, f"!cmd{index} arg") for index in range(mix.get("regex", 0))),
+        *((_MISS_CHANNEL, f"?fmt{index} arg") for index in range(mix.get("formatted", 0))),
+    ]
+
+    messages = []
+
+    for _ in range(count):
+        channel_id, content = (
+            rng.choice(hits) if hits and rng.random() < hit_rate else (_MISS_CHANNEL, _MISS_CONTENT)
+        )
+
+        messages.append(
+            SimpleNamespace(
+                content=content,
+                guild=guild,
+                author=author,
+                channel=SimpleNamespace(id=channel_id, guild=guild),
+            )
+        )
+
+    return messages
+
+
+async def _latencies(client: _BenchClient, messages: List[Any]) -> List[float]:
+    # One event at a time, from dispatch until every task it scheduled is done.
+    latencies = []
+
+    for message in messages:
+        client.scheduled.clear()
+        started = perf_counter()
+        client.dispatch("message", message)
+
+        if client.scheduled:
+            await asyncio.gather(*client.scheduled)
+
+        latencies.append(perf_counter() - started)
+
+    return latencies
+
+
+async def _throughput(client: _BenchClient, messages: List[Any], batch: int) -> float:
+    # Events arrive in bursts of ``batch`` like under a flood.
+    started = perf_counter()
+
+    for offset in range(0, len(messages), batch):
+        client.scheduled.clear()
+
+        for message in messages[offset : offset + batch]:
+            client.dispatch("message", message)
+
+        if client.scheduled:
+            await asyncio.gather(*client.scheduled)
+
+    return len(messages) / (perf_counter() - started)
+
+
+async def _peak_bytes(client: _BenchClient, messages: List[Any]) -> float:
+    # The peak of what dispatching allocated on top of what was allocated
+    # before it, temporaries freed before dispatch returns included. The
+    # tasks it scheduled run afterwards and aren't counted.
+    total = 0
+    tracemalloc.start()
+
+    try:
+        for message in messages:
+            client.scheduled.clear()
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            client.dispatch("message", message)
+            total += tracemalloc.get_traced_memory()[1] - before
+
+            if client.scheduled:
+                await asyncio.gather(*client.scheduled)
+    finally:
+        tracemalloc.stop()
+
+    return total / len(messages)
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Parse a handler mix such as ``"event=2,regex=10"``, a bare kind counts as 10."""
+    parsed = {}
+
+    for part in filter(None, (part.strip() for part in mix.split(","))):
+        kind, _, count = part.partition("=")
+
+        if kind not in KINDS:
+            raise ValueError(f"unknown handler kind {kind!r}, expected one of {KINDS!r}")
+
+        parsed[kind] = int(count) if count else 10
+
+    return parsed
+
+
+def run(
+    mix: Dict[str, int],
+    *,
+    events: int = 10_000,
+    warmup: int = 1_000,
+    batch: int = 100,
+    hit_rate: float = 0.1,
+    eager: Optional[bool] = None,
+    seed: int = 0,
+) -> BenchResult:
+    """Benchmark dispatching ``events`` messages to a cog with the handlers of ``mix``.
+
+    Parameters
+    ----------
+    mix : Dict[:class:`str`, :class:`int`]
+        The amount of handlers of every kind, see :data:`KINDS`.
+    events : :class:`int`
+        The amount of messages to dispatch per measurement.
+    warmup : :class:`int`
+        The amount of messages to dispatch before measuring.
+    batch : :class:`int`
+        The size of the bursts messages are dispatched in when measuring
+        throughput.
+    hit_rate : :class:`float`
+        The ratio of messages that satisfy one of the handlers.
+    eager : Optional[:class:`bool`]
+        Whether the client dispatches eagerly, the clients default if ``None``.
+    seed : :class:`int`
+        The seed of the generated messages.
+    """
+    loop = asyncio.new_event_loop()
+    config = {"ep": {"limits": {}}, "bench": {"prefix": r"\?"}}
+
+    try:
+        client = _BenchClient(config, loop, eager_dispatch=eager)
+        client.add_cog(_cog(mix)(client))
+
+        messages = _messages(mix, events, hit_rate, seed)
+        loop.run_until_complete(_latencies(client, _messages(mix, warmup, hit_rate, seed + 1)))
+
+        gc.collect()
+        gc.disable()
+
+        try:
+            latencies = loop.run_until_complete(_latencies(client, messages))
+            events_per_sec = loop.run_until_complete(_throughput(client, messages, batch))
+            peak_bytes = loop.run_until_complete(_peak_bytes(client, messages))
+        finally:
+            gc.enable()
+    finally:
+        loop.close()
+
+    cuts = quantiles(latencies, n=100)
+    label = ",".join(f"{kind}={count}" for kind, count in mix.items())
+    return BenchResult(label, events, events_per_sec, cuts[49], cuts[98], peak_bytes)
+
+
+def gateway_payloads(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Generate ``count`` gateway payloads shaped like ``MESSAGE_CREATE`` dispatches."""
+    rng = Random(seed)
+    words = ("ping", "pong", "hello", "there", "!cmd", "arg", "the", "bot", "channel", "guild")
+    payloads = []
+
+    for sequence in range(count):
+        author_id = rng.randrange(10**17, 10**18)
+        payloads.append(
+            {
+                "op": 0,
+                "t": "MESSAGE_CREATE",
+                "s": sequence,
+                "d": {
+                    "id": str(rng.randrange(10**17, 10**18)),
+                    "type": 0,
+                    "tts": False,
+                    "pinned": False,
+                    "content": " ".join(rng.choice(words) for _ in range(rng.randrange(1, 20))),
+                    "channel_id": str(rng.randrange(10**17, 10**17 + 10)),
+                    "guild_id": "100000000000000000",
+                    "timestamp": "2020-01-01T00:00:00.000000+00:00",
+                    "edited_timestamp": None,
+                    "mention_everyone": False,
+                    "mentions": [],
+                    "mention_roles": [],
+                    "attachments": [],
+                    "embeds": [],
+                    "flags": 0,
+                    "nonce": rng.randrange(2**63),
+                    "author": {
+                        "id": str(author_id),
+                        "username": f"user{author_id % 1000}",
+                        "discriminator": f"{author_id % 10000:04}",
+                        "avatar": None,
+                        "bot": False,
+                    },
+                    "member": {
+                        "roles": [],
+                        "nick": None,
+                        "mute": False,
+                        "deaf": False,
+                        "joined_at": "2020-01-01T00:00:00.000000+00:00",
+                    },
+                },
+            }
+        )
+
+    return payloads
+
+
+def run_codecs(
+    payloads: Iterable[Any],
+    *,
+    codecs: Optional[Iterable[str]] = None,
+    compressions: Optional[Iterable[Optional[str]]] = None,
+) -> List[CodecResult]:
+    """Benchmark encoding ``payloads`` with every codec and compression pair.
+
+    Frames are compressed as a single stream, like a connection of the
+    websocket server does, so the figures include what the shared window
+    saves on top of the encoding.
+
+    Parameters
+    ----------
+    payloads : Iterable[Any]
+        The payloads to encode, e.g. from :func:`gateway_payloads` or a
+        recorded gateway log.
+    codecs : Optional[Iterable[:class:`str`]]
+        The codecs to benchmark, every codec in :data:`ep.core.codec.CODECS`
+        if ``None``.
+    compressions : Optional[Iterable[Optional[:class:`str`]]]
+        The compressions to benchmark, ``None`` for none at all, every
+        available one and none if ``None``.
+    """
+    payloads = list(payloads)
+    results = []
+
+    for name in codecs or CODECS:
+        encode = CODECS[name].encode
+
+        for compress in (None, *COMPRESSIONS) if compressions is None else compressions:
+            compressor = Compressor(compress) if compress is not None else None
+            size = 0
+
+            gc.collect()
+            gc.disable()
+
+            try:
+                started = perf_counter()
+
+                for payload in payloads:
+                    data = encode(payload)
+
+                    if compressor is not None:
+                        data = compressor.compress(data)
+
+                    size += len(data)
+
+                elapsed = perf_counter() - started
+            finally:
+                gc.enable()
+
+            count = max(len(payloads), 1)
+            results.append(CodecResult(name, compress, len(payloads), elapsed / count * 1e6, size / count))
+
+    return results
+
+
+def _reflective_should_run(handler: Any, args: Any, kwargs: Any) -> bool:
+    # How predicates were evaluated before they were compiled, signature
+    # binding, ``reduce(getattr)`` and ``ConfigValue`` resolution per call.
+    bound = handler.signature.bind(*args, **kwargs)
+
+    for parts, expected in handler.event.attrs.items():
+        if isinstance(expected, ConfigValue):
+            expected = expected.resolve(bound.arguments["self"].config)
+
+        head, *tail = parts
+
+        try:
+            base = reduce(getattr, tail, bound.arguments[head])
+        except AttributeError:
+            return False
+
+        if base != expected:
+            return False
+
+    return True
+
+
+def run_predicates(number: int = 100_000, *, rounds: int = 5) -> Dict[str, float]:
+    """Benchmark evaluating the attribute predicates of a handler, reflectively and compiled.
+
+    Returns the best nanoseconds per evaluation out of ``rounds`` rounds of
+    ``number`` evaluations, keyed by ``"reflective"`` and ``"compiled"``.
+    """
+    config = {"default": {"guild_snowflake": 1}}
+    cog = SimpleNamespace(config=config)
+    message = SimpleNamespace(
+        author=SimpleNamespace(bot=False),
+        channel=SimpleNamespace(id=2, guild=SimpleNamespace(id=1)),
+    )
+
+    handler = Event(
+        "on_message",
+        attrs={
+            "message_author_bot": False,
+            "message_channel_guild_id": ConfigValue("default", "guild_snowflake"),
+        },
+    )(_callback("on_message"))
+    predicate = handler.compile_predicate(config)
+
+    args = (message,)
+    bound_args = (cog, message)
+
+    if not (_reflective_should_run(handler, bound_args, {}) and predicate(args)):
+        raise RuntimeError("the predicates don't agree on the benchmarked message.")
+
+    cases = {
+        "reflective": lambda: _reflective_should_run(handler, bound_args, {}),
+        "compiled": lambda: predicate(args),
+    }
+
+    return {name: min(repeat(func, number=number, repeat=rounds)) / number * 1e9 for name, func in cases.items()}
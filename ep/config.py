@@ -1,9 +1,11 @@
+from copy import deepcopy
 from pathlib import Path
-from typing import Dict, Union, Any
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple, Union
 
 from toml import loads as toml_loads
 
-__all__ = ("RAW_DEFAULT", "Config", "ConfigValue")
+__all__ = ("RAW_DEFAULT", "Config", "ConfigSnapshot", "ConfigValue")
 
 RAW_DEFAULT: str = """
 # "ep" is the main configuration loading point, it's form is standardised.
@@ -27,19 +29,176 @@ socket_emit = false
 # 
 superusers = []
 
+# "eager_dispatch" evaluates the attribute predicates of event handlers
+# while dispatching and only creates tasks for the handlers that pass.
+#
+eager_dispatch = false
+
+# "lazy_cogs" defers importing a cog module until an event it listens
+# for arrives. What every module listens for is cached in a manifest in
+# the cog directory, modules are imported once to fill it in.
+#
+lazy_cogs = false
+
+# "hot_reload" watches the cog directory and reloads the cog modules that
+# change, without restarting the client. Cogs keep the attributes named
+# in their "__cog_state__" across a reload.
+#
+hot_reload = false
+
+# "watch_config" reloads this file whenever it changes, as does sending
+# the process a SIGHUP. Cogs resolve their config values again and their
+# event handlers are rebound, options given on the command line are kept.
+#
+watch_config = false
+
+# "record" is a file to append every raw gateway payload to, relative to
+# the current file. The log can be replayed offline with "ep replay".
+#
+record = ""
+
 # "tui" is used as the sub configuration for the TUI control panel.
+# "encoding", "compress" and "batch" are the wire format asked of the
+# websocket server, see "[ep.websocket]". Only the events the console
+# displays are subscribed to, "[ep.tui.filters.<EVENT>]" tables of
+# "include" and "exclude" forms narrow them down on the server already.
+# "replay" is the amount of recent events shown when first connecting.
+# "token" is the control token sent for commands like "/profile", the
+# "control_token" of "[ep.websocket]" when it is empty.
 [ep.tui]
+encoding = "msgpack"
+compress = "zlib"
+batch = true
+replay = 50
+token = ""
+
+# "metrics" counts the events dispatched and the rejections, exceptions
+# and latencies of every event handler. A snapshot is broadcast over the
+# websocket server every "interval" seconds (0 to disable) and with
+# "prometheus" enabled "/metrics" on the websocket port can be scraped.
+# When sharded every shard serves its own, the metrics merged across the
+# shards are served on "supervisor_port".
+[ep.metrics]
+enabled = true
+interval = 5
+prometheus = false
+supervisor_port = 9875
+
+# "websocket" bounds the frames queued for every client of the websocket
+# server. Once the queue of a slow client is full "slow_consumer" decides
+# what happens, one of "drop_oldest", "coalesce" (replace an older frame
+# of the same type) or "disconnect". Clients pick their wire format when
+# connecting, "default_encoding" is used for clients that don't, one of
+# "msgpack", "json" or "pickle" (only safe between trusted ends.) Clients
+# asking for batches are sent the frames of "batch_window" seconds, up to
+# "batch_size" of them, as one frame. The latest "replay_size" frames,
+# at most "replay_bytes" of them, are kept "replay_encoding" encoded for
+# clients that (re)connect, in memory or memory mapped from "replay_file"
+# (relative to the current file.) Keeping them costs an encode of every
+# broadcast even while no client is connected or subscribed to it, one
+# the clients of that encoding share. An empty "replay_encoding" is the
+# "default_encoding", a "replay_size" of 0 disables replays. Metrics
+# snapshots are never kept.
+# Commands that act on the bot, e.g. "profile", are only accepted from
+# clients that connect with "token=<control_token>", from nobody while it
+# is empty.
+[ep.websocket]
+queue_size = 256
+slow_consumer = "drop_oldest"
+default_encoding = "pickle"
+batch_window = 0.05
+batch_size = 128
+replay_size = 1024
+replay_bytes = 8388608
+replay_file = ""
+replay_encoding = ""
+control_token = ""
+
+# "cpu" configures the process pool functions marked with "Cog.cpu_bound"
+# run in. "start_method" must be "fork" for the workers to import cog
+# modules, "warmup" starts the workers when the client starts rather than
+# on first use and "max_result_size" is the largest result in bytes a
+# worker may send back, 0 for unlimited.
+[ep.cpu]
+max_workers = 2
+start_method = "fork"
+warmup = true
+max_result_size = 8388608
+
+# "limits" bounds the event handlers of a cog, keyed by the cog name.
+# "max_concurrency" is the amount of invocations a handler may have in
+# flight, "deadline" the seconds after which an invocation is cancelled
+# and "overflow" one of "queue", "drop_oldest" or "reject".
+#
+# [ep.limits.Captcha]
+# max_concurrency = 16
+# deadline = 30
+# overflow = "reject"
+[ep.limits]
 
 """.strip()
 
 
+def _flatten(table: Dict[str, Any], prefix: Tuple[str, ...] = ()) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+    for key, value in table.items():
+        path = (*prefix, key)
+
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+            value = _freeze(value)
+
+        yield path, value
+
+
+def _freeze(table: Dict[str, Any]) -> Mapping[str, Any]:
+    return MappingProxyType(
+        {key: _freeze(value) if isinstance(value, dict) else value for key, value in table.items()}
+    )
+
+
+class ConfigSnapshot(Mapping):
+    """An immutable, flattened copy of a :class:`Config` at a version.
+
+    Every table and value is keyed by its full path, so looking one up is a
+    single hash lookup however deeply it is nested.
+
+    >>> snapshot = config.snapshot
+    >>> snapshot["ep", "cpu", "max_workers"]
+    2
+    """
+
+    __slots__ = ("version", "_paths")
+
+    def __init__(self, table: Dict[str, Any], version: int = 0):
+        self.version = version
+        self._paths: Dict[Tuple[str, ...], Any] = dict(_flatten(deepcopy(table)))
+
+    def __getitem__(self, path: Tuple[str, ...]) -> Any:
+        return self._paths[path]
+
+    def __iter__(self) -> Iterator[Tuple[str, ...]]:
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __repr__(self) -> str:
+        return f"<ConfigSnapshot version={self.version} paths={len(self._paths)}>"
+
+
 class Config(dict):
     """A class that deals with configuration issues.
 
+    The contents are replaced in place by :meth:`reload`, which bumps
+    :attr:`version` so anything resolved from an older version can tell it
+    is stale.
+
     Attributes
     ----------
     default : :class:`str`
         The default toml configuration.
+    version : :class:`int`
+        The amount of times the config has been replaced.
     """
 
     default: str = RAW_DEFAULT
@@ -47,6 +206,27 @@ class Config(dict):
     def __init__(self, *args, fp: Path, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.fp = fp
+        self.version = 0
+        self.overrides: Dict[Tuple[str, ...], Any] = {}
+        self._snapshot: Optional[ConfigSnapshot] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The snapshot is cheap to compile again and holds mapping proxies.
+        return {**self.__dict__, "_snapshot": None}
+
+    # Properties
+
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """:class:`ConfigSnapshot` - The snapshot of the current version, compiled on first use.
+
+        Changes made by mutating the config directly, rather than through
+        :meth:`override` or :meth:`replace`, aren't picked up once it is compiled.
+        """
+        if (snapshot := self._snapshot) is None or snapshot.version != self.version:
+            snapshot = self._snapshot = ConfigSnapshot(self, self.version)
+
+        return snapshot
 
     # Constructors
 
@@ -74,6 +254,39 @@ class Config(dict):
 
         return cls(toml_loads(path.read_text()), fp=path)
 
+    # Public
+
+    def override(self, *path: str, value: Any) -> None:
+        """Set a value that survives the config being reloaded, e.g. from a command line option.
+
+        >>> config.override("ep", "eager_dispatch", value=True)
+        """
+        *tables, key = path
+        target = self
+
+        for table in tables:
+            target = target.setdefault(table, {})
+
+        target[key] = value
+        self.overrides[path] = value
+        self._snapshot = None
+
+    def replace(self, table: Dict[str, Any]) -> int:
+        """Replace the contents of the config, keeping the overrides, returns the new version."""
+        self.clear()
+        self.update(table)
+        self.version += 1
+        self._snapshot = None
+
+        for path, value in list(self.overrides.items()):
+            self.override(*path, value=value)
+
+        return self.version
+
+    def reload(self) -> int:
+        """Read the config file again and :meth:`replace` the contents with it, returns the new version."""
+        return self.replace(toml_loads(self.fp.read_text()))
+
 
 class ConfigValue:
     """A class for describing configuration based values with lazy resolution."""
@@ -83,7 +296,13 @@ class ConfigValue:
         self.default = default
 
     def resolve(self, config: Config) -> Any:
-        """Resolve the ConfigValue from a Config."""
+        """Resolve the ConfigValue from a Config.
+
+        The path is walked through the live config, so tables are returned
+        as they are and direct mutations are seen. Resolved values are
+        cached where they are used, compiled predicates and cog attributes
+        are resolved again when the config is reloaded.
+        """
         target = config
 
         try:
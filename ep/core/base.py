@@ -1,30 +1,45 @@
 """BaseClient implementation."""
 from asyncio import (
+    gather,
     iscoroutinefunction,
-    Future,
     Task,
     iscoroutine,
-    CancelledError,
 )
-from collections import defaultdict
-from typing import Coroutine, Optional
+from typing import Any, Coroutine, Optional
 from types import MappingProxyType
-from traceback import print_exc as traceback_print_exc
-from random import choice
-from string import ascii_lowercase
 
 from discord import Client
 
 from ..utils import get_logger as _utils_get_logger
 from .cog import Cog
+from .cpu import CpuPool
+from .dispatch import DispatchTable
+from .event import BoundEventHandler
+from .metrics import Metrics
+from .profiler import SamplingProfiler
+from .regex import RegexExecutor
+from .supervisor import TaskSupervisor
 
 
 LOGGER = _utils_get_logger(__name__)
 
 
 class BaseClient(Client):
-    """A base client."""
+    """A base client.
+
+    Parameters
+    ----------
+    eager_dispatch : Optional[:class:`bool`]
+        Evaluate the attribute predicates of every candidate handler
+        synchronously while dispatching and only schedule a task for the
+        handlers that passed, rather than a task per candidate handler.
+    collect_metrics : Optional[:class:`bool`]
+        Count the events dispatched and the rejections, exceptions and
+        latencies of every handler in :attr:`metrics`.
+    """
     logger = LOGGER
+    eager_dispatch: bool = False
+    collect_metrics: bool = True
 
     # A lot of basic functionality is borrowed from the ext.commands bot.
     #
@@ -32,12 +47,35 @@ class BaseClient(Client):
     # of extra overhead associated with the commands.Bot class that I'd rather
     # avoid.
 
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        *args,
+        eager_dispatch: Optional[bool] = None,
+        collect_metrics: Optional[bool] = None,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
-        self.extra_events = defaultdict(list)
+
+        if eager_dispatch is not None:
+            self.eager_dispatch = eager_dispatch
+
+        if collect_metrics is not None:
+            self.collect_metrics = collect_metrics
+
+        self.extra_events = DispatchTable()
+        self.regex_executor = RegexExecutor(logger=self.logger)
+        self.cpu_pool = CpuPool(logger=self.logger)
         self.__cogs = {}
         self.__extensions = {}
-        self.__task_registry = {}
+        self.__supervisor = None
+        self.__profiler = None
+
+        self.metrics: Optional[Metrics] = None
+
+        if self.collect_metrics:
+            self.metrics = metrics = Metrics()
+            metrics.gauge("regex_executor_pending", lambda: self.regex_executor.pending)
+            metrics.gauge("tasks", lambda: len(self.supervisor))
 
     # Properties
 
@@ -46,6 +84,22 @@ class BaseClient(Client):
         """Mapping[:class:`str`, :class:`Cog`]: A read-only mapping of cog name to cog."""
         return MappingProxyType(self.__cogs)
 
+    @property
+    def supervisor(self) -> TaskSupervisor:
+        """:class:`ep.core.supervisor.TaskSupervisor`: The supervisor of every task scheduled by the client."""
+        if self.__supervisor is None:
+            self.__supervisor = TaskSupervisor(self.loop, logger=self.logger)
+
+        return self.__supervisor
+
+    @property
+    def profiler(self) -> SamplingProfiler:
+        """:class:`ep.core.profiler.SamplingProfiler`: The sampling profiler of the client loop."""
+        if self.__profiler is None:
+            self.__profiler = SamplingProfiler(self)
+
+        return self.__profiler
+
     @property
     def extensions(self):
         """Mapping[:class:`str`, :class:`py:types.ModuleType`]: A read-only mapping of extension name to extension."""
@@ -57,10 +111,32 @@ class BaseClient(Client):
         # Core dispatching
         super().dispatch(event, *args, **kwargs)
 
-        # Extra event handling
+        # Extra event handling, only the listeners whose indexed
+        # predicates could be satisfied by the arguments are scheduled.
         fmt = f"on_{event}"
-        for event_ in self.extra_events.get(fmt, []):
-            self._schedule_event(event_, fmt, *args, **kwargs)
+        listeners = self.extra_events.lookup(fmt, args)
+
+        if (metrics := self.metrics) is not None:
+            metrics.events[event] += 1
+
+        self._dispatch_listeners(fmt, listeners, args, kwargs)
+
+    def _dispatch_listeners(self, fmt, listeners, args, kwargs):
+        if not self.eager_dispatch:
+            for event_ in listeners:
+                self._schedule_event(event_, fmt, *args, **kwargs)
+            return
+
+        # Under floods most handlers fail their predicate straight away,
+        # creating (and collecting) a task just to find that out is the
+        # expensive part so the predicates are run here in one pass.
+        for event_ in listeners:
+            if not isinstance(event_, BoundEventHandler):
+                self._schedule_event(event_, fmt, *args, **kwargs)
+            elif event_.predicate(args):
+                self._schedule_event(event_.invoke, fmt, *args, **kwargs)
+            elif event_.metrics is not None:
+                event_.metrics.rejected += 1
 
     async def close(self):
         await super().close()
@@ -68,47 +144,52 @@ class BaseClient(Client):
         for cog_name in list(self.cogs):
             self.remove_cog(cog_name)
 
+        self.regex_executor.shutdown()
+        self.cpu_pool.shutdown()
+        await self.supervisor.cancel()
+
+        if self.__profiler is not None and self.__profiler.running:
+            self.__profiler.stop()
+
     # Public
 
-    def schedule_task(self, coro: Coroutine, *, name: Optional[str] = None) -> Task:
-        """Schedule a coroutine to be wrapped in an :class:`asyncio.Task`."""
+    def schedule_task(
+        self, coro: Coroutine, *, name: Optional[str] = None, owner: Any = None
+    ) -> Task:
+        """Schedule a coroutine to be wrapped in a supervised :class:`asyncio.Task`.
+
+        Parameters
+        -----------
+        coro: Coroutine
+            The coroutine to schedule.
+        name: Optional[:class:`str`]
+            The name of the task, derived from the coroutine if ``None``.
+        owner: Any
+            The owner of the task, usually a :class:`ep.Cog`. Coroutines of
+            cog methods are attributed to their cog when ``None``.
+        """
         if not iscoroutine(coro):
             raise TypeError("`coro` argument must be a coroutine.")
 
-        if name is None:
-            name = "".join(choice(ascii_lowercase) for _ in range(8))
-
-        elif not isinstance(name, str):
+        if name is not None and not isinstance(name, str):
             raise TypeError("`name` keyword argument must be None or a string.")
 
-        async def handle(coro):
-            try:
-                return await coro
-            except Exception as exc:  # pylint: disable=broad-except
-                if isinstance(exc, CancelledError):
-                    raise
-
-                traceback_print_exc()
-
-        task = self.loop.create_task(handle(coro))
-
-        def task_registry_cleanup(_: Future) -> None:
-            self.__task_registry.pop(name, None)
-
-        task.add_done_callback(task_registry_cleanup)
+        return self.supervisor.spawn(coro, name=name, owner=owner)
 
-        self.__task_registry[name] = task
-        return task
+    async def wait_until_cogs_ready(self) -> None:
+        """Wait until :meth:`ep.Cog.cog_setup` of every cog added so far has finished."""
+        await gather(*(cog.cog_ready.wait() for cog in self.cogs.values()))
 
     def add_listener(self, corofunc, name=None):
         """The non decorator alternative to :meth:`.listen`.
 
         Parameters
         -----------
-        corofunc: Callable[..., Coroutine]
+        corofunc: Union[Callable[..., Coroutine], :class:`ep.core.event.BoundEventHandler`]
             The function to call.
         name: Optional[:class:`str`]
-            The name of the event to listen for. Defaults to ``corofunc.__name__``.
+            The name of the event to listen for. Defaults to ``corofunc.__name__``
+            or the event type of a bound handler.
 
         Example
         --------
@@ -120,12 +201,21 @@ class BaseClient(Client):
         ...     pass
         >>> client.add_listener(some_event, "on_message")
         """
-        name = name or corofunc.__name__
-
-        if not iscoroutinefunction(corofunc):
+        if isinstance(corofunc, BoundEventHandler):
+            name = name or corofunc.event.event_type
+            key = corofunc.handler.index_key(corofunc.owner.config)
+            prefixes = corofunc.handler.literal_prefixes(corofunc.owner.config, corofunc.owner)
+            owner = corofunc.owner
+
+        elif iscoroutinefunction(corofunc):
+            name = name or corofunc.__name__
+            key = prefixes = None
+            owner = getattr(corofunc, "__self__", None)
+
+        else:
             raise TypeError("`corofunc` is not a coroutine function.")
 
-        self.extra_events[name].append(corofunc)
+        self.extra_events.add(name, corofunc, key=key, prefixes=prefixes, owner=owner)
 
     def remove_listener(self, func, name=None):
         """Removes a listener from the pool of listeners.
@@ -138,8 +228,25 @@ class BaseClient(Client):
             The name of the event we want to remove. Defaults to
             ``func.__name__``.
         """
-        name = name or func.__name__
-        self.extra_events.get(name, {}).pop(func, None)
+        if name is None:
+            name = func.event.event_type if isinstance(func, BoundEventHandler) else func.__name__
+
+        self.extra_events.remove(name, func)
+
+    def remove_listeners(self, owner) -> int:
+        """Removes every listener that was registered by ``owner``.
+
+        Parameters
+        -----------
+        owner
+            The owner of the listeners, usually a :class:`ep.Cog`.
+
+        Returns
+        --------
+        :class:`int`
+            The amount of listeners removed.
+        """
+        return self.extra_events.remove_owner(owner)
 
     def add_cog(self, cog):
         """Adds a cog to the bot.
@@ -171,10 +278,20 @@ class BaseClient(Client):
         cog has registered will be removed as well.
         If no cog is found then this method has no effect.
 
+        The tasks of the cog are cancelled, the returned future resolves
+        once they have finished.
+
         Parameters
         -----------
         name: :class:`str`
             The name of the cog to remove.
+
+        Returns
+        --------
+        Optional[:class:`asyncio.Future`]
+            ``None`` if no cog was found.
         """
         if name in self.__cogs:
-            self.__cogs.pop(name).cog_eject(self)
+            return self.__cogs.pop(name).cog_eject(self)
+
+        return None
@@ -1,26 +1,50 @@
 """Main client implementation."""
 import asyncio
 import os
+import signal
 import sys
 import time
 import inspect
 import importlib
+from contextlib import suppress
 from pathlib import Path
 from json import dumps as json_dumps
 from time import time
 from functools import partial
-from typing import Union, Any, Optional
+from types import MappingProxyType
+from typing import Union, Any, Dict, List, Optional
 from traceback import print_exc
 
 from discord import TextChannel
+from toml import TomlDecodeError
 
 from ..config import Config
 from ..utils import codeblock, infer_token
 from .cog import Cog
+from .cpu import CpuPool
 from .base import BaseClient
+from .manifest import (
+    CogManifest,
+    LazyCogModule,
+    cog_modules,
+    exported_cogs,
+    import_cog_module,
+    module_stamp,
+)
+from .reload import CogWatcher
+from .replay import GatewayRecorder
 from .websocket import WebsocketServer
 
 
+def _pop_modules(name: str) -> Dict[str, Any]:
+    # A module and, for packages, every submodule of it.
+    return {
+        key: sys.modules.pop(key)
+        for key in list(sys.modules)
+        if key == name or key.startswith(f"{name}.")
+    }
+
+
 class Client(BaseClient):
     r"""A hard client implementation used as default.
 
@@ -36,15 +60,32 @@ class Client(BaseClient):
         Any other keyword arguments are propagated into the :class:`ep.BaseClient`
     """
     _timestamp: int = int(time())
+    config_poll_interval: float = 2.0
 
     def __init__(self, *args, config: Config, disable: bool = False, **kwargs) -> None:
+        kwargs.setdefault("eager_dispatch", config["ep"].get("eager_dispatch"))
+        kwargs.setdefault("collect_metrics", config["ep"].get("metrics", {}).get("enabled"))
         super().__init__(*args, **kwargs)
 
         self.__socket_noloop = set()
+        self.__lazy_modules = {}
         self._config = config
 
+        self.cpu_pool = CpuPool(**config["ep"].get("cpu", {}), logger=self.logger)
+
+        self.recorder: Optional[GatewayRecorder] = None
+
+        if config["ep"].get("record"):
+            self.recorder = GatewayRecorder(config.fp.parent.joinpath(config["ep"]["record"]))
+
+        self.watcher: Optional[CogWatcher] = None
+
         if "cog_path" in self._config["ep"]:
-            self.load_cogs(config.fp.parent.joinpath(self._config["ep"]["cog_path"]))
+            cog_path = config.fp.parent.joinpath(self._config["ep"]["cog_path"])
+            self.load_cogs(cog_path)
+
+            if config["ep"].get("hot_reload"):
+                self.watcher = CogWatcher(self, cog_path, logger=self.logger)
 
         if disable or "EP_DISABLED" in os.environ:
             self.run = lambda *_, **__: None
@@ -58,6 +99,19 @@ class Client(BaseClient):
         self._wss = wss = WebsocketServer(self)
         self.schedule_task(wss.serve())
 
+        if self.watcher is not None:
+            self.supervisor.supervise(self.watcher.watch, name="CogWatcher.watch")
+
+        if self.cpu_pool.warmup_workers:
+            self.schedule_task(self.cpu_pool.warmup(), name="CpuPool.warmup")
+
+        if config["ep"].get("watch_config"):
+            self.supervisor.supervise(self.watch_config, name="Client.watch_config")
+
+        # Not every platform (or thread) can handle signals, SIGHUP is a nicety.
+        with suppress(AttributeError, NotImplementedError, RuntimeError, ValueError):
+            self.loop.add_signal_handler(signal.SIGHUP, self.reload_config)
+
     def __enter__(self):
         self._timestamp = int(time())
         return self
@@ -84,11 +138,25 @@ class Client(BaseClient):
         """:class:`ep.WebsocketServer` - The current websocket server."""
         return self._wss
 
+    @property
+    def lazy_modules(self):
+        """Mapping[:class:`str`, :class:`ep.core.manifest.LazyCogModule`] - The cog modules whose import was deferred."""
+        return MappingProxyType(self.__lazy_modules)
+
     @property
     def timestamp(self):
         """:class:`int` - The timestamp of when the client started or the timestamp of when the class was created."""
         return self._timestamp
 
+    async def close(self) -> None:
+        await super().close()
+
+        if self.recorder is not None:
+            self.recorder.close()
+
+        if (wss := getattr(self, "_wss", None)) is not None:
+            wss.close()
+
     # Internals
 
     def _get_socket_channel(self) -> Optional[TextChannel]:
@@ -111,13 +179,21 @@ class Client(BaseClient):
 
     # Public
 
-    def load_cogs(self, cog_path: Path) -> None:
+    def load_cogs(self, cog_path: Path, *, lazy: Optional[bool] = None) -> None:
         """Load cogs from a given :class:`pathlib.Path`.
 
+        With ``lazy`` loading the modules described by an up to date entry
+        in the :class:`ep.core.manifest.CogManifest` of the directory are
+        not imported, their cogs are loaded when the first event they listen
+        for arrives. Modules without one are imported and described for the
+        next start.
+
         Parameters
         ----------
         cog_path : :class:`pathlib.Path`
             The path to load the cogs from.
+        lazy : Optional[:class:`bool`]
+            Whether to defer importing modules, ``lazy_cogs`` of the config if ``None``.
         """
         if not isinstance(cog_path, Path):
             raise TypeError("`cog_path` must be an instance of pathlib.Path.")
@@ -127,31 +203,154 @@ class Client(BaseClient):
         if not cogs.exists():
             raise FileNotFoundError("Ru'roh the cogs directory doesn't seem to exist!")
 
-        try:
-            sys.path.append(str(cogs))
+        if lazy is None:
+            lazy = self._config["ep"].get("lazy_cogs", False)
+
+        manifest = CogManifest(cogs.joinpath(CogManifest.filename), logger=self.logger) if lazy else None
+
+        for name, path in cog_modules(cogs):
+            if manifest is not None and (entry := manifest.get(path)) is not None and entry["lazy"]:
+                module = LazyCogModule(self, cogs, name, entry)
+                self.__lazy_modules[name] = module
+                self.logger.info("Deferring cog module %s (%s triggers)", name, module.register())
+                continue
 
-            for path in cogs.iterdir():
-                path = path.resolve().absolute()
+            exports = exported_cogs(import_cog_module(cogs, name))
 
-                if (is_file := path.is_file()) and path.name.endswith(".py"):
-                    name = path.name[:-3]
-                elif is_file:
+            if manifest is not None:
+                manifest.put(path, exports)
+
+            for obj in exports:
+                shard_id = obj.__cog_shard__
+
+                if None not in (shard_id, self.shard_id) and shard_id != self.shard_id:
+                    self.logger.info("Skipping cog %s, it runs on shard %s", obj.__name__, shard_id)
                     continue
-                else:
-                    name = path.name
-
-                module = importlib.import_module(name)
-                module_all = getattr(module, "__all__", [])
-
-                for obj in map(partial(getattr, module), module_all):
-                    if (
-                        isinstance(obj, type)
-                        and issubclass(obj, Cog)
-                        and getattr(obj, "__export__", False)
-                    ):
-                        self.add_cog(obj(self))
-        finally:
-            sys.path.remove(str(cogs))
+
+                self.add_cog(obj(self))
+
+        # Every shard describes the same modules, only one writes them down.
+        if manifest is not None and self.shard_id in (None, 0):
+            manifest.save()
+
+    def reload_config(self) -> bool:
+        """Read the config file again and hand the new contents to every cog.
+
+        The config is replaced in place and every cog is reconfigured, see
+        :meth:`ep.Cog.cog_reconfigure`. A file that can't be read or parsed
+        leaves the current config in place.
+
+        Returns
+        -------
+        :class:`bool`
+            Whether the config was reloaded.
+        """
+        try:
+            version = self._config.reload()
+        except (OSError, TomlDecodeError) as err:
+            self.logger.error("Failed to reload config %s => %s", str(self._config.fp), err)
+            return False
+
+        for cog in self.cogs.values():
+            try:
+                cog.cog_reconfigure(self)
+            except Exception as err:  # pylint: disable=broad-except
+                self.logger.error("Failed to reconfigure cog %s => %s", cog.__cog_name__, err)
+
+        self.logger.info("Reloaded config %s (version %s)", str(self._config.fp), version)
+        return True
+
+    async def watch_config(self) -> None:
+        """Reload the config whenever its file changes, polling every :attr:`config_poll_interval` seconds."""
+        path = self._config.fp
+        stamp = module_stamp(path)
+
+        while True:
+            await asyncio.sleep(self.config_poll_interval)
+
+            with suppress(FileNotFoundError):
+                # Editors replace a file by moving a new one in its place.
+                if (current := module_stamp(path)) != stamp:
+                    stamp = current
+                    self.reload_config()
+
+    async def reload_cog_module(self, cog_path: Path, name: str) -> Optional[List[Cog]]:
+        """Replace the cogs of a cog module with the ones of a fresh import.
+
+        The module is imported again before anything is ejected, if that
+        fails the old cogs are left running. Otherwise the old cogs are
+        removed, the state they declared is handed to their replacements
+        (see :meth:`ep.Cog.cog_state`) and the new cogs are added. The
+        workers of :attr:`cpu_pool` are recycled so cpu bound functions run
+        the new code. A module that no longer exists only has its cogs
+        removed.
+
+        Parameters
+        ----------
+        cog_path : :class:`pathlib.Path`
+            The directory the module is imported from.
+        name : :class:`str`
+            The name of the module.
+
+        Returns
+        -------
+        Optional[List[:class:`ep.Cog`]]
+            The cogs added, ``None`` if the module failed to import.
+        """
+        cogs = cog_path.resolve().absolute()
+        lazy = self.__lazy_modules.pop(name, None)
+
+        if lazy is not None:
+            self.extra_events.remove_owner(lazy)
+
+        old = [
+            cog
+            for cog in self.cogs.values()
+            if type(cog).__module__ == name or type(cog).__module__.startswith(f"{name}.")
+        ]
+
+        modules = _pop_modules(name)
+        importlib.invalidate_caches()
+        fresh = []
+
+        try:
+            if cogs.joinpath(f"{name}.py").is_file() or cogs.joinpath(name).is_dir():
+                for obj in exported_cogs(import_cog_module(cogs, name)):
+                    shard_id = obj.__cog_shard__
+
+                    if None in (shard_id, self.shard_id) or shard_id == self.shard_id:
+                        fresh.append(obj(self))
+        except Exception as err:  # pylint: disable=broad-except
+            _pop_modules(name)
+            sys.modules.update(modules)
+
+            if lazy is not None:
+                self.__lazy_modules[name] = lazy
+
+                if lazy.cogs is None:
+                    lazy.register()
+
+            self.logger.error("Failed to reload cog module %s => %s: %s", name, type(err).__name__, err)
+            return None
+
+        state = {cog.__cog_name__: cog.cog_state() for cog in old}
+        ejected = [self.remove_cog(cog.__cog_name__) for cog in old]
+
+        for cog in fresh:
+            if cog.__cog_name__ in state:
+                cog.cog_restore(state[cog.__cog_name__])
+
+            self.add_cog(cog)
+
+        # Forked workers still run the code of the old module.
+        if self.cpu_pool.recycle() and self.cpu_pool.warmup_workers:
+            self.schedule_task(self.cpu_pool.warmup(), name="CpuPool.warmup")
+
+        # The new cogs are listening already, the old tasks may wind down after.
+        await asyncio.gather(*filter(None, ejected), return_exceptions=True)
+
+        self.logger.info("Reloaded cog module %s (%s => %s cogs)", name, len(old), len(fresh))
+        return fresh
 
     # Event handlers
 
@@ -170,6 +369,9 @@ class Client(BaseClient):
     async def on_socket_response(
         self, message: Union[Any, bytes]
     ) -> None:  # pylint: disable=missing-function-docstring
+        if self.recorder is not None and not isinstance(message, bytes):
+            self.recorder.record(message)
+
         if (
             not self._config["ep"]["socket_emit"]
             or isinstance(message, bytes)
@@ -0,0 +1,389 @@
+"""Codec implementations for the websocket relay."""
+import zlib
+from json import dumps as json_dumps, loads as json_loads
+from pickle import dumps as pickle_dumps, loads as pickle_loads
+from struct import Struct
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = (
+    "Codec",
+    "CODECS",
+    "COMPRESSIONS",
+    "Compressor",
+    "Decompressor",
+    "negotiate",
+    "query",
+    "pack",
+    "unpack",
+)
+
+# Big endian packers of every fixed width msgpack type.
+_U8, _U16, _U32, _U64 = Struct(">B"), Struct(">H"), Struct(">I"), Struct(">Q")
+_I8, _I16, _I32, _I64 = Struct(">b"), Struct(">h"), Struct(">i"), Struct(">q")
+_F64 = Struct(">d")
+
+
+def _pack(obj: Any, out: bytearray) -> None:
+    # Ordered by how common they are in gateway payloads.
+    if obj.__class__ is str:
+        data = obj.encode("utf-8")
+        size = len(data)
+
+        if size < 32:
+            out.append(0xA0 | size)
+        elif size < 0x100:
+            out += b"\xd9" + _U8.pack(size)
+        elif size < 0x10000:
+            out += b"\xda" + _U16.pack(size)
+        else:
+            out += b"\xdb" + _U32.pack(size)
+
+        out += data
+
+    elif isinstance(obj, dict):
+        size = len(obj)
+
+        if size < 16:
+            out.append(0x80 | size)
+        elif size < 0x10000:
+            out += b"\xde" + _U16.pack(size)
+        else:
+            out += b"\xdf" + _U32.pack(size)
+
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+
+    elif obj is None:
+        out.append(0xC0)
+
+    elif obj is True:
+        out.append(0xC3)
+
+    elif obj is False:
+        out.append(0xC2)
+
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xFF)
+        elif obj >= 0:
+            if obj < 0x100:
+                out += b"\xcc" + _U8.pack(obj)
+            elif obj < 0x10000:
+                out += b"\xcd" + _U16.pack(obj)
+            elif obj < 0x100000000:
+                out += b"\xce" + _U32.pack(obj)
+            else:
+                out += b"\xcf" + _U64.pack(obj)
+        elif obj >= -0x80:
+            out += b"\xd0" + _I8.pack(obj)
+        elif obj >= -0x8000:
+            out += b"\xd1" + _I16.pack(obj)
+        elif obj >= -0x80000000:
+            out += b"\xd2" + _I32.pack(obj)
+        else:
+            out += b"\xd3" + _I64.pack(obj)
+
+    elif isinstance(obj, (list, tuple)):
+        out += _array_header(len(obj))
+
+        for item in obj:
+            _pack(item, out)
+
+    elif isinstance(obj, float):
+        out += b"\xcb" + _F64.pack(obj)
+
+    elif isinstance(obj, str):
+        _pack(str(obj), out)
+
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        size = len(obj)
+
+        if size < 0x100:
+            out += b"\xc4" + _U8.pack(size)
+        elif size < 0x10000:
+            out += b"\xc5" + _U16.pack(size)
+        else:
+            out += b"\xc6" + _U32.pack(size)
+
+        out += obj
+
+    else:
+        raise TypeError(f"can not pack objects of type {type(obj).__name__!r}")
+
+
+def _array_header(size: int) -> bytes:
+    if size < 16:
+        return bytes((0x90 | size,))
+
+    if size < 0x10000:
+        return b"\xdc" + _U16.pack(size)
+
+    return b"\xdd" + _U32.pack(size)
+
+
+def pack(obj: Any) -> bytes:
+    """Pack ``obj`` in the msgpack format, uses :mod:`msgpack` if it's installed.
+
+    Supports ``None``, booleans, 64 bit integers, floats, strings, bytes,
+    lists, tuples (packed as arrays) and dicts.
+    """
+    if msgpack is not None:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def _unpack(data: bytes, offset: int) -> Tuple[Any, int]:
+    head = data[offset]
+    offset += 1
+
+    if head < 0x80:
+        return head, offset
+
+    if head >= 0xE0:
+        return head - 0x100, offset
+
+    if 0xA0 <= head < 0xC0:
+        end = offset + (head & 0x1F)
+        return data[offset:end].decode("utf-8"), end
+
+    if 0x80 <= head < 0x90:
+        return _unpack_map(data, offset, head & 0x0F)
+
+    if 0x90 <= head < 0xA0:
+        return _unpack_array(data, offset, head & 0x0F)
+
+    if head == 0xC0:
+        return None, offset
+
+    if head == 0xC2:
+        return False, offset
+
+    if head == 0xC3:
+        return True, offset
+
+    if head == 0xCB:
+        return _F64.unpack_from(data, offset)[0], offset + 8
+
+    if head in _FIXED:
+        packer = _FIXED[head]
+        return packer.unpack_from(data, offset)[0], offset + packer.size
+
+    if head in _SIZED:
+        packer, kind = _SIZED[head]
+        size = packer.unpack_from(data, offset)[0]
+        offset += packer.size
+
+        if kind == "array":
+            return _unpack_array(data, offset, size)
+
+        if kind == "map":
+            return _unpack_map(data, offset, size)
+
+        end = offset + size
+        chunk = data[offset:end]
+        return (chunk.decode("utf-8") if kind == "str" else bytes(chunk)), end
+
+    raise ValueError(f"unsupported msgpack type 0x{head:02x} at offset {offset - 1}")
+
+
+def _unpack_array(data: bytes, offset: int, size: int) -> Tuple[List[Any], int]:
+    items = []
+
+    for _ in range(size):
+        item, offset = _unpack(data, offset)
+        items.append(item)
+
+    return items, offset
+
+
+def _unpack_map(data: bytes, offset: int, size: int) -> Tuple[Dict[Any, Any], int]:
+    items = {}
+
+    for _ in range(size):
+        key, offset = _unpack(data, offset)
+        items[key], offset = _unpack(data, offset)
+
+    return items, offset
+
+
+_FIXED = {
+    0xCC: _U8, 0xCD: _U16, 0xCE: _U32, 0xCF: _U64,
+    0xD0: _I8, 0xD1: _I16, 0xD2: _I32, 0xD3: _I64,
+}
+
+_SIZED = {
+    0xC4: (_U8, "bin"), 0xC5: (_U16, "bin"), 0xC6: (_U32, "bin"),
+    0xD9: (_U8, "str"), 0xDA: (_U16, "str"), 0xDB: (_U32, "str"),
+    0xDC: (_U16, "array"), 0xDD: (_U32, "array"),
+    0xDE: (_U16, "map"), 0xDF: (_U32, "map"),
+}
+
+
+def unpack(data: bytes) -> Any:
+    """Unpack a single msgpack encoded object, uses :mod:`msgpack` if it's installed."""
+    if msgpack is not None:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+    obj, offset = _unpack(data, 0)
+
+    if offset != len(data):
+        raise ValueError(f"{len(data) - offset} trailing bytes after the packed object.")
+
+    return obj
+
+
+class Codec(NamedTuple):
+    """A wire format, how frames are turned into bytes and back.
+
+    ``batch`` joins frames encoded already into a single frame without
+    encoding them again, ``unbatch`` decodes such a frame into the list of
+    frames it holds.
+    """
+
+    name: str
+    encode: Callable[[Any], bytes]
+    decode: Callable[[bytes], Any]
+    batch: Callable[[List[bytes]], bytes]
+    unbatch: Callable[[bytes], List[Any]]
+
+
+def _msgpack_batch(payloads: List[bytes]) -> bytes:
+    return _array_header(len(payloads)) + b"".join(payloads)
+
+
+def _json_encode(obj: Any) -> bytes:
+    return json_dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _json_batch(payloads: List[bytes]) -> bytes:
+    return b"[" + b",".join(payloads) + b"]"
+
+
+def _pickle_encode(obj: Any) -> bytes:
+    return pickle_dumps(obj, protocol=5)
+
+
+def _pickle_batch(payloads: List[bytes]) -> bytes:
+    # Pickles can't be spliced, they are nested as bytes instead.
+    return pickle_dumps(payloads, protocol=5)
+
+
+def _pickle_unbatch(data: bytes) -> List[Any]:
+    return [pickle_loads(payload) for payload in pickle_loads(data)]
+
+
+CODECS: Dict[str, Codec] = {
+    codec.name: codec
+    for codec in (
+        Codec("msgpack", pack, unpack, _msgpack_batch, unpack),
+        Codec("json", _json_encode, json_loads, _json_batch, json_loads),
+        # Unpickling runs arbitrary code, only for trusted peers.
+        Codec("pickle", _pickle_encode, pickle_loads, _pickle_batch, _pickle_unbatch),
+    )
+}
+
+COMPRESSIONS: Tuple[str, ...] = ("zlib", "zstd") if zstandard is not None else ("zlib",)
+
+
+class Compressor:
+    """Compress the frames of a single connection as one stream.
+
+    Every frame is flushed on its own, so the peer can decompress it as
+    soon as it arrives, while the compression window is shared with every
+    frame sent before it.
+    """
+
+    def __init__(self, method: str):
+        self.method = method
+
+        if method == "zlib":
+            compressor = zlib.compressobj()
+            self._compress = lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        elif method == "zstd" and zstandard is not None:
+            compressor = zstandard.ZstdCompressor().compressobj()
+            self._compress = lambda data: compressor.compress(data) + compressor.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+        else:
+            raise ValueError(f"unsupported compression {method!r}, expected one of {COMPRESSIONS!r}")
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress the next frame."""
+        return self._compress(data)
+
+
+class Decompressor:
+    """Decompress the frames produced by a :class:`Compressor`, in order."""
+
+    def __init__(self, method: str):
+        self.method = method
+
+        if method == "zlib":
+            self._decompress = zlib.decompressobj().decompress
+        elif method == "zstd" and zstandard is not None:
+            self._decompress = zstandard.ZstdDecompressor().decompressobj().decompress
+        else:
+            raise ValueError(f"unsupported compression {method!r}, expected one of {COMPRESSIONS!r}")
+
+    def decompress(self, data: bytes) -> bytes:
+        """Decompress the next frame."""
+        return self._decompress(data)
+
+
+def query(encoding: str, compress: Optional[str] = None, batch: bool = False) -> str:
+    """The query string a client connects with to ask for ``encoding``, ``compress`` and ``batch``."""
+    return urlencode(
+        {
+            "encoding": encoding,
+            **({"compress": compress} if compress else {}),
+            **({"batch": "true"} if batch else {}),
+        }
+    )
+
+
+def negotiate(path: str, default: str = "pickle") -> Tuple[Codec, Optional[str], bool]:
+    """Pick the codec, compression and batching a client asked for in the query of its request path.
+
+    A client that asks for nothing gets ``default``, unbatched, the format
+    every client spoke before the format could be negotiated.
+
+    >>> negotiate("/?encoding=msgpack&compress=zlib&batch=true")
+    (Codec(name='msgpack', ...), 'zlib', True)
+
+    Raises
+    ------
+    ValueError
+        The client asked for an unknown encoding or compression.
+    """
+    params = parse_qs(urlsplit(path or "").query)
+    encoding = params.get("encoding", [default])[-1]
+    compress = params.get("compress", [None])[-1]
+    batch = params.get("batch", ["false"])[-1].lower()
+
+    if encoding not in CODECS:
+        raise ValueError(f"unsupported encoding {encoding!r}, expected one of {tuple(CODECS)!r}")
+
+    if compress is not None and compress not in COMPRESSIONS:
+        raise ValueError(f"unsupported compression {compress!r}, expected one of {COMPRESSIONS!r}")
+
+    if batch not in ("true", "false", "1", "0"):
+        raise ValueError(f"batch must be true or false, not {batch!r}")
+
+    return CODECS[encoding], compress, batch in ("true", "1")
@@ -9,11 +9,12 @@ from asyncio import Task, iscoroutinefunction
 from contextlib import suppress
 from dataclasses import dataclass, field
 from functools import partial, wraps
-from inspect import iscoroutine, iscoroutinefunction, getmembers, signature
+from inspect import iscoroutine, iscoroutinefunction, getattr_static, signature
 from itertools import cycle
 from re import compile as re_compile, Pattern, Match
 from string import Template
 from sys import stderr
+from types import MethodType
 from typing import (
     Type,
     List,
@@ -28,10 +29,12 @@ from typing import (
 )
 
 from discord import Message
-from ep import ConfigValue
 
-from ..event import Event, EventHandler
-from ..regex import RegexHandler, FormattedRegexHandler, RegexPattern
+from ..config import ConfigValue
+from .cpu import CpuBoundFunction
+from .event import Event, EventHandler
+from .group import Group
+from .regex import RegexHandler, FormattedRegexHandler, RegexPattern
 
 __all__ = ("Cog",)
 
@@ -41,6 +44,10 @@ CoroutineFunction = Callable[..., Coroutine]
 class Cog:
     """Base class for a GuildCog.
 
+    The listeners, tasks, destructors and config values of a cog are
+    discovered once per class when it is defined, an instance only resolves
+    its config values.
+
     Attributes
     ----------
     client : :class:`ep.core.BaseClient`
@@ -52,13 +59,61 @@ class Cog:
 
     Special attributes
     ------------------
-    __cog_listeners__ : List[:class:`types.MethodTypes`]
-        The currently regsitered listeners.
+    __cog_listeners__ : Tuple[Tuple[:class:`str`, :class:`ep.core.event.EventHandler`], ...]
+        The event handlers of the cog and the events they listen for.
+    __cog_tasks__ : Tuple[Callable[..., Coroutine], ...]
+        The functions marked with :meth:`task`.
+    __cog_destructors__ : Tuple[Callable[..., Any], ...]
+        The functions marked with :meth:`destructor`.
+    __cog_config__ : Tuple[Tuple[:class:`str`, :class:`ep.ConfigValue`], ...]
+        The attributes of the cog resolved from the config.
     __cog_name__ : :class:`str`
         The name of the cog.
+    __cog_shard__ : Optional[:class:`int`]
+        The only shard to load the cog on, every shard if ``None``.
+    __cog_state__ : Tuple[:class:`str`, ...]
+        The attributes carried over to the new instance when the module of
+        the cog is hot reloaded, see :meth:`cog_state`.
+    __cog_depends__ : Tuple[:class:`str`, ...]
+        The names of the cogs whose :meth:`cog_setup` has to finish before
+        the one of this cog starts, see :meth:`depends_on`.
     """
 
     group = Group
+    __cog_shard__: Optional[int] = None
+    __cog_state__: Tuple[str, ...] = ()
+    __cog_depends__: Tuple[str, ...] = ()
+    __cog_listeners__: Tuple[Tuple[str, EventHandler], ...] = ()
+    __cog_tasks__: Tuple[CoroutineFunction, ...] = ()
+    __cog_destructors__: Tuple[Callable[..., Any], ...] = ()
+    __cog_config__: Tuple[Tuple[str, ConfigValue], ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        destructors, listeners, tasks, config = [], [], [], []
+
+        for name in dir(cls):
+            # Looked up statically, properties and other descriptors are
+            # never evaluated.
+            obj = getattr_static(cls, name)
+
+            if hasattr(obj, "__cog_unload_cb__"):
+                destructors.append(obj)
+
+            elif isinstance(obj, EventHandler):
+                listeners.append((obj.event.event_type, obj))
+
+            elif hasattr(obj, "__schedule_task__"):
+                tasks.append(obj)
+
+            elif isinstance(obj, ConfigValue):
+                config.append((name, obj))
+
+        cls.__cog_destructors__ = tuple(destructors)
+        cls.__cog_listeners__ = tuple(listeners)
+        cls.__cog_tasks__ = tuple(tasks)
+        cls.__cog_config__ = tuple(config)
 
     def __init__(self, client: "BaseClient"):
         self.logger = client.logger
@@ -67,27 +122,15 @@ class Cog:
 
         self.client = client
 
-        self.__cog_name__ = type(self).__name__
-        self.__cog_destructors__ = []
-        self.__cog_listeners__ = []
-        self.__cog_tasks__ = []
+        # Set once cog_setup has finished (or failed), events are held
+        # back from the handlers of the cog until then.
+        self.cog_ready = asyncio.Event()
+        self.cog_failed = False
 
-        for name, obj in getmembers(self):
-            if hasattr(obj, "__cog_unload_cb__"):
-                self.__cog_destructors__.append(obj)
-
-            elif hasattr(obj, "__event_listener__"):
-                self.__cog_listeners__.append(
-                    (getattr(obj, "__event_listener__"), name)
-                )
-
-            elif hasattr(obj, "__schedule_task__"):
-                self.__cog_tasks__.append(obj)
+        self.__cog_name__ = type(self).__name__
 
-            elif not isinstance(
-                getattr(type(self), name, None), property
-            ) and isinstance(obj, ConfigValue):
-                setattr(self, name, obj.resolve(config))
+        for name, value in self.__cog_config__:
+            setattr(self, name, value.resolve(config))
 
         self.cog_hash = (
             hashlib.md5(
@@ -109,35 +152,138 @@ class Cog:
     ## Creation hooks
 
     def cog_inject(self, client):
-        """An initializer that is called when the client is loading the cog."""
-        disabled = self.config.get("disabled", False)
-
-        for name, method_name in self.__cog_listeners__:
-            client.add_listener(getattr(self, method_name), name)
+        """An initializer that is called when the client is loading the cog.
 
-        if not disabled:
-            for func in self.__cog_tasks__:
-                client.logger.info("Scheduling task: %s", repr(func))
-                client.schedule_task(func())
+        The listeners of the cog are registered straight away, the setup of
+        the cog and then its tasks are started in the background.
+        """
+        for name, handler in self.__cog_listeners__:
+            client.add_listener(handler.bind(self), name)
 
+        client.schedule_task(self._cog_start(client), name=f"{self.__cog_name__}.cog_setup", owner=self)
         return self
 
-    def cog_eject(self, client):
-        """A destructor that is called when the client is unloading the cog."""
+    def cog_reconfigure(self, client) -> None:
+        """A hook that is called once the config of the client was reloaded.
+
+        The :class:`ep.ConfigValue` attributes of the cog are resolved again
+        and its listeners are bound again, so their predicates, limits and
+        formatted patterns follow the new config. If binding a listener
+        fails the cog is left as it was.
+        """
+        bound = [(name, handler.bind(self)) for name, handler in self.__cog_listeners__]
+
+        for name, value in self.__cog_config__:
+            setattr(self, name, value.resolve(self.config))
+
+        client.remove_listeners(self)
+
+        for name, handler in bound:
+            client.add_listener(handler, name)
+
+    async def cog_setup(self) -> None:
+        """Overloadable coroutine that prepares the cog once it was added to a client.
+
+        The setups of every cog run concurrently, ordered only by
+        ``__cog_depends__``. Events are delivered to the handlers of the cog
+        once it has finished and the tasks of the cog are started, if it
+        raises the cog is removed again.
+        """
+
+    def _dependency_cycle(self, client) -> Optional[List[str]]:
+        path = [self.__cog_name__]
+        stack = [(self, iter(self.__cog_depends__))]
+
+        while stack:
+            cog, names = stack[-1]
+            name = next(names, None)
+
+            if name is None:
+                stack.pop()
+                path.pop()
+            elif name == self.__cog_name__:
+                return [*path, name]
+            elif name not in path and (dependency := client.cogs.get(name)) is not None:
+                path.append(name)
+                stack.append((dependency, iter(dependency.__cog_depends__)))
+
+        return None
+
+    async def _cog_start(self, client) -> None:
+        try:
+            if (cycle := self._dependency_cycle(client)) is not None:
+                raise RuntimeError(f"circular cog dependency {' -> '.join(cycle)}")
+
+            for name in self.__cog_depends__:
+                if (dependency := client.cogs.get(name)) is None:
+                    raise LookupError(f"depends on cog {name!r} which isn't loaded")
+
+                await dependency.cog_ready.wait()
+
+                if dependency.cog_failed:
+                    raise RuntimeError(f"depends on cog {name!r} which failed to set up")
+
+            await self.cog_setup()
+        except Exception as err:  # pylint: disable=broad-except
+            self.cog_failed = True
+            client.logger.error("Setup of cog %s failed => %s: %s", self.__cog_name__, type(err).__name__, err)
+
+            if client.cogs.get(self.__cog_name__) is self:
+                # Removing the cog cancels this task, so leave that to the loop.
+                client.loop.call_soon(client.remove_cog, self.__cog_name__)
+
+            return
+        except asyncio.CancelledError:
+            self.cog_failed = True
+            raise
+        finally:
+            self.cog_ready.set()
+
+        if self.config.get("disabled", False):
+            return
+
+        for func in self.__cog_tasks__:
+            method = MethodType(func, self)
+            client.logger.info("Scheduling task: %s", repr(method))
+            name = f"{self.__cog_name__}.{func.__name__}"
+
+            if func.__schedule_task__.get("restart", True):
+                client.supervisor.supervise(method, name=name, owner=self)
+            else:
+                client.schedule_task(method(), name=name, owner=self)
+
+    def cog_eject(self, client) -> asyncio.Future:
+        """A destructor that is called when the client is unloading the cog.
+
+        Returns a future that resolves once the tasks of the cog are cancelled.
+        """
         try:
-            for _, method_name in self.__cog_listeners__:
-                client.remove_listener(getattr(self, method_name))
+            client.remove_listeners(self)
         finally:
             for cb in self.__cog_destructors__:
                 with suppress(Exception):
-                    cb()
+                    cb(self)
+
+        return client.supervisor.cancel(self)
+
+    def cog_state(self) -> Dict[str, Any]:
+        """Collect the state to carry over when the cog is reloaded.
+
+        The default collects the attributes named in ``__cog_state__``.
+        """
+        return {name: getattr(self, name) for name in self.__cog_state__ if hasattr(self, name)}
+
+    def cog_restore(self, state: Dict[str, Any]) -> None:
+        """Restore the state collected by :meth:`cog_state` of the instance this one replaces."""
+        for name, value in state.items():
+            setattr(self, name, value)
 
     # Properties
 
     @property
     def cog_tasks(self) -> List[Task]:
         """List[:class:`asyncio.Task`] - The tasks associated with this cog."""
-        return []
+        return self.client.supervisor.tasks(self)
 
     # staticmethods
 
@@ -153,19 +299,94 @@ class Cog:
         return klass
 
     @staticmethod
-    def task(corofunc: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    def single_shard(klass: Optional[Type["Cog"]] = None, *, shard_id: int = 0):
+        """Mark a Cog class to be loaded by a single shard when the client is sharded.
+
+        >>> @Cog.export
+        ... @Cog.single_shard
+        ... class Banner(Cog):
+        ...     pass
+
+        Parameters
+        ----------
+        shard_id : :class:`int`
+            The id of the shard to load the cog on.
+        """
+
+        def decorator(klass: Type["Cog"]) -> Type["Cog"]:
+            klass.__cog_shard__ = shard_id
+            return klass
+
+        return decorator if klass is None else decorator(klass)
+
+    @staticmethod
+    def depends_on(*cogs: Union[str, Type["Cog"]]):
+        r"""Mark a Cog class to be set up after the given cogs.
+
+        >>> @Cog.export
+        ... @Cog.depends_on("Tagging")
+        ... class Search(Cog):
+        ...     pass
+
+        Parameters
+        ----------
+        \*cogs : Union[:class:`str`, Type[:class:`ep.Cog`]]
+            The cogs, or their names, whose :meth:`cog_setup` has to finish first.
+        """
+
+        def decorator(klass: Type["Cog"]) -> Type["Cog"]:
+            klass.__cog_depends__ = tuple(
+                cog if isinstance(cog, str) else cog.__name__ for cog in cogs
+            )
+            return klass
+
+        return decorator
+
+    @staticmethod
+    def task(
+        corofunc: Optional[Callable[..., Awaitable]] = None, *, restart: bool = True
+    ) -> Callable[..., Awaitable]:
         """Mark coroutine function to be scheduled as a :class:`asyncio.Task`.
 
+        The task is supervised by the client, if it raises it is restarted
+        with exponential backoff unless ``restart`` is ``False``.
+
         Parameters
         ----------
         corofunc : Callable[..., Coroutine]
             The coroutine function to mark.
+        restart : :class:`bool`
+            Whether to restart the task when it raises.
         """
-        if not asyncio.iscoroutinefunction(corofunc):
-            raise TypeError("target function must be a coroutine function.")
 
-        corofunc.__schedule_task__ = True
-        return corofunc
+        def decorator(corofunc: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+            if not asyncio.iscoroutinefunction(corofunc):
+                raise TypeError("target function must be a coroutine function.")
+
+            corofunc.__schedule_task__ = {"restart": restart}
+            return corofunc
+
+        return decorator if corofunc is None else decorator(corofunc)
+
+    @staticmethod
+    def cpu_bound(func: Callable[..., Any]) -> CpuBoundFunction:
+        """Mark a function to be run in the process pool of the client.
+
+        The function does not receive ``self``, the cog stays in the client
+        process. Accessed through the cog it becomes a coroutine function.
+
+        >>> @Cog.cpu_bound
+        ... def render(source: str) -> bytes:
+        ...     ...
+        ...
+        >>> image = await self.render(source)
+
+        Parameters
+        ----------
+        func : Callable[..., Any]
+            The function to mark, its arguments and result must be picklable.
+        """
+        return CpuBoundFunction(func)
 
     @staticmethod
     def destructor(func: Callable) -> Callable:
@@ -246,6 +467,9 @@ class Cog:
         *,
         tp: str = "",  # pylint: disable=invalid-name
         group: Optional[Group] = None,
+        max_concurrency: Optional[int] = None,
+        deadline: Optional[float] = None,
+        overflow: Optional[str] = None,
         **attrs: Any,
     ) -> Union[Event, EventHandler]:
         """Mark a coroutine function as an event listener.
@@ -278,13 +502,25 @@ class Cog:
             The type of event to listen out for.
         group : :class:`ep.Group`
             The group this event is associated with, None otherwise.
+        max_concurrency : Optional[:class:`int`]
+            The maximum amount of invocations of the handler in flight.
+        deadline : Optional[:class:`float`]
+            Seconds after which an invocation of the handler is cancelled.
+        overflow : Optional[:class:`str`]
+            What to do with an invocation past ``max_concurrency``, one of
+            ``"queue"`` (the default), ``"drop_oldest"`` or ``"reject"``.
+            Limits left unset are taken from ``[ep.limits.<cog name>]``.
         **attrs : Any
             Implemented for presence based rich predicates.
         """
-        if not tp or _corofunc is None:
+        if not tp and _corofunc is None:
             raise ValueError("Must specify a ``tp`` argument or a coroutine function.")
 
-        event = Event(tp, attrs=attrs, group=group)
+        if not tp:
+            tp = _corofunc.__name__
+
+        limits = {"max_concurrency": max_concurrency, "deadline": deadline, "overflow": overflow}
+        event = Event(tp, attrs=attrs, group=group, limits=limits)
 
         if _corofunc is not None:
             return event(_corofunc)
@@ -296,6 +532,11 @@ class Cog:
         pattern: RegexPattern,
         *,
         filter_: Union[bool, None, Callable[[Match], bool]] = None,
+        expensive: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        deadline: Optional[float] = None,
+        overflow: Optional[str] = None,
         **attrs: Any,
     ):
         """Regex based message content parsing.
@@ -315,6 +556,13 @@ class Cog:
         ----------
         pattern : :class:`RegexPattern`
             The regex pattern to match against
+        expensive : Optional[:class:`bool`]
+            Whether to match in the clients bounded regex executor instead of
+            inline on the event loop, ``None`` detects ReDoS prone patterns.
+        timeout : Optional[:class:`float`]
+            The time budget of an expensive match, defaults to the executors.
+        max_concurrency, deadline, overflow
+            The concurrency limits of the handler, see :meth:`event`.
         **attrs : Any
             Further attrs to pass into :func:`event`
 
@@ -333,12 +581,16 @@ class Cog:
 
         kwargs = {
             "filter_": filter_,
+            "expensive": expensive,
+            "timeout": timeout,
             "pattern": re_compile(pattern)
             if not isinstance(pattern, Pattern)
             else pattern,
         }
 
-        wrapped = Event("on_message", cls=RegexHandler, attrs=attrs)
+        group = attrs.pop("group", None)
+        limits = {"max_concurrency": max_concurrency, "deadline": deadline, "overflow": overflow}
+        wrapped = Event("on_message", cls=RegexHandler, group=group, attrs=attrs, limits=limits)
         return partial(wrapped, **kwargs)
 
 
@@ -347,12 +599,19 @@ class Cog:
         formatter: Callable[["ep.Client"], Dict[str, Any]],
         pattern: RegexPattern,
         filter_: Union[bool, None, Callable[[Match], bool]] = None,
+        expensive: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        deadline: Optional[float] = None,
+        overflow: Optional[str] = None,
         **attrs,
     ) -> Callable:
         """Like :meth:`Cog.regex` but lazilly formats the pattern using the provided formatter.
 
         Conceptually its the same as :meth:`Cog.regex` but where it differs is
-        the pattern used is ``pattern.format(**formatter(client))``
+        the pattern used is ``Template(pattern).substitute(formatter(client))``,
+        formatted and compiled when the cog is injected and again only once
+        the clients config is replaced.
 
         Patterns
         --------
@@ -360,6 +619,13 @@ class Cog:
             The formatter to use.
         pattern : :class:`str`
             The pattern to format.
+        expensive : Optional[:class:`bool`]
+            Whether to match in the clients bounded regex executor, ``None``
+            detects ReDoS prone patterns once they are formatted.
+        timeout : Optional[:class:`float`]
+            The time budget of an expensive match, defaults to the executors.
+        max_concurrency, deadline, overflow
+            The concurrency limits of the handler, see :meth:`Cog.event`.
         attrs : Any
             Any subsequent attrs to filter against, see :meth:`Cog.event`
         """
@@ -368,5 +634,16 @@ class Cog:
         if not isinstance(pattern, str):
             raise TypeError("Bad pattern.")
 
-        wrapped = Event("on_message", cls=FormattedRegexHandler, attrs=attrs)
-        return partial(wrapped, filter_=filter_, pattern=pattern)
+        group = attrs.pop("group", None)
+        limits = {"max_concurrency": max_concurrency, "deadline": deadline, "overflow": overflow}
+        wrapped = Event(
+            "on_message", cls=FormattedRegexHandler, group=group, attrs=attrs, limits=limits
+        )
+        return partial(
+            wrapped,
+            formatter=formatter,
+            filter_=filter_,
+            pattern=pattern,
+            expensive=expensive,
+            timeout=timeout,
+        )
@@ -0,0 +1,200 @@
+"""CpuPool and CpuBoundFunction implementations."""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial, update_wrapper
+from importlib import import_module
+from logging import Logger, getLogger
+from multiprocessing import get_context
+from os import cpu_count
+from pickle import dumps as pickle_dumps, loads as pickle_loads
+from typing import Any, Callable, Optional, Tuple
+
+__all__ = ("CpuPool", "CpuBoundFunction", "ResultTooLarge")
+
+
+class ResultTooLarge(ValueError):
+    """Raised when the pickled result of a cpu bound call exceeds the size limit."""
+
+
+def _noop() -> None:
+    return None
+
+
+def _resolve(ref: Tuple[str, str]) -> Callable[..., Any]:
+    module, qualname = ref
+    obj = import_module(module)
+
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+
+    return getattr(obj, "__wrapped__", obj)
+
+
+def _call(func: Any, args: Tuple[Any, ...], kwargs: Any, max_result_size: Optional[int]) -> bytes:
+    # Runs in a worker, the result is pickled here so an oversized one is
+    # refused before it is shipped back over the pipe.
+    if isinstance(func, tuple):
+        func = _resolve(func)
+
+    data = pickle_dumps(func(*args, **kwargs), protocol=5)
+
+    if max_result_size is not None and len(data) > max_result_size:
+        raise ResultTooLarge(
+            f"result of {getattr(func, '__qualname__', func)} is {len(data)} bytes,"
+            f" more than the limit of {max_result_size} bytes."
+        )
+
+    return data
+
+
+class CpuBoundFunction:
+    """A function marked with :meth:`ep.Cog.cpu_bound`.
+
+    Accessed through a cog instance it becomes a coroutine function that runs
+    the function in the :class:`CpuPool` of the cogs client, without the
+    cog itself, which never crosses the process boundary. Called directly it
+    runs inline.
+    """
+
+    def __init__(self, func: Callable[..., Any]):
+        if asyncio.iscoroutinefunction(func):
+            raise TypeError("cpu bound function must not be a coroutine function.")
+
+        update_wrapper(self, func)
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> Any:
+        if instance is None:
+            return self
+
+        return partial(instance.client.cpu_pool.run, self)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.__wrapped__(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"<CpuBoundFunction {self.__qualname__}>"
+
+    @property
+    def ref(self) -> Tuple[str, str]:
+        """Tuple[:class:`str`, :class:`str`] - The module and qualified name workers import the function by."""
+        return self.__module__, self.__qualname__
+
+
+class CpuPool:
+    """A process pool owned by a client for GIL bound work.
+
+    The pool is started on first use, or ahead of time by :meth:`warmup` so
+    the first calls don't pay for starting the workers. Results are pickled
+    in the worker and refused there if they are larger than
+    ``max_result_size`` bytes.
+
+    Functions are sent to the workers by reference, the modules of cogs
+    must be importable by them. Cog modules are imported from a directory
+    that is only on :data:`sys.path` while they are imported, so the
+    workers are forked from the client, inheriting its modules, and other
+    start methods only work for modules importable from the default path.
+    Workers keep the code they were forked with, :meth:`recycle` replaces
+    them after a cog module is reloaded.
+
+    Parameters
+    ----------
+    max_workers : Optional[:class:`int`]
+        The amount of worker processes, defaults to the amount of cpus.
+    start_method : Optional[:class:`str`]
+        The :mod:`multiprocessing` start method of the workers, ``fork``
+        by default.
+    warmup : :class:`bool`
+        Whether the client should start the workers ahead of time.
+    max_result_size : Optional[:class:`int`]
+        The largest pickled result in bytes, ``0`` for unlimited.
+    logger : Optional[:class:`logging.Logger`]
+        The logger to report broken pools to.
+    """
+
+    max_workers: int = cpu_count() or 1
+    start_method: str = "fork"
+    warmup_workers: bool = False
+    max_result_size: Optional[int] = 8 * 1024 * 1024
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        *,
+        start_method: Optional[str] = None,
+        warmup: Optional[bool] = None,
+        max_result_size: Optional[int] = None,
+        logger: Optional[Logger] = None,
+    ):
+        if max_workers is not None:
+            self.max_workers = max_workers
+
+        if start_method is not None:
+            self.start_method = start_method
+
+        if warmup is not None:
+            self.warmup_workers = warmup
+
+        if max_result_size is not None:
+            self.max_result_size = max_result_size or None
+
+        self.logger = logger or getLogger(__name__)
+        self.__pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        """:class:`concurrent.futures.ProcessPoolExecutor` - The pool, started if it wasn't."""
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(self.max_workers, mp_context=get_context(self.start_method))
+
+        return self.__pool
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``func(*args, **kwargs)`` in a worker and return its result."""
+        target = func.ref if isinstance(func, CpuBoundFunction) else func
+        pool = self.pool
+
+        try:
+            data = await asyncio.wrap_future(
+                pool.submit(_call, target, args, kwargs, self.max_result_size)
+            )
+        except BrokenProcessPool:
+            # A worker died, the pool is unusable from now on so start over.
+            self.logger.error("A cpu pool worker died while running %s", repr(func))
+
+            if self.__pool is pool:
+                self.__pool = None
+                pool.shutdown(wait=False)
+
+            raise
+
+        return pickle_loads(data)
+
+    async def warmup(self) -> None:
+        """Start every worker ahead of time."""
+        await asyncio.gather(*(self.run(_noop) for _ in range(self.max_workers)))
+
+    def recycle(self) -> bool:
+        """Replace the workers with fresh ones on next use.
+
+        Calls already submitted finish in the old workers.
+
+        Returns
+        -------
+        :class:`bool`
+            Whether the pool had been started.
+        """
+        pool, self.__pool = self.__pool, None
+
+        if pool is None:
+            return False
+
+        pool.shutdown(wait=False)
+        return True
+
+    def shutdown(self) -> None:
+        """Shutdown the workers without waiting for pending calls."""
+        pool, self.__pool = self.__pool, None
+
+        if pool is not None:
+            pool.shutdown(wait=False)
@@ -0,0 +1,302 @@
+"""DispatchTable implementation."""
+from collections import defaultdict
+from operator import attrgetter
+from typing import Any, Callable, DefaultDict, Dict, Hashable, List, Optional, Tuple
+
+__all__ = ("DispatchTable",)
+
+Listener = Callable[..., Any]
+IndexKey = Tuple[int, Tuple[str, ...]]
+Prefixes = Tuple[int, Tuple[str, ...]]
+
+
+def _identity(obj: Any) -> Any:
+    return obj
+
+
+class _PrefixTrie:
+    """A character trie of listeners keyed by the literal prefixes of their patterns.
+
+    Looking up a message walks its content once, at most as far as the
+    longest registered prefix, collecting every listener on the way.
+    """
+
+    __slots__ = ("root",)
+
+    def __init__(self):
+        self.root: Tuple[Dict[str, Any], Dict[Listener, None]] = ({}, {})
+
+    def __bool__(self) -> bool:
+        return bool(self.root[0])
+
+    def add(self, prefix: str, listener: Listener) -> None:
+        children, listeners = self.root
+
+        for char in prefix:
+            if char not in children:
+                children[char] = ({}, {})
+
+            children, listeners = children[char]
+
+        listeners[listener] = None
+
+    def remove(self, prefix: str, listener: Listener) -> None:
+        path = [self.root]
+
+        for char in prefix:
+            path.append(path[-1][0][char])
+
+        del path[-1][1][listener]
+
+        # Prune the nodes that no longer lead anywhere.
+        for char, (node, parent) in zip(reversed(prefix), zip(reversed(path), reversed(path[:-1]))):
+            if node[0] or node[1]:
+                break
+
+            del parent[0][char]
+
+    def lookup(self, content: str) -> Dict[Listener, None]:
+        found: Dict[Listener, None] = {}
+        children, _ = self.root
+
+        for char in content:
+            try:
+                children, listeners = children[char]
+            except KeyError:
+                break
+
+            if listeners:
+                found.update(listeners)
+
+            if not children:
+                break
+
+        return found
+
+
+class _EventSlot:
+    """The listeners registered under a single event name.
+
+    Listeners with an equality predicate are stored in a hash index keyed by
+    the (argument position, attribute path) the predicate reads from, and
+    then by the expected value. Regex listeners with literal prefixes are
+    stored in a prefix trie per message position. Everything else lives in
+    ``listeners``.
+
+    Dictionaries with ``None`` values are used as insertion ordered sets.
+    """
+
+    __slots__ = ("listeners", "indexes", "getters", "tries", "locations")
+
+    def __init__(self):
+        self.listeners: Dict[Listener, None] = {}
+        self.indexes: Dict[IndexKey, Dict[Hashable, Dict[Listener, None]]] = {}
+        self.getters: Dict[IndexKey, Callable[[Any], Any]] = {}
+        self.tries: Dict[int, _PrefixTrie] = {}
+        self.locations: Dict[Listener, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def add(
+        self,
+        listener: Listener,
+        key: Optional[Tuple[IndexKey, Hashable]],
+        prefixes: Optional[Prefixes],
+    ) -> None:
+        if listener in self.locations:
+            return
+
+        if prefixes is not None:
+            self.locations[listener] = prefixes
+            position, literals = prefixes
+
+            try:
+                trie = self.tries[position]
+            except KeyError:
+                trie = self.tries[position] = _PrefixTrie()
+
+            for prefix in literals:
+                trie.add(prefix, listener)
+
+            return
+
+        self.locations[listener] = key
+
+        if key is None:
+            self.listeners[listener] = None
+            return
+
+        index_key, expected = key
+
+        if index_key not in self.indexes:
+            _, tail = index_key
+            self.indexes[index_key] = {}
+            self.getters[index_key] = attrgetter(".".join(tail)) if tail else _identity
+
+        self.indexes[index_key].setdefault(expected, {})[listener] = None
+
+    def remove(self, listener: Listener) -> bool:
+        try:
+            key = self.locations.pop(listener)
+        except KeyError:
+            return False
+
+        if key is None:
+            del self.listeners[listener]
+            return True
+
+        # Trie locations are ``(position, literals)`` pairs while index
+        # locations are ``((position, tail), expected)`` pairs.
+        if isinstance(key[0], int):
+            position, literals = key
+            trie = self.tries[position]
+
+            for prefix in literals:
+                trie.remove(prefix, listener)
+
+            if not trie:
+                del self.tries[position]
+
+            return True
+
+        index_key, expected = key
+        index = self.indexes[index_key]
+        bucket = index[expected]
+        del bucket[listener]
+
+        if not bucket:
+            del index[expected]
+
+        if not index:
+            del self.indexes[index_key]
+            del self.getters[index_key]
+
+        return True
+
+    def lookup(self, args: Tuple[Any, ...]) -> List[Listener]:
+        candidates = list(self.listeners)
+
+        for index_key, index in self.indexes.items():
+            position, _ = index_key
+
+            try:
+                value = self.getters[index_key](args[position])
+                bucket = index.get(value)
+            except (IndexError, AttributeError, TypeError):
+                # The attribute is missing or unhashable, no predicate
+                # in this index could possibly be satisfied.
+                continue
+
+            if bucket:
+                candidates.extend(bucket)
+
+        for position, trie in self.tries.items():
+            try:
+                candidates.extend(trie.lookup(args[position].content))
+            except (IndexError, AttributeError, TypeError):
+                continue
+
+        return candidates
+
+
+class DispatchTable:
+    """An indexed mapping of event names to their listeners.
+
+    Adding and removing a listener are both O(1), looking up the listeners of
+    an event costs one hash lookup per distinct indexed attribute path rather
+    than one predicate evaluation per listener.
+    """
+
+    def __init__(self):
+        self._slots: Dict[str, _EventSlot] = {}
+        self._owners: DefaultDict[Any, Dict[Tuple[str, Listener], None]] = defaultdict(dict)
+        self._owned: Dict[Tuple[str, Listener], Any] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._slots
+
+    def __len__(self) -> int:
+        return sum(map(len, self._slots.values()))
+
+    def add(
+        self,
+        name: str,
+        listener: Listener,
+        *,
+        key: Optional[Tuple[IndexKey, Hashable]] = None,
+        prefixes: Optional[Prefixes] = None,
+        owner: Any = None,
+    ) -> None:
+        """Register a listener for an event.
+
+        Parameters
+        ----------
+        name : :class:`str`
+            The name of the event, e.g. ``"on_message"``.
+        listener : Callable[..., Coroutine]
+            The listener to register.
+        key : Optional[Tuple[Tuple[:class:`int`, Tuple[:class:`str`, ...]], Hashable]]
+            The equality predicate to index the listener on, the listener is
+            a candidate for every event when ``None``.
+        prefixes : Optional[Tuple[:class:`int`, Tuple[:class:`str`, ...]]]
+            The position of a message in the arguments and the literal
+            prefixes its content must start with for the listener to be a
+            candidate, takes precedence over ``key``.
+        owner : Any
+            The object that registered the listener, see :meth:`remove_owner`.
+        """
+        try:
+            slot = self._slots[name]
+        except KeyError:
+            slot = self._slots[name] = _EventSlot()
+
+        slot.add(listener, key, prefixes)
+
+        if owner is not None:
+            self._owners[owner][(name, listener)] = None
+            self._owned[(name, listener)] = owner
+
+    def remove(self, name: str, listener: Listener) -> bool:
+        """Remove a listener, returns ``False`` if it was not registered."""
+        try:
+            slot = self._slots[name]
+        except KeyError:
+            return False
+
+        removed = slot.remove(listener)
+
+        if not slot:
+            del self._slots[name]
+
+        if (owner := self._owned.pop((name, listener), None)) is not None:
+            entries = self._owners[owner]
+            entries.pop((name, listener), None)
+
+            if not entries:
+                del self._owners[owner]
+
+        return removed
+
+    def remove_owner(self, owner: Any) -> int:
+        """Remove every listener registered by ``owner``, returns the amount removed."""
+        entries = list(self._owners.get(owner, ()))
+        return sum(self.remove(name, listener) for name, listener in entries)
+
+    def listeners(self, name: str) -> List[Listener]:
+        """List every listener registered for an event."""
+        try:
+            slot = self._slots[name]
+        except KeyError:
+            return []
+
+        return list(slot.locations)
+
+    def lookup(self, name: str, args: Tuple[Any, ...]) -> List[Listener]:
+        """Find the listeners of an event that could accept ``args``."""
+        try:
+            slot = self._slots[name]
+        except KeyError:
+            return []
+
+        return slot.lookup(args)
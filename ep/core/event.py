@@ -1,23 +1,46 @@
+"""Event and EventHandler implementations."""
 from asyncio import iscoroutinefunction
-from functools import reduce, partial
-from inspect import signature, Signature
+from functools import partial
+from inspect import signature as inspect_signature, Signature, Parameter
+from operator import attrgetter
+from time import perf_counter
+from types import MethodType
+from typing import Any, Callable, Coroutine, Dict, Optional, Tuple
+
+from ..config import ConfigValue
+from .group import Group
+from .limits import HandlerLimit
+from .metrics import HandlerMetrics
+
+__all__ = ("Event", "EventHandler", "BoundEventHandler")
+
+CoroutineFunction = Callable[..., Coroutine]
+
+_POSITIONAL = (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)
 
 
 class Event:
-    __slots__ = ("event_type", "attrs", "group", "klass")
+    __slots__ = ("event_type", "attrs", "raw_attrs", "group", "klass", "limits")
 
     def __init__(
         self,
         event_type: str,
         *,
-        group: Group,
-        cls: EventHandler = EventHandler,
+        group: Optional[Group] = None,
+        cls: Optional[type] = None,
         attrs: Dict[str, Any],
+        limits: Optional[Dict[str, Any]] = None,
     ):
-        self.klass = cls
+        if not event_type.startswith("on_"):
+            event_type = f"on_{event_type}"
+
+        self.klass = cls if cls is not None else EventHandler
         self.event_type = event_type
         self.group = group
         self.raw_attrs = attrs
+        self.limits = {
+            key: value for key, value in (limits or {}).items() if value is not None
+        }
 
         self.attrs = {}
         for target, expected in attrs.items():
@@ -35,7 +58,7 @@ class Event:
 
             self.attrs[parts] = expected
 
-    def __call__(self, callback: CoroutineFunction, *args, **kwargs) -> EventHandler:
+    def __call__(self, callback: CoroutineFunction, *args, **kwargs) -> "EventHandler":
         return self.klass(self, callback, *args, **kwargs)
 
     def __hash__(self) -> int:
@@ -45,8 +68,19 @@ class Event:
         return f"<Event: {self.event_type=!r}, {self.group=!r}>"
 
 
+Predicate = Callable[[Tuple[Any, ...]], bool]
+
+
+def _always(_: Tuple[Any, ...]) -> bool:
+    return True
+
+
+def _identity(obj: Any) -> Any:
+    return obj
+
+
 class EventHandler:
-    __slots__ = ("callback",)
+    __slots__ = ("event", "callback", "signature", "positions", "predicates")
 
     def __init__(
         self,
@@ -79,56 +113,224 @@ class EventHandler:
                 )
 
             self.signature = signature
-            return
+        else:
+            self.signature = inspect_signature(func)
+
+        # The position of every named argument in the dispatched arguments,
+        # i.e. the positional parameters of the callback excluding ``self``.
+        positional = [
+            name
+            for name, parameter in self.signature.parameters.items()
+            if parameter.kind in _POSITIONAL
+        ]
+        self.positions = {name: index for index, name in enumerate(positional[1:])}
+
+        # Compile the attrs once into ``(position, getter, expected)`` triples
+        # ``foo_bar_baz=obj`` becomes ``attrgetter("bar.baz")(args[n]) == obj``
+        predicates = []
+        for (head, *tail), expected in self.event.attrs.items():
+            try:
+                position = self.positions[head]
+            except KeyError:
+                raise NameError(f"name {head!r} is not defined.") from None
+
+            getter = attrgetter(".".join(tail)) if tail else _identity
+            predicates.append((position, tuple(tail), getter, expected))
 
-        self.signature = signature(func)
+        self.predicates = tuple(predicates)
+
+    def __get__(self, instance: Any, owner: Optional[type] = None) -> Any:
+        if instance is None:
+            return self
+
+        return MethodType(self, instance)
 
     def __repr__(self) -> str:
         return repr(self.callback)
 
     async def __call__(self, *args, **kwargs) -> Any:
-        if not self.event.attrs:
-            return await self.callback(*args, **kwargs)
+        owner, *args = args
+        predicate = self.compile_predicate(owner.config)
+        return await self.invoke(owner, tuple(args), kwargs, predicate)
+
+    async def invoke(
+        self,
+        owner: Any,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        predicate: Predicate = _always,
+        limit: Optional[HandlerLimit] = None,
+        metrics: Optional[HandlerMetrics] = None,
+    ) -> Any:
+        """Invoke the callback for ``owner`` if the predicates are satisfied."""
+        if not predicate(args) or not await self.should_run(owner, args, kwargs):
+            if metrics is not None:
+                metrics.rejected += 1
+
+            return None
+
+        if not owner.cog_ready.is_set():
+            await owner.cog_ready.wait()
+
+        if owner.cog_failed:
+            return None
+
+        started = perf_counter()
+
+        try:
+            if limit is None:
+                return await self.callback(owner, *args, **kwargs)
+
+            return await limit.run(self.callback(owner, *args, **kwargs))
+        except Exception as exc:
+            if metrics is not None:
+                metrics.exceptions += 1
+
+            if (group := self.event.group) is not None:
+                bound = self.signature.bind(owner, *args, **kwargs)
+                await group.raise_exception(exc, self, bound)
+
+            raise
+        finally:
+            if metrics is not None:
+                metrics.latency.observe(perf_counter() - started)
+
+    def bind(self, owner: Any) -> "BoundEventHandler":
+        """Bind this handler to the :class:`ep.Cog` that owns it."""
+        return BoundEventHandler(self, owner)
+
+    def compile_predicate(self, config: Any) -> Predicate:
+        """Specialise the attribute predicates into a single callable.
+
+        Any :class:`ep.ConfigValue` is resolved against ``config`` here so the
+        returned predicate only has to do the attribute loads and comparisons.
+        """
+        checks = tuple(
+            (
+                position,
+                getter,
+                expected.resolve(config) if isinstance(expected, ConfigValue) else expected,
+            )
+            for position, _, getter, expected in self.predicates
+        )
+
+        if not checks:
+            return _always
+
+        if len(checks) == 1:
+            ((position, getter, expected),) = checks
+
+            def predicate(args: Tuple[Any, ...]) -> bool:
+                try:
+                    return getter(args[position]) == expected
+                except (IndexError, AttributeError):
+                    return False
 
-        can_run = await self.should_run(args, kwargs)
+            return predicate
 
-        if can_run:
+        def predicate(args: Tuple[Any, ...]) -> bool:  # pylint: disable=function-redefined
             try:
-                return await self.callback(*args, **kwargs)
-            except Exception as exc:
-                if (group := self.event.group) is not None:
-                    await group.raise_exception(exc, self, bound)
+                for position, getter, expected in checks:
+                    if getter(args[position]) != expected:
+                        return False
+            except (IndexError, AttributeError):
+                return False
 
-                raise
+            return True
 
-    async def should_run(self, args, kwargs) -> bool:
-        # Bind the signature over the current arguments
-        bound = self.signature.bind(*args, **kwargs)
+        return predicate
 
-        assert "self" in bound.arguments, "no 'self' in callback"
+    def index_key(self, config: Any) -> Optional[Tuple[Tuple[int, Tuple[str, ...]], Any]]:
+        """Pick an equality predicate suitable for a dispatch index.
 
-        # Pre-invokation predicates
-        for parts, expected in self.event.attrs.items():
+        Returns a pair of ``((position, tail), expected)`` where ``position``
+        is the index of the dispatched argument the predicate starts from and
+        ``tail`` the attribute path resolved from it, ``None`` when no
+        predicate of the handler can be indexed.
+        """
+        for position, tail, _, expected in self.predicates:
             if isinstance(expected, ConfigValue):
-                expected = expected.resolve(bound.arguments["self"].config)
-
-            head, *tail = parts
+                expected = expected.resolve(config)
 
             try:
-                base = bound.arguments[head]
-            except KeyError:
-                raise NameError(f"name {head!r} is not defined.")
+                hash(expected)
+            except TypeError:
+                continue
 
-            # Further resolve nested attributes
-            # ``foo_bar_baz=obj` becomes ``assert foo.bar.baz == obj``
-            try:
-                base = reduce(partial(getattr, base), tail)
-            except AttributeError:
-                return False
+            return (position, tail), expected
 
-            # Compare the resolved value with the excepted argument.
-            if base != expected:
-                # Failed to satisfy comparison, return eagerly.
-                return False
+        return None
 
+    def literal_prefixes(
+        self, config: Any, owner: Any = None
+    ) -> Optional[Tuple[int, Tuple[str, ...]]]:
+        """The literal prefixes a messages content must start with for the handler to run.
+
+        Returns a pair of ``(position, prefixes)`` where ``position`` is the
+        index of the message in the dispatched arguments, ``None`` when the
+        handler does not filter on message content. ``owner`` is the cog
+        the handler is bound to, if it is bound.
+        """
+        return None
+
+    async def should_run(self, owner: Any, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> bool:
+        """Overloadable check run after the attribute predicates have passed."""
         return True
+
+
+class BoundEventHandler:
+    """An :class:`EventHandler` bound to the :class:`ep.Cog` that owns it.
+
+    Bound handlers are what the client actually registers and dispatches to,
+    calling one invokes the handler with the owning cog as ``self``. The
+    attribute predicates are compiled when the handler is bound, i.e. when
+    the cog is injected.
+
+    The concurrency limits of the handler are taken from the :class:`Event`
+    and filled in by the ``[ep.limits.<cog name>]`` table of the config.
+    """
+
+    __slots__ = ("handler", "owner", "predicate", "limit", "metrics")
+
+    def __init__(self, handler: EventHandler, owner: Any):
+        self.handler = handler
+        self.owner = owner
+        self.predicate = handler.compile_predicate(owner.config)
+
+        cog_name = getattr(owner, "__cog_name__", type(owner).__name__)
+        name = f"{cog_name}.{getattr(handler.callback, '__name__', handler.callback)!s}"
+        limits = {
+            **owner.config.get("ep", {}).get("limits", {}).get(cog_name, {}),
+            **handler.event.limits,
+        }
+
+        self.limit = (
+            HandlerLimit(**limits, logger=getattr(owner, "logger", None), name=name)
+            if limits
+            else None
+        )
+
+        # Counters are keyed by name so they carry over a cog being reloaded.
+        self.metrics: Optional[HandlerMetrics] = None
+
+        if (metrics := getattr(getattr(owner, "client", None), "metrics", None)) is not None:
+            group = getattr(handler.event.group, "name", None) or None
+            self.metrics = metrics.handler(name, group)
+            self.metrics.limit = self.limit
+
+    @property
+    def event(self) -> Event:
+        """:class:`Event` - The event the handler listens for."""
+        return self.handler.event
+
+    def __call__(self, *args, **kwargs) -> Coroutine:
+        return self.handler.invoke(
+            self.owner, args, kwargs, self.predicate, self.limit, self.metrics
+        )
+
+    def invoke(self, *args, **kwargs) -> Coroutine:
+        """Call the handler without evaluating :attr:`predicate`, for when it already passed."""
+        return self.handler.invoke(self.owner, args, kwargs, limit=self.limit, metrics=self.metrics)
+
+    def __repr__(self) -> str:
+        return f"<BoundEventHandler handler={self.handler!r} owner={self.owner!r}>"
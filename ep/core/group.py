@@ -1,14 +1,32 @@
+"""Group implementation."""
+from asyncio import iscoroutine
+from contextlib import suppress
 from dataclasses import dataclass, field
+from typing import Any, Callable, List
+
+__all__ = ("Group",)
 
 
 @dataclass
 class Group:
-    """A semantically bound grouping of various events."""
+    """A semantically bound grouping of various events.
+
+    Parameters
+    ----------
+    name : :class:`str`
+        The name of the group, e.g. in metrics. Defaults to the qualified
+        name of the class attribute the group is assigned to.
+    """
 
+    name: str = ""
     __exc_handlers: List[Callable[[BaseException], Any]] = field(
         init=False, default_factory=list
     )
 
+    def __set_name__(self, owner: type, name: str) -> None:
+        if not self.name:
+            self.name = f"{owner.__name__}.{name}"
+
     def add_exception_handler(self, handler: Callable[[BaseException], Any]):
         """Adds `handler` to the list of exception handlers."""
         self.__exc_handlers.append(handler)
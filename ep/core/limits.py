@@ -0,0 +1,189 @@
+"""HandlerLimit implementation."""
+from asyncio import CancelledError, Future, current_task, ensure_future, get_event_loop, wait
+from collections import deque
+from contextlib import suppress
+from logging import Logger, getLogger
+from typing import Any, Coroutine, Deque, Dict, Optional
+
+__all__ = ("HandlerLimit", "QUEUE", "DROP_OLDEST", "REJECT", "OVERFLOW_POLICIES")
+
+QUEUE: str = "queue"
+DROP_OLDEST: str = "drop_oldest"
+REJECT: str = "reject"
+
+OVERFLOW_POLICIES = (QUEUE, DROP_OLDEST, REJECT)
+
+
+class HandlerLimit:
+    """Bound the in-flight invocations of a handler and how long each may run.
+
+    When ``max_concurrency`` invocations are already in flight the
+    ``overflow`` policy decides what happens to a new one:
+
+     - ``"queue"`` waits for an invocation to finish.
+     - ``"drop_oldest"`` cancels the oldest invocation in flight.
+     - ``"reject"`` drops the new invocation.
+
+    Parameters
+    ----------
+    max_concurrency : Optional[:class:`int`]
+        The maximum amount of invocations in flight, unbounded if ``None``.
+    deadline : Optional[:class:`float`]
+        Seconds after which an invocation is cancelled, no deadline if ``None``.
+    overflow : :class:`str`
+        The overflow policy.
+    logger : Optional[:class:`logging.Logger`]
+        The logger to report drops, rejections and missed deadlines to.
+    """
+
+    __slots__ = (
+        "max_concurrency",
+        "deadline",
+        "overflow",
+        "logger",
+        "name",
+        "rejected",
+        "dropped",
+        "timeouts",
+        "_active",
+        "_running",
+        "_waiters",
+    )
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        deadline: Optional[float] = None,
+        overflow: str = QUEUE,
+        *,
+        logger: Optional[Logger] = None,
+        name: str = "",
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES!r} not {overflow!r}")
+
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be a positive integer.")
+
+        self.max_concurrency = max_concurrency
+        self.deadline = deadline
+        self.overflow = overflow
+        self.logger = logger or getLogger(__name__)
+        self.name = name
+
+        self.rejected = 0
+        self.dropped = 0
+        self.timeouts = 0
+
+        self._active = 0
+        self._running: Dict[Any, None] = {}
+        self._waiters: Deque[Future] = deque()
+
+    def __repr__(self) -> str:
+        return (
+            f"<HandlerLimit name={self.name!r} in_flight={self.in_flight}"
+            f" queued={self.queued} max_concurrency={self.max_concurrency!r}"
+            f" deadline={self.deadline!r} overflow={self.overflow!r}>"
+        )
+
+    @property
+    def in_flight(self) -> int:
+        """:class:`int` - The amount of invocations currently running."""
+        return len(self._running)
+
+    @property
+    def queued(self) -> int:
+        """:class:`int` - The amount of invocations waiting for a slot."""
+        return len(self._waiters)
+
+    def _release(self) -> None:
+        # Hand the slot straight over to the next waiter, if any, so a new
+        # invocation can't overtake the queue in the meantime.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self._active -= 1
+
+    async def _acquire(self) -> bool:
+        if self.max_concurrency is None or self._active < self.max_concurrency:
+            self._active += 1
+            return True
+
+        if self.overflow == REJECT:
+            self.rejected += 1
+            self.logger.debug("Rejected an invocation of %s", self.name)
+            return False
+
+        if self.overflow == DROP_OLDEST and self._running:
+            # The new invocation takes over the slot of the dropped one.
+            oldest = next(iter(self._running))
+            del self._running[oldest]
+            oldest.cancel()
+
+            self.dropped += 1
+            self.logger.debug("Dropped the oldest invocation of %s", self.name)
+            return True
+
+        waiter = get_event_loop().create_future()
+        self._waiters.append(waiter)
+
+        try:
+            await waiter
+        except CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+
+        return True
+
+    async def run(self, coro: Coroutine) -> Any:
+        """Run ``coro`` within the limits, returns ``None`` if it was rejected or timed out."""
+        try:
+            acquired = await self._acquire()
+        except CancelledError:
+            coro.close()
+            raise
+
+        if not acquired:
+            coro.close()
+            return None
+
+        task = current_task()
+        self._running[task] = None
+
+        try:
+            if self.deadline is None:
+                return await coro
+
+            # The handler runs in a task of its own so only the deadline
+            # expiring counts as a miss, a timeout the handler raises itself
+            # propagates unchanged.
+            inner = ensure_future(coro)
+
+            try:
+                done, _ = await wait((inner,), timeout=self.deadline)
+            except CancelledError:
+                inner.cancel()
+                raise
+
+            if done:
+                return inner.result()
+
+            inner.cancel()
+
+            with suppress(CancelledError):
+                await inner
+
+            self.timeouts += 1
+            self.logger.warning(
+                "%s missed its %ss deadline (%s timeouts)", self.name, self.deadline, self.timeouts
+            )
+            return None
+        finally:
+            # A dropped invocation already handed its slot over.
+            if self._running.pop(task, task) is None:
+                self._release()
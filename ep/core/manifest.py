@@ -0,0 +1,280 @@
+"""CogManifest and LazyCogModule implementations."""
+import importlib
+import sys
+from functools import partial
+from json import dumps as json_dumps, loads as json_loads
+from logging import Logger, getLogger
+from os import replace
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cog import Cog
+
+__all__ = (
+    "CogManifest",
+    "LazyCogModule",
+    "cog_modules",
+    "exported_cogs",
+    "import_cog_module",
+    "module_stamp",
+)
+
+Entry = Dict[str, Any]
+
+# Bumped whenever the layout of an entry changes, or what makes a cog lazy,
+# older manifests are discarded.
+_FORMAT: int = 2
+
+
+def cog_modules(directory: Path) -> Iterator[Tuple[str, Path]]:
+    """Iterate over the ``(name, path)`` of every cog module in ``directory``."""
+    for path in directory.iterdir():
+        path = path.resolve().absolute()
+
+        if (is_file := path.is_file()) and path.name.endswith(".py"):
+            yield path.name[:-3], path
+        elif not is_file:
+            yield path.name, path
+
+
+def import_cog_module(directory: Path, name: str) -> Any:
+    """Import the cog module ``name`` from ``directory``."""
+    path = str(directory)
+    sys.path.append(path)
+
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(path)
+
+
+def exported_cogs(module: Any) -> List[type]:
+    """The :class:`ep.Cog` classes a module exports through ``__all__``."""
+    return [
+        obj
+        for obj in map(partial(getattr, module), getattr(module, "__all__", []))
+        if isinstance(obj, type) and issubclass(obj, Cog) and getattr(obj, "__export__", False)
+    ]
+
+
+def module_stamp(path: Path) -> List[int]:
+    """The modification time and size of a module, for packages of all their modules combined."""
+    files = sorted(path.rglob("*.py")) if path.is_dir() else [path]
+    stats = [file.stat() for file in files]
+    return [max((stat.st_mtime_ns for stat in stats), default=0), sum(stat.st_size for stat in stats)]
+
+
+def _describe(klass: type) -> Dict[str, Any]:
+    events: Dict[str, Any] = {}
+    # Tasks and setup run from the moment the cog is added, waiting on an
+    # event to start them would change what the cog does.
+    lazy = (
+        klass.cog_inject is Cog.cog_inject
+        and klass.cog_setup is Cog.cog_setup
+        and not klass.__cog_tasks__
+    )
+
+    for event_type, handler in klass.__cog_listeners__:
+        prefixes = handler.literal_prefixes(None)
+
+        if prefixes is None or event_type in events and events[event_type] is None:
+            events[event_type] = None
+            continue
+
+        position, literals = prefixes
+        known = events.setdefault(event_type, [position, []])
+
+        if known[0] != position:
+            events[event_type] = None
+        else:
+            known[1].extend(literal for literal in literals if literal not in known[1])
+
+    return {"name": klass.__name__, "shard": klass.__cog_shard__, "lazy": lazy, "events": events}
+
+
+class CogManifest:
+    """A cache of what the cog modules in a directory listen for.
+
+    Every module is described by the cogs it exports, the events those
+    listen for and, for regex handlers, the literal prefixes a message must
+    start with. Entries are keyed by the modification time and size of the
+    module and are only trusted while those still match.
+
+    Parameters
+    ----------
+    path : :class:`pathlib.Path`
+        The file the manifest is read from and written to.
+    logger : Optional[:class:`logging.Logger`]
+        The logger to report unreadable manifests to.
+    """
+
+    filename: str = ".ep-manifest.json"
+
+    def __init__(self, path: Path, *, logger: Optional[Logger] = None):
+        self.path = path
+        self.logger = logger or getLogger(__name__)
+        self.__entries: Dict[str, Entry] = {}
+        self.__dirty = False
+
+        try:
+            data = json_loads(path.read_text())
+        except FileNotFoundError:
+            return
+        except ValueError as err:
+            self.logger.warning("Ignoring unreadable cog manifest %s => %s", str(path), err)
+            return
+
+        if isinstance(data, dict) and data.get("format") == _FORMAT:
+            self.__entries = data.get("modules", {})
+
+    def get(self, path: Path) -> Optional[Entry]:
+        """The entry of a module, ``None`` if there is none or it is stale."""
+        entry = self.__entries.get(path.name)
+
+        if entry is None or entry["stamp"] != module_stamp(path):
+            return None
+
+        return entry
+
+    def put(self, path: Path, cogs: Iterable[type]) -> Entry:
+        """Describe the exported ``cogs`` of a module and store the entry."""
+        described = [_describe(klass) for klass in cogs]
+        entry = {
+            "stamp": module_stamp(path),
+            "lazy": bool(described) and all(cog["lazy"] and cog["events"] for cog in described),
+            "cogs": described,
+        }
+
+        self.__entries[path.name] = entry
+        self.__dirty = True
+        return entry
+
+    def save(self) -> None:
+        """Write the manifest if any entry changed."""
+        if not self.__dirty:
+            return
+
+        data = {"format": _FORMAT, "modules": self.__entries}
+        # Written aside and moved over, so it is never read half written.
+        partial_path = self.path.with_name(f"{self.path.name}.partial")
+
+        try:
+            partial_path.write_text(json_dumps(data, indent=1, sort_keys=True))
+            replace(partial_path, self.path)
+        except OSError as err:
+            self.logger.warning("Could not write cog manifest %s => %s", str(self.path), err)
+        else:
+            self.__dirty = False
+
+
+class LazyCogModule:
+    """A cog module whose import is deferred until an event it listens for arrives.
+
+    Until then only a trigger per event the module listens for is
+    registered, gated on the literal prefixes of its regex handlers where
+    the manifest knows them. The first event to reach a trigger imports the
+    module, adds its cogs and hands the event to them, every other trigger
+    is removed along the way.
+
+    Parameters
+    ----------
+    client : :class:`ep.core.BaseClient`
+        The client to add the cogs to.
+    directory : :class:`pathlib.Path`
+        The directory the module is imported from.
+    name : :class:`str`
+        The name of the module.
+    entry : Dict[:class:`str`, Any]
+        The manifest entry of the module.
+    """
+
+    def __init__(self, client: Any, directory: Path, name: str, entry: Entry):
+        self.client = client
+        self.directory = directory
+        self.name = name
+        self.entry = entry
+        self.cogs: Optional[Tuple[Cog, ...]] = None
+
+    def __repr__(self) -> str:
+        return f"<LazyCogModule name={self.name!r} loaded={self.cogs is not None}>"
+
+    @property
+    def events(self) -> Dict[str, Any]:
+        """Dict[:class:`str`, Any] - The prefixes of every event any cog of the module listens for."""
+        merged: Dict[str, Any] = {}
+
+        for cog in self.entry["cogs"]:
+            if None not in (cog["shard"], self.client.shard_id) and cog["shard"] != self.client.shard_id:
+                continue
+
+            for event_type, prefixes in cog["events"].items():
+                known = merged.get(event_type, ...)
+
+                if prefixes is None or known is None:
+                    merged[event_type] = None
+                elif known is ...:
+                    merged[event_type] = [prefixes[0], list(prefixes[1])]
+                elif known[0] != prefixes[0]:
+                    merged[event_type] = None
+                else:
+                    known[1].extend(prefixes[1])
+
+        return merged
+
+    def register(self) -> int:
+        """Register the triggers of the module, returns the amount registered."""
+        events = self.events
+
+        for event_type, prefixes in events.items():
+            self.client.extra_events.add(
+                event_type,
+                partial(self.trigger, event_type),
+                prefixes=None if prefixes is None else (prefixes[0], tuple(prefixes[1])),
+                owner=self,
+            )
+
+        return len(events)
+
+    def load(self) -> Tuple[Cog, ...]:
+        """Import the module and add its cogs, if that didn't happen yet.
+
+        The triggers are only removed once every cog was added, a module
+        that fails to import is tried again by the next event.
+        """
+        if self.cogs is not None:
+            return self.cogs
+
+        client = self.client
+        client.logger.info("Lazily loading cog module %s", self.name)
+
+        cogs = [
+            klass(client)
+            for klass in exported_cogs(import_cog_module(self.directory, self.name))
+            if None in (klass.__cog_shard__, client.shard_id) or klass.__cog_shard__ == client.shard_id
+        ]
+        added: List[Cog] = []
+
+        try:
+            for cog in cogs:
+                client.add_cog(cog)
+                added.append(cog)
+        except Exception:
+            for cog in added:
+                client.remove_cog(cog.__cog_name__)
+
+            raise
+
+        client.extra_events.remove_owner(self)
+        self.cogs = tuple(cogs)
+        return self.cogs
+
+    async def trigger(self, event_type: str, *args, **kwargs) -> None:
+        """Load the module and hand the event that triggered it to its cogs."""
+        owners = self.load()
+        listeners = [
+            listener
+            for listener in self.client.extra_events.lookup(event_type, args)
+            if getattr(listener, "owner", None) in owners
+        ]
+
+        self.client._dispatch_listeners(event_type, listeners, args, kwargs)  # pylint: disable=protected-access
@@ -0,0 +1,271 @@
+"""Metrics implementation."""
+from bisect import bisect_left
+from collections import Counter
+from math import inf
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+__all__ = ("Metrics", "HandlerMetrics", "Histogram")
+
+LATENCY_BOUNDS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """A fixed bucket histogram, buckets are upper bounds in seconds.
+
+    Parameters
+    ----------
+    bounds : Tuple[:class:`float`, ...]
+        The sorted upper bounds of the buckets, an implicit ``+Inf``
+        bucket catches everything above the last one.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record a single observation."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+
+        for bound, count in zip((*self.bounds, inf), self.counts):
+            seen += count
+
+            if seen >= rank:
+                return bound
+
+        return inf
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """The ``(upper bound, cumulative count)`` pairs, prometheus style."""
+        pairs = []
+        seen = 0
+
+        for bound, count in zip((*self.bounds, inf), self.counts):
+            seen += count
+            pairs.append((bound, seen))
+
+        return pairs
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        """Add the observations of a serialized histogram with the same buckets."""
+        for index, count in enumerate(data["buckets"].values()):
+            self.counts[index] += count
+
+        self.sum += data["sum"]
+        self.count += data["count"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the histogram into plain builtins."""
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip(map(str, (*self.bounds, "+Inf")), self.counts)),
+        }
+
+
+class HandlerMetrics:
+    """The counters of a single event handler.
+
+    An instance is shared by every binding of the same handler so the counts
+    survive a cog being reloaded, the hot path only ever increments these
+    attributes.
+    """
+
+    __slots__ = ("name", "group", "rejected", "exceptions", "latency", "limit")
+
+    def __init__(self, name: str, group: Optional[str] = None):
+        self.name = name
+        self.group = group
+        self.rejected = 0
+        self.exceptions = 0
+        self.latency = Histogram()
+        self.limit: Any = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the counters into plain builtins."""
+        data = {
+            "group": self.group,
+            "rejected": self.rejected,
+            "exceptions": self.exceptions,
+            "latency": self.latency.to_dict(),
+        }
+
+        if (limit := self.limit) is not None:
+            data["in_flight"] = limit.in_flight
+            data["queued"] = limit.queued
+
+        return data
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """The metrics of the dispatch pipeline of a client.
+
+    Attributes
+    ----------
+    events : :class:`collections.Counter`
+        The amount of events received, per event type.
+    handlers : Dict[:class:`str`, :class:`HandlerMetrics`]
+        The counters of every handler that has been bound, by name.
+    """
+
+    def __init__(self):
+        self.events: Counter = Counter()
+        self.handlers: Dict[str, HandlerMetrics] = {}
+        self.__gauges: Dict[str, Callable[[], float]] = {}
+
+    def handler(self, name: str, group: Optional[str] = None) -> HandlerMetrics:
+        """Get or create the counters of the handler called ``name``."""
+        try:
+            return self.handlers[name]
+        except KeyError:
+            metrics = self.handlers[name] = HandlerMetrics(name, group)
+            return metrics
+
+    def gauge(self, name: str, func: Callable[[], float]) -> None:
+        """Register a gauge, ``func`` is called whenever the metrics are read."""
+        self.__gauges[name] = func
+
+    @property
+    def exceptions(self) -> Counter:
+        """:class:`collections.Counter` - The amount of exceptions raised, per :class:`ep.core.group.Group`."""
+        counter: Counter = Counter()
+
+        for handler in self.handlers.values():
+            if handler.exceptions:
+                counter[handler.group or "ungrouped"] += handler.exceptions
+
+        return counter
+
+    def gauges(self) -> Dict[str, float]:
+        """Read every registered gauge."""
+        return {name: func() for name, func in self.__gauges.items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Serialize every metric into plain builtins, e.g. for a websocket frame."""
+        return {
+            "events": dict(self.events),
+            "exceptions": dict(self.exceptions),
+            "handlers": {name: handler.to_dict() for name, handler in self.handlers.items()},
+            "gauges": self.gauges(),
+        }
+
+    @staticmethod
+    def merge(snapshots: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge the snapshots of several clients, e.g. one per shard, into one."""
+        events: Counter = Counter()
+        exceptions: Counter = Counter()
+        gauges: Counter = Counter()
+        handlers: Dict[str, Dict[str, Any]] = {}
+        latencies: Dict[str, Histogram] = {}
+
+        for snapshot in snapshots:
+            events.update(snapshot["events"])
+            exceptions.update(snapshot["exceptions"])
+            gauges.update(snapshot["gauges"])
+
+            for name, handler in snapshot["handlers"].items():
+                merged = handlers.setdefault(name, {"group": handler["group"]})
+                latencies.setdefault(name, Histogram()).merge(handler["latency"])
+
+                for key in ("rejected", "exceptions", "in_flight", "queued"):
+                    if key in handler:
+                        merged[key] = merged.get(key, 0) + handler[key]
+
+        for name, latency in latencies.items():
+            handlers[name]["latency"] = latency.to_dict()
+
+        return {
+            "events": dict(events),
+            "exceptions": dict(exceptions),
+            "handlers": handlers,
+            "gauges": dict(gauges),
+        }
+
+    def prometheus(self, prefix: str = "ep") -> str:
+        """Render every metric in the prometheus text exposition format."""
+        return self.render(self.snapshot(), prefix)
+
+    @staticmethod
+    def render(snapshot: Dict[str, Any], prefix: str = "ep") -> str:
+        """Render a snapshot, e.g. one merged by :meth:`merge`, in the prometheus text exposition format."""
+        handlers = snapshot["handlers"]
+        lines = [
+            f"# TYPE {prefix}_events_total counter",
+            *(
+                f'{prefix}_events_total{{event="{_escape(event)}"}} {count}'
+                for event, count in snapshot["events"].items()
+            ),
+            f"# TYPE {prefix}_exceptions_total counter",
+            *(
+                f'{prefix}_exceptions_total{{group="{_escape(group)}"}} {count}'
+                for group, count in snapshot["exceptions"].items()
+            ),
+            f"# TYPE {prefix}_predicate_rejections_total counter",
+            *(
+                f'{prefix}_predicate_rejections_total{{handler="{_escape(name)}"}} {handler["rejected"]}'
+                for name, handler in handlers.items()
+            ),
+            f"# TYPE {prefix}_handler_latency_seconds histogram",
+        ]
+
+        for name, handler in handlers.items():
+            label = f'handler="{_escape(name)}"'
+            latency = Histogram()
+            latency.merge(handler["latency"])
+
+            for bound, count in latency.cumulative():
+                le = "+Inf" if bound == inf else repr(bound)
+                lines.append(f'{prefix}_handler_latency_seconds_bucket{{{label},le="{le}"}} {count}')
+
+            lines.append(f"{prefix}_handler_latency_seconds_sum{{{label}}} {latency.sum}")
+            lines.append(f"{prefix}_handler_latency_seconds_count{{{label}}} {latency.count}")
+
+        for metric in ("in_flight", "queued"):
+            limited = [(name, handler[metric]) for name, handler in handlers.items() if metric in handler]
+
+            if limited:
+                lines.append(f"# TYPE {prefix}_handler_{metric} gauge")
+
+            for name, value in limited:
+                lines.append(f'{prefix}_handler_{metric}{{handler="{_escape(name)}"}} {value}')
+
+        for name, value in snapshot["gauges"].items():
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,273 @@
+"""SamplingProfiler implementation."""
+import selectors
+from asyncio import AbstractEventLoop, all_tasks, current_task
+from collections import Counter
+from os.path import basename
+from pathlib import Path
+from sys import _current_frames  # pylint: disable=no-name-in-module
+from threading import Event as ThreadEvent, Lock, Thread, get_ident
+from types import CodeType, FrameType
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+__all__ = ("SamplingProfiler",)
+
+ON_CPU: str = "on-cpu"
+OFF_CPU: str = "off-cpu"
+IDLE: str = "idle"
+
+
+def _frame_name(code: CodeType) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _running_frames(frame: Optional[FrameType]) -> List[FrameType]:
+    frames = []
+
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+
+    frames.reverse()
+    return frames
+
+
+def _is_idle(frames: List[FrameType]) -> bool:
+    # The loop waits for IO, or its next timer, in the select of its selector.
+    if not frames:
+        return False
+
+    code = frames[-1].f_code
+    return code.co_name == "select" and code.co_filename == selectors.__file__
+
+
+def _awaiting_frames(coro: Any) -> List[FrameType]:
+    frames = []
+
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+
+        if frame is None:
+            break
+
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+
+    return frames
+
+
+def _layers(func: Callable[..., Any]) -> Iterable[Tuple[Callable[..., Any], Optional[str]]]:
+    # Every layer of a decorated function, with the closure variable the
+    # layer holds the next one in, e.g. ``corofunc`` of ``Cog.wait_until_ready``.
+    while (inner := getattr(func, "__wrapped__", None)) is not None:
+        code = getattr(func, "__code__", None)
+        cells = zip(code.co_freevars, func.__closure__ or ()) if code is not None else ()
+        yield func, next((name for name, cell in cells if cell.cell_contents is inner), None)
+        func = inner
+
+    yield func, None
+
+
+class SamplingProfiler:
+    """A sampling profiler for a running event loop.
+
+    A daemon thread samples the stack of the loop thread every
+    :attr:`interval` seconds, as on-cpu time, or as ``idle`` while the loop
+    waits in its selector. Every :attr:`task_interval` seconds the suspended
+    coroutine stack of every pending task is recorded as off-cpu (await)
+    time, weighted to be comparable with the on-cpu samples. Those stacks
+    are collected on the loop, so the sampler never races it, and their
+    cost grows with the amount of tasks so they are sampled less often.
+    Nothing is traced so the loop, and the gateway heartbeat along with it,
+    runs at full speed in between samples.
+
+    Samples are attributed to the cog and handler (or :meth:`ep.Cog.task`)
+    whose code appears outermost in the stack, otherwise to the task name.
+    The output is in the folded stack format understood by ``flamegraph.pl``
+    and speedscope, every stack is rooted at ``on-cpu``, ``off-cpu`` or
+    ``idle``.
+
+    Parameters
+    ----------
+    client : :class:`ep.core.BaseClient`
+        The client whose loop and cogs to profile.
+    interval : Optional[:class:`float`]
+        The seconds in between samples of the loop thread.
+    task_interval : Optional[:class:`float`]
+        The seconds in between samples of the pending tasks.
+    """
+
+    interval: float = 0.005
+    task_interval: float = 0.1
+
+    def __init__(
+        self, client: Any, interval: Optional[float] = None, task_interval: Optional[float] = None
+    ):
+        if interval is not None:
+            self.interval = interval
+
+        if task_interval is not None:
+            self.task_interval = task_interval
+
+        self.client = client
+        self.samples: Counter = Counter()
+
+        self.__owners: Dict[CodeType, str] = {}
+        self.__wrappers: Dict[CodeType, Tuple[str, Dict[Any, str]]] = {}
+        self.__thread: Optional[Thread] = None
+        self.__stopped = ThreadEvent()
+        # Samples are added from both the sampler thread and the loop.
+        self.__lock = Lock()
+
+    @property
+    def running(self) -> bool:
+        """:class:`bool` - Whether the profiler is sampling."""
+        return self.__thread is not None
+
+    def _owners(self) -> Tuple[Dict[CodeType, str], Dict[CodeType, Tuple[str, Dict[Any, str]]]]:
+        owners: Dict[CodeType, str] = {}
+        # The code of a decorator's wrapper is shared by everything it
+        # decorates, its frames are told apart by the function they wrap.
+        wrappers: Dict[CodeType, Tuple[str, Dict[Any, str]]] = {}
+
+        callbacks = [
+            (cog_name, callback)
+            for cog_name, cog in self.client.cogs.items()
+            for callback in (
+                *(getattr(handler.callback, "func", handler.callback) for _, handler in cog.__cog_listeners__),
+                *cog.__cog_tasks__,
+            )
+        ]
+
+        for cog_name, callback in callbacks:
+            label = f"{cog_name}.{callback.__name__}"
+
+            for func, name in _layers(callback):
+                if (code := getattr(func, "__code__", None)) is None:
+                    continue
+
+                if name is None:
+                    owners[code] = label
+                else:
+                    wrappers.setdefault(code, (name, {}))[1][func.__wrapped__] = label
+
+        return owners, wrappers
+
+    def _label(self, frames: Iterable[FrameType], default: str) -> str:
+        owners = self.__owners
+        wrappers = self.__wrappers
+
+        for frame in frames:
+            code = frame.f_code
+
+            if code in owners:
+                return owners[code]
+
+            if code in wrappers:
+                name, labels = wrappers[code]
+
+                if (label := labels.get(frame.f_locals.get(name))) is not None:
+                    return label
+
+        return default
+
+    def _sample(self, loop: AbstractEventLoop, thread_id: int) -> None:
+        running = current_task(loop)
+        frames = _running_frames(_current_frames().get(thread_id))
+
+        if running is None and _is_idle(frames):
+            stack = IDLE
+        else:
+            label = self._label(frames, running.get_name() if running is not None else "<loop>")
+            stack = ";".join([ON_CPU, label, *(_frame_name(frame.f_code) for frame in frames)])
+
+        with self.__lock:
+            self.samples[stack] += 1
+
+    def _sample_tasks(self, loop: AbstractEventLoop, weight: int) -> None:
+        # Runs on the loop thread, in between tasks, so every task is suspended.
+        if self.__stopped.is_set():
+            return
+
+        stacks: Counter = Counter()
+
+        for task in all_tasks(loop):
+            frames = _awaiting_frames(task.get_coro())
+            label = self._label(frames, task.get_name())
+            stack = ";".join([OFF_CPU, label, *(_frame_name(frame.f_code) for frame in frames)])
+            stacks[stack] += weight
+
+        with self.__lock:
+            self.samples.update(stacks)
+
+    def _run(self, loop: AbstractEventLoop, thread_id: int) -> None:
+        every = max(round(self.task_interval / self.interval), 1)
+        ticks = 0
+
+        while not self.__stopped.wait(self.interval):
+            self._sample(loop, thread_id)
+            ticks += 1
+
+            if ticks % every:
+                continue
+
+            try:
+                loop.call_soon_threadsafe(self._sample_tasks, loop, every)
+            except RuntimeError:
+                # The loop was closed.
+                return
+
+    def _attach(self, loop: AbstractEventLoop) -> None:
+        # Runs on the loop thread, so its identity is known and the owners
+        # can be collected without racing the cogs being modified.
+        if self.__thread is not None or self.__stopped.is_set():
+            return
+
+        self.__owners, self.__wrappers = self._owners()
+        self.__thread = Thread(
+            target=self._run, args=(loop, get_ident()), name="ep-profiler", daemon=True
+        )
+        self.__thread.start()
+        self.client.logger.info("Profiler started, sampling every %ss", self.interval)
+
+    def start(self) -> None:
+        """Start sampling, once the loop is running if it isn't already."""
+        if self.__thread is not None:
+            return
+
+        loop = self.client.loop
+        self.__stopped.clear()
+
+        if loop.is_running():
+            self._attach(loop)
+        else:
+            loop.call_soon(self._attach, loop)
+
+    def stop(self) -> Counter:
+        """Stop sampling, returns the samples collected so far."""
+        thread, self.__thread = self.__thread, None
+        self.__stopped.set()
+
+        if thread is not None and thread.is_alive():
+            thread.join()
+
+        self.client.logger.info("Profiler stopped, %s samples", sum(self.samples.values()))
+        return self.samples
+
+    def folded(self) -> str:
+        """The samples in the folded stack format, one ``stack count`` per line."""
+        with self.__lock:
+            samples = dict(self.samples)
+
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(samples.items()))
+
+    def dump(self, path: Union[str, Path]) -> Path:
+        """Write the samples to ``path`` in the folded stack format."""
+        path = Path(path)
+        path.write_text(self.folded())
+        return path
+
+    def reset(self) -> None:
+        """Discard the samples collected so far."""
+        with self.__lock:
+            self.samples = Counter()
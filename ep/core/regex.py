@@ -1,14 +1,40 @@
-from re import compile as re_compile, Pattern
-from typing import Union
+"""RegexHandler implementations."""
+import ast
+import asyncio
+import multiprocessing
+from collections import Counter
+from concurrent.futures import BrokenExecutor
+from contextlib import suppress
+from logging import Logger, getLogger
+from multiprocessing.pool import Pool
+from re import compile as re_compile, Pattern, Match, IGNORECASE
+from string import Template
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union, get_type_hints
+from weakref import WeakKeyDictionary
 
-from ..event import EventHandler
+try:
+    from re import _parser as sre_parse  # type: ignore
+except ImportError:  # Python < 3.11
+    import sre_parse  # type: ignore  # pylint: disable=deprecated-module
 
+from discord import Member, Message
+from discord.abc import GuildChannel
+
+from .event import Event, EventHandler, BoundEventHandler, CoroutineFunction
+
+__all__ = (
+    "RegexHandler",
+    "FormattedRegexHandler",
+    "RegexExecutor",
+    "RegexPattern",
+    "literal_prefixes",
+    "is_redos_prone",
+)
 
 RegexPattern = Union[str, Pattern]
+RegexFilter = Union[bool, None, Callable[[Optional[Match]], bool]]
+Converter = Callable[[str, Message], Any]
 LITERAL_TYPES = (
-    int,
-    str,
-    float,
     list,
     tuple,
     dict,
@@ -16,25 +42,445 @@ LITERAL_TYPES = (
     frozenset,
 )
 
+_SNOWFLAKE = re_compile(r"<(?:@!?|@&|#)(\d{15,21})>|(\d{15,21})")
+
+
+def _snowflake(value: str) -> int:
+    """Parse a raw or mentioned snowflake."""
+    if (match := _SNOWFLAKE.fullmatch(value)) is None:
+        raise ValueError(f"{value!r} is not a snowflake.")
+
+    return int(match[1] or match[2])
+
+
+def _strict_converter(annotation: Any) -> Optional[Converter]:
+    """Produce a converter for an annotation that raises on failure."""
+    if annotation is str:
+        return lambda value, _: value
+
+    if annotation in (int, float):
+
+        def number(value: str, _: Message) -> Any:
+            try:
+                return annotation(value)
+            except ValueError:
+                # Not a plain number, e.g. ``0x10`` or ``1e3``
+                result = ast.literal_eval(value)
+
+            if not isinstance(result, (int, float)):
+                raise ValueError(f"{value!r} is not a {annotation.__name__}.")
+
+            return annotation(result)
+
+        return number
+
+    if annotation in LITERAL_TYPES:
+
+        def literal(value: str, _: Message) -> Any:
+            result = ast.literal_eval(value)
+
+            if not isinstance(result, annotation):
+                raise ValueError(f"{value!r} is not a {annotation.__name__}.")
+
+            return result
+
+        return literal
+
+    if isinstance(annotation, type) and issubclass(annotation, Member):
+
+        def member(value: str, message: Message) -> Member:
+            if (result := message.guild.get_member(_snowflake(value))) is None:
+                raise ValueError(f"member {value!r} not found.")
+
+            return result
+
+        return member
+
+    if isinstance(annotation, type) and issubclass(annotation, GuildChannel):
+
+        def channel(value: str, message: Message) -> GuildChannel:
+            result = message.guild.get_channel(_snowflake(value))
+
+            if not isinstance(result, annotation):
+                raise ValueError(f"channel {value!r} not found.")
+
+            return result
+
+        return channel
+
+    if getattr(annotation, "__origin__", None) is Union:
+        options = [
+            converter
+            for arg in annotation.__args__
+            if arg is not type(None) and (converter := _strict_converter(arg)) is not None
+        ]
+
+        if not options:
+            return None
+
+        def union(value: str, message: Message) -> Any:
+            for option in options:
+                try:
+                    return option(value, message)
+                except (ValueError, SyntaxError, TypeError, AttributeError):
+                    continue
+
+            raise ValueError(f"{value!r} does not match {annotation!r}.")
+
+        return union
+
+    return None
+
+
+def _compile_converters(callback: CoroutineFunction) -> Dict[str, Converter]:
+    """Compile a converter for every annotated argument of a callback.
+
+    Values that fail to convert are passed through as the matched string.
+    """
+    func = getattr(callback, "func", callback)
+
+    try:
+        annotations = get_type_hints(func)
+    except Exception:  # pylint: disable=broad-except
+        annotations = getattr(func, "__annotations__", {})
+
+    converters = {}
+
+    for name, annotation in annotations.items():
+        if name == "return" or (strict := _strict_converter(annotation)) is None:
+            continue
+
+        def converter(value: str, message: Message, strict: Converter = strict) -> Any:
+            try:
+                return strict(value, message)
+            except (ValueError, SyntaxError, TypeError, AttributeError):
+                return value
+
+        converters[name] = converter
+
+    return converters
+
+PREFIX_LIMIT: int = 16
+
+
+def _literal_prefixes(items: List[Tuple[Any, Any]]) -> Tuple[List[str], bool]:
+    """Collect the literal prefixes of parsed regex items.
+
+    Returns the prefixes and whether every item was consumed, i.e. whether
+    anything following the items may be appended to the prefixes.
+    """
+    prefixes = [""]
+
+    for index, (opcode, value) in enumerate(items):
+        if opcode is sre_parse.LITERAL:
+            prefixes = [prefix + chr(value) for prefix in prefixes]
+            continue
+
+        if opcode is sre_parse.AT and index == 0 and value is sre_parse.AT_BEGINNING:
+            continue
+
+        if opcode is sre_parse.SUBPATTERN and not value[1] & IGNORECASE:
+            alternatives = [_literal_prefixes(list(value[-1]))]
+
+        elif opcode is sre_parse.BRANCH:
+            alternatives = [_literal_prefixes(list(branch)) for branch in value[1]]
+
+        else:
+            return prefixes, False
+
+        tails = [tail for branch, _ in alternatives for tail in branch]
+
+        if len(prefixes) * len(tails) > PREFIX_LIMIT:
+            return prefixes, False
+
+        prefixes = [prefix + tail for prefix in prefixes for tail in tails]
+
+        if not all(complete for _, complete in alternatives):
+            return prefixes, False
+
+    return prefixes, True
+
+
+def literal_prefixes(pattern: Pattern) -> Optional[Tuple[str, ...]]:
+    """Compute the literal prefixes one of which every match of ``pattern`` starts with.
+
+    >>> literal_prefixes(re.compile(r"!(t|tag) (?P<tag_id>\\d+)"))
+    ('!t ', '!tag ')
+
+    Returns ``None`` when a match could start with anything.
+    """
+    if pattern.flags & IGNORECASE:
+        return None
+
+    prefixes, _ = _literal_prefixes(list(sre_parse.parse(pattern.pattern, pattern.flags)))
+
+    if not all(prefixes):
+        return None
+
+    return tuple(dict.fromkeys(prefixes))
+
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+
+
+def _nested_repeats(items: List[Tuple[Any, Any]], inside: bool) -> bool:
+    for opcode, value in items:
+        if opcode in _REPEATS:
+            _, high, sub = value
+            unbounded = high is sre_parse.MAXREPEAT or high == sre_parse.MAXREPEAT
+
+            if (unbounded and inside) or _nested_repeats(sub, inside or unbounded):
+                return True
+
+        elif opcode is sre_parse.SUBPATTERN:
+            if _nested_repeats(value[-1], inside):
+                return True
+
+        elif opcode is sre_parse.BRANCH:
+            if any(_nested_repeats(branch, inside) for branch in value[1]):
+                return True
+
+        elif opcode in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            if _nested_repeats(value[1], inside):
+                return True
+
+        elif opcode is sre_parse.GROUPREF_EXISTS:
+            _, yes, no = value
+
+            if _nested_repeats(yes, inside) or (no is not None and _nested_repeats(no, inside)):
+                return True
+
+    return False
+
+
+def is_redos_prone(pattern: Pattern) -> bool:
+    """Check if a pattern nests unbounded repeats, e.g. ``(a+)+`` or ``(\\w+\\s?)*``.
+
+    Nested quantifiers are the usual source of catastrophic backtracking,
+    the check is deliberately conservative.
+    """
+    return _nested_repeats(list(sre_parse.parse(pattern.pattern, pattern.flags)), False)
+
+
+def _matches(pattern: Pattern, string: str) -> bool:
+    return pattern.fullmatch(string) is not None
+
+
+class RegexExecutor:
+    """A bounded process pool for matching expensive or ReDoS prone patterns.
+
+    The regex engine holds the GIL while matching so a runaway match can't be
+    bounded from a thread, instead patterns are tried in a pool of worker
+    processes owned by the executor.
+    At most ``max_workers`` matches are in flight at a time and every match
+    has a time budget of ``timeout`` seconds from when a worker picks it up.
+    A match that overruns is treated as a failed match, counted per pattern
+    in :attr:`overruns`, logged, and the pool is terminated. The other
+    matches the pool was running are resubmitted to a fresh pool, up to
+    :attr:`retries` times.
+
+    Match objects can't cross process boundaries, when a worker reports a
+    match the pattern is matched again inline, which is known to complete
+    within the budget.
+
+    Parameters
+    ----------
+    max_workers : :class:`int`
+        The amount of worker processes.
+    timeout : :class:`float`
+        The default time budget of a match in seconds.
+    logger : Optional[:class:`logging.Logger`]
+        The logger to report overruns to.
+    """
+
+    max_workers: int = 2
+    timeout: float = 1.0
+    retries: int = 3
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        *,
+        logger: Optional[Logger] = None,
+    ):
+        if max_workers is not None:
+            self.max_workers = max_workers
+
+        if timeout is not None:
+            self.timeout = timeout
+
+        self.logger = logger or getLogger(__name__)
+        self.overruns: Counter = Counter()
+
+        self.__pool: Optional[Pool] = None
+        self.__running: Set[asyncio.Future] = set()
+        self.__semaphore: Optional[asyncio.Semaphore] = None
+        self.__pending = 0
+
+    @property
+    def pending(self) -> int:
+        """:class:`int` - The amount of matches running or waiting for a worker."""
+        return self.__pending
+
+    @property
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.max_workers)
+
+        return self.__semaphore
+
+    @property
+    def _pool(self) -> Pool:
+        if self.__pool is None:
+            self.__pool = multiprocessing.Pool(self.max_workers)
+            self.__running = set()
+
+        return self.__pool
+
+    def _submit(self, pool: Pool, pattern: Pattern, string: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        running = self.__running
+        running.add(future)
+        future.add_done_callback(running.discard)
+
+        def settle(method: str, value: Any) -> None:
+            if not future.done():
+                getattr(future, method)(value)
+
+        # The callbacks run on the result thread of the pool.
+        pool.apply_async(
+            _matches,
+            (pattern, string),
+            callback=lambda result: loop.call_soon_threadsafe(settle, "set_result", result),
+            error_callback=lambda exc: loop.call_soon_threadsafe(settle, "set_exception", exc),
+        )
+
+        return future
+
+    def _terminate(self, pool: Optional[Pool] = None) -> None:
+        # An older pool was terminated already.
+        if pool is not None and pool is not self.__pool:
+            return
+
+        pool, self.__pool = self.__pool, None
+        running, self.__running = self.__running, set()
+
+        if pool is None:
+            return
+
+        pool.terminate()
+
+        # Their results will never arrive, they are retried on a new pool.
+        for future in running:
+            if not future.done():
+                future.set_exception(BrokenExecutor("the regex workers were terminated."))
+
+    async def fullmatch(
+        self, pattern: Pattern, string: str, *, timeout: Optional[float] = None
+    ) -> Optional[Match]:
+        """Match a pattern within a time budget, ``None`` is returned if the match overruns."""
+        timeout = self.timeout if timeout is None else timeout
+        self.__pending += 1
+
+        try:
+            for _ in range(self.retries + 1):
+                try:
+                    async with self._semaphore:
+                        pool = self._pool
+                        future = self._submit(pool, pattern, string)
+
+                        try:
+                            matched = await asyncio.wait_for(future, timeout)
+                        except asyncio.TimeoutError:
+                            self.overruns[pattern.pattern] += 1
+                            self.logger.warning(
+                                "Regex match overran its %ss budget (%s overruns): %s",
+                                timeout,
+                                self.overruns[pattern.pattern],
+                                repr(pattern.pattern),
+                            )
+                            self._terminate(pool)
+                            return None
+                except BrokenExecutor:
+                    # Another match overran and took the workers down with it.
+                    continue
+
+                return pattern.fullmatch(string) if matched else None
+        finally:
+            self.__pending -= 1
+
+        self.logger.warning(
+            "Regex match gave up after its workers were terminated %s times: %s",
+            self.retries + 1,
+            repr(pattern.pattern),
+        )
+        return None
+
+    def shutdown(self) -> None:
+        """Shutdown the worker processes without waiting for pending matches."""
+        self._terminate()
+
 
 class RegexHandler(EventHandler):
-    async def should_run(self, args, kwargs) -> bool:
-        if not await super().should_run(args, kwargs):
+    __slots__ = ("pattern", "filter_", "expensive", "timeout", "converters")
+
+    def __init__(
+        self,
+        event: Event,
+        callback: CoroutineFunction,
+        *,
+        pattern: RegexPattern,
+        filter_: RegexFilter = None,
+        expensive: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(event, callback, **kwargs)
+        self.pattern = pattern
+        self.filter_ = filter_
+
+        if expensive is None:
+            expensive = isinstance(pattern, Pattern) and is_redos_prone(pattern)
+
+        self.expensive = expensive
+        self.timeout = timeout
+        self.converters = _compile_converters(self.callback)
+
+    def literal_prefixes(
+        self, config: Any, owner: Any = None
+    ) -> Optional[Tuple[int, Tuple[str, ...]]]:
+        if not isinstance(self.pattern, Pattern):
+            return None
+
+        return self._literal_prefixes(self.pattern)
+
+    def _literal_prefixes(self, pattern: Pattern) -> Optional[Tuple[int, Tuple[str, ...]]]:
+        # Only handlers that run exclusively on a match can be skipped
+        # when the message doesn't start with one of the patterns prefixes.
+        if self.filter_ is not None or (prefixes := literal_prefixes(pattern)) is None:
+            return None
+
+        return self.positions.get("message", 0), prefixes
+
+    async def should_run(self, owner, args, kwargs) -> bool:
+        if not await super().should_run(owner, args, kwargs):
             return False
 
-        return await self._should_run(args, kwargs, self.pattern)
+        return await self._should_run(owner, args, kwargs, self.pattern, self.expensive)
 
-    async def _should_run(self, args, kwargs, pattern: Pattern) -> bool:
+    async def _should_run(self, owner, args, kwargs, pattern: Pattern, expensive: bool) -> bool:
         # Named groups in a pattern have the potential to be arguments in the signiture
-        kwargs.update(dict(zip(pattern.groupindex, cycle([None]))))
+        kwargs.update(dict.fromkeys(pattern.groupindex))
 
-        bound = self.signiture.bind(*args, **kwargs)
+        position = self.positions.get("message")
 
-        try:
-            content = bound.arguments["message"].content
-        except KeyError:
-            if not any(isinstance(arg, Message) and (content := arg.content) for arg in bound.args):
-                raise ValueError("could not infer message object (needed for a regex match.)")
+        if position is not None and position < len(args):
+            message = args[position]
+        elif (message := next((arg for arg in args if isinstance(arg, Message)), None)) is None:
+            raise ValueError("could not infer message object (needed for a regex match.)")
+
+        content = message.content
 
         filter_ = {
             None: (lambda match: match is None),
@@ -42,55 +488,89 @@ class RegexHandler(EventHandler):
             False: (lambda _: False),
         }.get(self.filter_, self.filter_)
 
-        loop = asyncio.get_event_loop()
-        match = await loop.run_in_executor(None, partial(pattern.fullmatch, content))
-        del loop
+        # Almost every match takes microseconds so it is done inline, only
+        # the expensive patterns are worth handing to the executor.
+        if expensive:
+            executor = owner.client.regex_executor
+            match = await executor.fullmatch(pattern, content, timeout=self.timeout)
+        else:
+            match = pattern.fullmatch(content)
 
         if filter_(match):
             return False
 
         if match is not None:
             group_dict = match.groupdict()
-            annotations = corofunc.__annotations__
+            converters = self.converters
+
+            for name, value in group_dict.items():
+                if value is not None and name in converters:
+                    group_dict[name] = converters[name](value, message)
 
-            kwargs_ = {**group_dict}
+            kwargs.update(group_dict)
 
-            for name in (set(group_dict) & set(annotations)):
-                argument_annotation = annotations[name]
-                argument = value = group_dict[name]
+        return True
 
-                # TODO: Tuples, ...
 
-                if argument_annotation in LITERAL_TYPES:
-                    try:
-                        value = ast.literal_eval(argument)
-                    except (ValueError, SyntaxError):
-                        value = argument
+class FormattedRegexHandler(RegexHandler):
+    """A :class:`RegexHandler` whose pattern is a template formatted per client.
 
-                elif argument_annotation.__origin__ is Union:
-                    for arg in argument_annotation.__args__:
-                        try:
-                            value = ast.literal_eval(argument)
-                        except ValueError:
-                            continue
-                        else:
-                            break
+    The formatted pattern is compiled once when the handler is bound to a cog
+    and cached per cog, it is only formatted and compiled again once the
+    clients config has been replaced or reloaded. Bound handlers are routed
+    on the literal prefixes of their formatted pattern, so the dispatch index
+    follows the config as the listeners are added again on reconfigure.
+    """
 
-                else:
-                    value = argument
+    __slots__ = ("formatter", "_detect", "_formatted")
 
-                kwargs_[name] = value
+    def __init__(
+        self,
+        event: Event,
+        callback: CoroutineFunction,
+        *,
+        formatter: Callable[[Any], Dict[str, Any]],
+        expensive: Optional[bool] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(event, callback, expensive=expensive, **kwargs)
+        self.formatter = formatter
+        self._detect = expensive is None
+        self._formatted: WeakKeyDictionary = WeakKeyDictionary()
 
-            kwargs.update(kwargs_)
+    def format_pattern(self, owner: Any) -> Tuple[Pattern, bool]:
+        """The compiled pattern for ``owner`` and whether it is expensive to match."""
+        config = owner.client.config
+        version = getattr(config, "version", 0)
 
-        return True
+        with suppress(KeyError):
+            formatted_for, formatted_version, pattern, expensive = self._formatted[owner]
 
+            if formatted_for is config and formatted_version == version:
+                return pattern, expensive
 
-class FormattedRegexHandler(RegexHandler):
-    async def _should_run(self, args, kwargs, pattern: Pattern) -> bool:
-        bound = self.signature.bind(*args, **kwargs)
+        fmt = Template(self.pattern).substitute(self.formatter(owner.client))
+        pattern = re_compile(fmt)
+        expensive = self.expensive or (self._detect and is_redos_prone(pattern))
+
+        self._formatted[owner] = (config, version, pattern, expensive)
+        return pattern, expensive
+
+    def bind(self, owner: Any) -> BoundEventHandler:
+        self.format_pattern(owner)
+        return super().bind(owner)
+
+    def literal_prefixes(
+        self, config: Any, owner: Any = None
+    ) -> Optional[Tuple[int, Tuple[str, ...]]]:
+        # The template is only known once formatted for a bound owner, the
+        # listeners are added again on reconfigure so the prefixes follow.
+        if owner is None:
+            return None
 
-        template = Template(pattern)
-        fmt = template.substitute(formatter(bound.arguments["self"].client))
+        pattern, _ = self.format_pattern(owner)
+        return self._literal_prefixes(pattern)
 
-        return await super()._should_run(args, kwargs, re_compile(fmt))
+    async def should_run(self, owner, args, kwargs) -> bool:
+        pattern, expensive = self.format_pattern(owner)
+        return await self._should_run(owner, args, kwargs, pattern, expensive)
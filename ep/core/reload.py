@@ -0,0 +1,226 @@
+"""CogWatcher implementation."""
+import asyncio
+import ctypes
+import os
+from ctypes.util import find_library
+from logging import Logger, getLogger
+from pathlib import Path
+from struct import Struct
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .manifest import cog_modules, module_stamp
+
+__all__ = ("CogWatcher",)
+
+_IN_NONBLOCK: int = 0o4000
+_IN_CLOEXEC: int = 0o2000000
+_IN_ISDIR: int = 0x40000000
+_IN_MASK: int = (
+    0x00000008  # IN_CLOSE_WRITE
+    | 0x00000040  # IN_MOVED_FROM
+    | 0x00000080  # IN_MOVED_TO
+    | 0x00000100  # IN_CREATE
+    | 0x00000200  # IN_DELETE
+)
+
+# ``struct inotify_event`` without the trailing, NUL padded, name.
+_EVENT = Struct("iIII")
+
+
+class _Inotify:
+    """A minimal inotify binding, watching a directory tree for writes."""
+
+    def __init__(self, libc: Any, fd: int):
+        self.libc = libc
+        self.fd = fd
+        self.watches: Dict[int, Path] = {}
+
+    @classmethod
+    def open(cls) -> Optional["_Inotify"]:
+        """An inotify instance, ``None`` where inotify isn't available."""
+        if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+            return None
+
+        try:
+            libc = ctypes.CDLL(find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+
+        return None if fd < 0 else cls(libc, fd)
+
+    def watch(self, directory: Path) -> None:
+        """Watch ``directory`` and every directory below it."""
+        for path in (directory, *(path for path in directory.rglob("*") if path.is_dir())):
+            if path.name == "__pycache__":
+                continue
+
+            wd = self.libc.inotify_add_watch(self.fd, str(path).encode(), _IN_MASK)
+
+            if wd >= 0:
+                self.watches[wd] = path
+
+    def read(self) -> List[Path]:
+        """The paths that changed since the last read."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+
+            if (directory := self.watches.get(wd)) is None or not name:
+                continue
+
+            path = directory.joinpath(name)
+            paths.append(path)
+
+            if mask & _IN_ISDIR and path.is_dir():
+                self.watch(path)
+
+        return paths
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class CogWatcher:
+    """Reload the cog modules of a directory as they change.
+
+    Changes are picked up through inotify where it is available, otherwise
+    the modification times of the modules are polled every
+    :attr:`interval` seconds. Only the modules whose modification time or
+    size changed are reloaded, through :meth:`ep.Client.reload_cog_module`.
+
+    Parameters
+    ----------
+    client : :class:`ep.Client`
+        The client whose cogs to reload.
+    directory : :class:`pathlib.Path`
+        The cog directory to watch.
+    interval : Optional[:class:`float`]
+        The seconds in between polls when inotify isn't available.
+    logger : Optional[:class:`logging.Logger`]
+        The logger to report reloads to.
+    """
+
+    interval: float = 1.0
+    debounce: float = 0.2
+
+    def __init__(
+        self,
+        client: Any,
+        directory: Path,
+        *,
+        interval: Optional[float] = None,
+        logger: Optional[Logger] = None,
+    ):
+        if interval is not None:
+            self.interval = interval
+
+        self.client = client
+        self.directory = directory.resolve().absolute()
+        self.logger = logger or getLogger(__name__)
+        self.stamps: Dict[str, List[int]] = {}
+        self.reloads = 0
+
+    def _module_name(self, path: Path) -> Optional[str]:
+        try:
+            head, *rest = path.relative_to(self.directory).parts
+        except ValueError:
+            return None
+
+        if head.startswith(".") or "__pycache__" in (head, *rest):
+            return None
+
+        # Only modules and directories matter, not other files lying around.
+        leaf = rest[-1] if rest else head
+
+        if leaf.endswith(".py"):
+            return head if rest else head[:-3]
+
+        return None if "." in leaf else head
+
+    def _scan(self) -> Dict[str, List[int]]:
+        return {name: module_stamp(path) for name, path in cog_modules(self.directory)}
+
+    def changed(self, names: Optional[Iterable[str]] = None) -> List[str]:
+        """The modules, out of ``names`` or all of them, that changed since the last check."""
+        current = self._scan()
+
+        if names is None:
+            names = set(current) | set(self.stamps)
+
+        changed = [name for name in sorted(names) if current.get(name) != self.stamps.get(name)]
+
+        for name in changed:
+            if name in current:
+                self.stamps[name] = current[name]
+            else:
+                self.stamps.pop(name, None)
+
+        return changed
+
+    async def reload(self, names: Iterable[str]) -> None:
+        """Reload every module in ``names``, one at a time."""
+        for name in names:
+            self.logger.info("Cog module %s changed, reloading", name)
+
+            if await self.client.reload_cog_module(self.directory, name) is not None:
+                self.reloads += 1
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.reload(self.changed())
+
+    async def _notify(self, inotify: _Inotify) -> None:
+        loop = asyncio.get_event_loop()
+        pending: Set[str] = set()
+        ready = asyncio.Event()
+
+        def on_readable() -> None:
+            for path in inotify.read():
+                if (name := self._module_name(path)) is not None:
+                    pending.add(name)
+                    ready.set()
+
+        loop.add_reader(inotify.fd, on_readable)
+
+        try:
+            while True:
+                await ready.wait()
+
+                # Editors tend to write a file in several steps.
+                await asyncio.sleep(self.debounce)
+                names = set(pending)
+                pending.clear()
+                ready.clear()
+
+                await self.reload(self.changed(names))
+        finally:
+            loop.remove_reader(inotify.fd)
+
+    async def watch(self) -> None:
+        """Watch the directory until cancelled."""
+        self.stamps = self._scan()
+        inotify = _Inotify.open()
+
+        if inotify is None:
+            self.logger.info("Polling %s for cog changes every %ss", str(self.directory), self.interval)
+            await self._poll()
+            return
+
+        try:
+            inotify.watch(self.directory)
+            self.logger.info("Watching %s for cog changes", str(self.directory))
+            await self._notify(inotify)
+        finally:
+            inotify.close()
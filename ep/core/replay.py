@@ -0,0 +1,263 @@
+"""GatewayRecorder and GatewayReplayer implementations."""
+import gzip
+import zlib
+from asyncio import sleep
+from json import dumps as json_dumps, loads as json_loads
+from logging import Logger, getLogger
+from pathlib import Path
+from struct import Struct
+from time import monotonic, time
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple, Union
+
+__all__ = ("GatewayRecorder", "GatewayReplayer", "read_log")
+
+MAGIC: bytes = b"EPGW\x01"
+
+# Every record is a big endian (timestamp, length) header followed by
+# ``length`` bytes of the json encoded payload, the whole stream is gzipped.
+_HEADER = Struct(">dI")
+_GZIP: int = 16 + zlib.MAX_WBITS
+_CHUNK: int = 64 * 1024
+
+
+def _inflate(file: BinaryIO) -> Iterator[bytes]:
+    # Decompress every gzip member in turn. Unlike ``gzip.GzipFile``, which
+    # reads ahead, everything before damaged data is produced before the
+    # error is raised.
+    decompressor = zlib.decompressobj(_GZIP)
+    pending = b""
+
+    while True:
+        chunk = pending or file.read(_CHUNK)
+        pending = b""
+
+        if not chunk:
+            return
+
+        backup = decompressor.copy()
+
+        try:
+            yield decompressor.decompress(chunk)
+        except zlib.error:
+            # Salvage what the chunk held up to the damage.
+            for index in range(len(chunk)):
+                try:
+                    yield backup.decompress(chunk[index : index + 1])
+                except zlib.error:
+                    break
+
+            raise
+
+        if decompressor.eof:
+            pending = decompressor.unused_data
+            decompressor = zlib.decompressobj(_GZIP)
+
+
+def read_log(
+    path: Union[str, Path], *, logger: Optional[Logger] = None
+) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """Iterate over the ``(timestamp, payload)`` records of a gateway log.
+
+    A log cut short (e.g. by a crash while recording) ends at the last
+    complete record, so does a log whose damaged member is followed by
+    another one, which is logged.
+    """
+    logger = logger or getLogger(__name__)
+    buffer = bytearray()
+    records = 0
+    started = False
+
+    with open(path, "rb") as file:
+        try:
+            for chunk in _inflate(file):
+                buffer += chunk
+                offset = 0
+
+                if not started:
+                    if len(buffer) < len(MAGIC):
+                        continue
+
+                    if buffer[: len(MAGIC)] != MAGIC:
+                        raise ValueError(f"{str(path)!r} is not a gateway log.")
+
+                    started, offset = True, len(MAGIC)
+
+                while len(buffer) - offset >= _HEADER.size:
+                    timestamp, length = _HEADER.unpack_from(buffer, offset)
+                    end = offset + _HEADER.size + length
+
+                    if len(buffer) < end:
+                        break
+
+                    payload = json_loads(buffer[offset + _HEADER.size : end])
+                    offset = end
+                    records += 1
+                    yield timestamp, payload
+
+                del buffer[:offset]
+        except zlib.error as err:
+            if not started:
+                raise ValueError(f"{str(path)!r} is not a gateway log.") from err
+
+            # A crashed recording leaves a member without its end, the
+            # member appended after it can't be told apart from garbage.
+            logger.warning(
+                "Gateway log %s is damaged after %s records => %s", str(path), records, err
+            )
+
+
+class GatewayRecorder:
+    """Append raw gateway payloads to a compressed, length prefixed log.
+
+    Recording into an existing log appends a new gzip member, so a log can
+    grow across restarts and is still read back as a single stream.
+
+    The log is flushed every :attr:`flush_every` records or
+    :attr:`flush_interval` seconds, whichever comes first, so a crash only
+    loses the records since.
+
+    Parameters
+    ----------
+    path : Union[:class:`str`, :class:`pathlib.Path`]
+        The log to append to.
+    """
+
+    compresslevel: int = 6
+    flush_every: int = 256
+    flush_interval: float = 1.0
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.records = 0
+        self.__file: Optional[BinaryIO] = None
+        self.__unflushed = 0
+        self.__flushed = monotonic()
+
+    def __enter__(self) -> "GatewayRecorder":
+        return self
+
+    def __exit__(self, *_, **__) -> None:
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        """:class:`bool` - Whether the log has been closed."""
+        return self.__file is None
+
+    def record(self, payload: Dict[str, Any], timestamp: Optional[float] = None) -> None:
+        """Append a payload to the log."""
+        if self.__file is None:
+            fresh = not self.path.exists() or not self.path.stat().st_size
+            self.__file = gzip.open(self.path, "ab", compresslevel=self.compresslevel)
+
+            if fresh:
+                self.__file.write(MAGIC)
+
+        data = json_dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.__file.write(_HEADER.pack(time() if timestamp is None else timestamp, len(data)))
+        self.__file.write(data)
+        self.records += 1
+        self.__unflushed += 1
+
+        if (
+            self.__unflushed >= self.flush_every
+            or monotonic() - self.__flushed >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the records compressed so far to the log."""
+        if self.__file is not None:
+            # A sync flush ends on a byte boundary, so everything written
+            # so far can be decompressed without the rest of the member.
+            self.__file.flush()
+
+        self.__unflushed = 0
+        self.__flushed = monotonic()
+
+    def close(self) -> None:
+        """Flush and close the log, recording again reopens it."""
+        file, self.__file = self.__file, None
+
+        if file is not None:
+            file.close()
+
+
+class GatewayReplayer:
+    """Feed a recorded gateway log back into a client, without a connection.
+
+    Every payload is dispatched as a ``socket_response`` event and dispatch
+    payloads are handed to the parsers of the clients connection state, the
+    same way the gateway websocket would, so caches are populated and the
+    usual events are dispatched.
+
+    Parameters
+    ----------
+    client : :class:`ep.core.BaseClient`
+        The client to replay into.
+    path : Union[:class:`str`, :class:`pathlib.Path`]
+        The log to replay.
+    speed : Optional[:class:`float`]
+        A multiplier of the original pace, e.g. ``2.0`` replays twice as
+        fast. ``None`` replays as fast as possible.
+    logger : Optional[:class:`logging.Logger`]
+        The logger to report parser failures to.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        path: Union[str, Path],
+        *,
+        speed: Optional[float] = 1.0,
+        logger: Optional[Logger] = None,
+    ):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be a positive number or None.")
+
+        self.client = client
+        self.path = Path(path)
+        self.speed = speed
+        self.logger = logger or getLogger(__name__)
+
+        self.replayed = 0
+        self.failed = 0
+
+    def feed(self, payload: Dict[str, Any]) -> None:
+        """Feed a single payload into the client."""
+        self.client.dispatch("socket_response", payload)
+
+        if payload.get("op") != 0:
+            return
+
+        parser = self.client._connection.parsers.get(payload["t"])  # pylint: disable=protected-access
+
+        if parser is None:
+            return
+
+        try:
+            parser(payload["d"])
+        except Exception as err:  # pylint: disable=broad-except
+            self.failed += 1
+            self.logger.error("Failed to replay %s => %s", payload["t"], err)
+
+    async def replay(self) -> int:
+        """Replay the log, returns the amount of payloads replayed."""
+        loop = self.client.loop
+        started = loop.time()
+        first: Optional[float] = None
+
+        for timestamp, payload in read_log(self.path):
+            if first is None:
+                first = timestamp
+
+            if self.speed is None:
+                # Still yield so the scheduled handlers get to run.
+                await sleep(0)
+            else:
+                await sleep(max(0.0, started + (timestamp - first) / self.speed - loop.time()))
+
+            self.feed(payload)
+            self.replayed += 1
+
+        return self.replayed
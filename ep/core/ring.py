@@ -0,0 +1,131 @@
+"""FrameRing implementation."""
+import mmap
+from collections import deque
+from pathlib import Path
+from typing import Deque, List, Optional, Tuple, Union
+
+__all__ = ("FrameRing",)
+
+
+class FrameRing:
+    """A bounded ring of encoded frames, each tagged with a sequence number.
+
+    Frames are copied into a buffer of :attr:`capacity` bytes allocated up
+    front, or a memory mapped file of that size when a ``path`` is given,
+    so a large ring neither lives on the heap nor churns it. Once the ring
+    holds :attr:`size` frames, or a new frame doesn't fit, the oldest
+    frames are evicted. A frame larger than the whole buffer is numbered
+    but never stored.
+
+    The file only backs the buffer, it's truncated when the ring is created.
+
+    Parameters
+    ----------
+    size : Optional[:class:`int`]
+        The most frames the ring holds.
+    capacity : Optional[:class:`int`]
+        The size of the buffer in bytes.
+    path : Optional[Union[:class:`str`, :class:`pathlib.Path`]]
+        The file to memory map the buffer from.
+    """
+
+    size: int = 1024
+    capacity: int = 8 * 1024 * 1024
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        *,
+        capacity: Optional[int] = None,
+        path: Optional[Union[str, Path]] = None,
+    ):
+        if size is not None:
+            self.size = size
+
+        if capacity is not None:
+            self.capacity = capacity
+
+        if self.size < 1 or self.capacity < 1:
+            raise ValueError("size and capacity must be positive integers.")
+
+        self.path = Path(path) if path is not None else None
+        self.sequence = 0
+
+        # (sequence, offset, length) of every stored frame, oldest first.
+        self._index: Deque[Tuple[int, int, int]] = deque()
+        self._head = 0
+
+        if self.path is None:
+            self._buffer: Union[bytearray, mmap.mmap] = bytearray(self.capacity)
+        else:
+            with open(self.path, "w+b") as file:
+                file.truncate(self.capacity)
+                self._buffer = mmap.mmap(file.fileno(), self.capacity)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __repr__(self) -> str:
+        return f"<FrameRing frames={len(self)} first={self.first} sequence={self.sequence}>"
+
+    @property
+    def first(self) -> Optional[int]:
+        """Optional[:class:`int`] - The sequence number of the oldest stored frame."""
+        return self._index[0][0] if self._index else None
+
+    def append(self, payload: bytes) -> int:
+        """Store an encoded frame and return the sequence number it was given."""
+        self.sequence = sequence = self.sequence + 1
+        length = len(payload)
+        index = self._index
+
+        if length > self.capacity:
+            return sequence
+
+        start = self._head
+
+        if start + length > self.capacity:
+            # The tail is skipped, whatever is stored past the head is the
+            # oldest and goes first.
+            while index and index[0][1] >= start:
+                index.popleft()
+
+            start = 0
+
+        end = start + length
+
+        while index and (len(index) >= self.size or self._overlaps(index[0], start, end)):
+            index.popleft()
+
+        self._buffer[start:end] = payload
+        index.append((sequence, start, length))
+        self._head = end
+        return sequence
+
+    @staticmethod
+    def _overlaps(frame: Tuple[int, int, int], start: int, end: int) -> bool:
+        # Empty frames starting within the region count as overlapping too.
+        _, offset, length = frame
+        return offset < end and (offset >= start or offset + length > start)
+
+    def _read(self, frames: List[Tuple[int, int, int]]) -> List[Tuple[int, bytes]]:
+        buffer = self._buffer
+        return [(sequence, bytes(buffer[offset : offset + length])) for sequence, offset, length in frames]
+
+    def since(self, sequence: int, limit: Optional[int] = None) -> List[Tuple[int, bytes]]:
+        """The ``(sequence, payload)`` of the frames after ``sequence``, the latest ``limit`` of them."""
+        frames = [frame for frame in self._index if frame[0] > sequence]
+        return self._read(frames[-limit:] if limit else frames)
+
+    def last(self, count: int) -> List[Tuple[int, bytes]]:
+        """The ``(sequence, payload)`` of the latest ``count`` frames."""
+        return self._read(list(self._index)[-count:]) if count > 0 else []
+
+    def close(self) -> None:
+        """Release the buffer, and unmap the file if there is one."""
+        self._index.clear()
+
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+        self._buffer = bytearray()
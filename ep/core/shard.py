@@ -0,0 +1,284 @@
+"""ShardSupervisor implementation."""
+import asyncio
+import logging
+import multiprocessing
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps as json_dumps
+from logging.handlers import QueueHandler, QueueListener
+from queue import Empty
+from threading import Thread
+from time import monotonic, sleep
+from typing import Any, Dict, Optional
+
+from ..config import Config
+from .client import Client
+from .metrics import Metrics
+from .websocket import WebsocketServer
+
+__all__ = ("ShardSupervisor",)
+
+
+class _ShardFilter(logging.Filter):
+    """Tag the records of a shard with its id.
+
+    The ``shard_id`` attribute holds the id and ``shard`` a ``"[shard N] "``
+    prefix for the ``%(shard)s`` field of the log format.
+    """
+
+    def __init__(self, shard_id: int):
+        super().__init__()
+        self.shard_id = shard_id
+        self.prefix = f"[shard {shard_id}] "
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.shard_id = self.shard_id
+        record.shard = self.prefix
+        return True
+
+
+class _Relay(logging.Handler):
+    """Hand records received from a shard to the logger of the same name."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serve the merged metrics of the shards of :attr:`server.supervisor`."""
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        supervisor = self.server.supervisor  # type: ignore
+        path = self.path.split("?", 1)[0]
+
+        if path == WebsocketServer.metrics_path:
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+            body = Metrics.render(supervisor.metrics()).encode("utf-8")
+        elif path == f"{WebsocketServer.metrics_path}.json":
+            content_type = "application/json"
+            body = json_dumps(supervisor.metrics()).encode("utf-8")
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        pass
+
+
+async def _report_metrics(client: Client, queue: Any, shard_id: int, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        queue.put((shard_id, client.metrics.snapshot()))
+
+
+def _shard_config(config: Config, shard_id: int) -> None:
+    # Every shard records into its own log and maps its own replay ring.
+    if record := config["ep"].get("record"):
+        config.override("ep", "record", value=f"{record}.{shard_id}")
+
+    if replay_file := config["ep"].get("websocket", {}).get("replay_file"):
+        config.override("ep", "websocket", "replay_file", value=f"{replay_file}.{shard_id}")
+
+
+def _shard_main(
+    config: Config, shard_id: int, shard_count: int, logs: Any, metrics: Any, interval: float
+) -> None:
+    # Every record goes through the supervisor, which owns the terminal.
+    handler = QueueHandler(logs)
+    handler.addFilter(_ShardFilter(shard_id))
+
+    for logger in list(logging.root.manager.loggerDict.values()):
+        if isinstance(logger, logging.Logger):
+            logger.handlers.clear()
+
+    logging.root.handlers = [handler]
+
+    # Shards share a host, so each serves its websocket on its own port.
+    WebsocketServer.port += shard_id
+    _shard_config(config, shard_id)
+
+    with Client(
+        config=config,
+        disable=config.get("disabled", False),
+        shard_id=shard_id,
+        shard_count=shard_count,
+    ) as client:
+        if client.metrics is not None and interval:
+            client.schedule_task(
+                _report_metrics(client, metrics, shard_id, interval), name="shard.report_metrics"
+            )
+
+        client.run()
+
+
+class ShardSupervisor:
+    """Run a client per shard, each in its own process.
+
+    Every shard loads its own copy of the cogs, except for the cogs marked
+    with :meth:`ep.Cog.single_shard`. A shard that exits with an error is
+    restarted with exponential backoff, the logs of every shard are relayed
+    through the supervisor and their metrics are merged in :meth:`metrics`.
+
+    With ``prometheus`` enabled in ``[ep.metrics]`` the merged metrics are
+    served on :attr:`metrics_port` (``supervisor_port`` in the config), in
+    the prometheus text format at ``/metrics`` and as the JSON snapshot at
+    ``/metrics.json``, the ports of the shards only serve their own.
+
+    Parameters
+    ----------
+    config : :class:`ep.Config`
+        The config every shard is started with.
+    shard_count : :class:`int`
+        The amount of shards to run.
+    logger : Optional[:class:`logging.Logger`]
+        The logger to report shard failures to.
+    """
+
+    backoff: float = 1.0
+    max_backoff: float = 300.0
+    poll_interval: float = 0.5
+    metrics_interval: float = 5.0
+    metrics_port: int = 9875
+    prometheus: bool = False
+
+    def __init__(self, config: Config, shard_count: int, *, logger: Optional[logging.Logger] = None):
+        if shard_count < 1:
+            raise ValueError("shard_count must be a positive integer.")
+
+        self.config = config
+        self.shard_count = shard_count
+        self.logger = logger or Client.logger
+
+        self.restarts: Dict[int, int] = dict.fromkeys(range(shard_count), 0)
+        self.snapshots: Dict[int, Dict[str, Any]] = {}
+
+        metrics = config.get("ep", {}).get("metrics", {})
+        self.metrics_port = metrics.get("supervisor_port", self.metrics_port)
+        self.prometheus = metrics.get("prometheus", self.prometheus)
+        self.__server: Optional[ThreadingHTTPServer] = None
+
+        self.__context = multiprocessing.get_context("spawn")
+        self.__logs = self.__context.Queue()
+        self.__metrics = self.__context.Queue()
+        self.__processes: Dict[int, Any] = {}
+        self.__started: Dict[int, float] = {}
+        self.__delays: Dict[int, float] = {}
+        self.__pending: Dict[int, float] = {}
+
+    def metrics(self) -> Dict[str, Any]:
+        """The metrics of every shard merged into a single snapshot."""
+        return Metrics.merge(self.snapshots.values())
+
+    def _serve_metrics(self) -> ThreadingHTTPServer:
+        server = self.__server = ThreadingHTTPServer(
+            (WebsocketServer.host, self.metrics_port), _MetricsHandler
+        )
+        server.supervisor = self  # type: ignore
+        Thread(target=server.serve_forever, name="ep-shard-metrics", daemon=True).start()
+        self.logger.info("Serving merged shard metrics on port %s", server.server_address[1])
+        return server
+
+    def _start(self, shard_id: int) -> None:
+        process = self.__context.Process(
+            target=_shard_main,
+            args=(
+                self.config,
+                shard_id,
+                self.shard_count,
+                self.__logs,
+                self.__metrics,
+                self.metrics_interval,
+            ),
+            name=f"ep-shard-{shard_id}",
+            daemon=False,
+        )
+        process.start()
+
+        self.__processes[shard_id] = process
+        self.__started[shard_id] = monotonic()
+        self.logger.info("Started shard %s/%s (pid %s)", shard_id, self.shard_count, process.pid)
+
+    def _poll(self) -> None:
+        now = monotonic()
+
+        for shard_id, process in list(self.__processes.items()):
+            if process.is_alive():
+                continue
+
+            del self.__processes[shard_id]
+
+            if process.exitcode == 0:
+                self.logger.info("Shard %s exited", shard_id)
+                continue
+
+            if now - self.__started[shard_id] > self.max_backoff:
+                self.__delays[shard_id] = self.backoff
+
+            delay = self.__delays.get(shard_id, self.backoff)
+            self.__delays[shard_id] = min(delay * 2, self.max_backoff)
+            self.__pending[shard_id] = now + delay
+
+            self.logger.error(
+                "Shard %s died (exit code %s), restarting in %ss", shard_id, process.exitcode, delay
+            )
+
+        for shard_id, when in list(self.__pending.items()):
+            if when <= now:
+                del self.__pending[shard_id]
+                self.restarts[shard_id] += 1
+                self._start(shard_id)
+
+        while True:
+            try:
+                shard_id, snapshot = self.__metrics.get_nowait()
+            except Empty:
+                break
+
+            self.snapshots[shard_id] = snapshot
+
+    def stop(self) -> None:
+        """Terminate every shard."""
+        self.__pending.clear()
+
+        for process in self.__processes.values():
+            process.terminate()
+
+        for process in self.__processes.values():
+            process.join()
+
+        self.__processes.clear()
+
+    def run(self) -> None:
+        """Start every shard and supervise them until they have all exited."""
+        listener = QueueListener(self.__logs, _Relay())
+        listener.start()
+
+        try:
+            if self.prometheus:
+                self._serve_metrics()
+
+            for shard_id in range(self.shard_count):
+                self._start(shard_id)
+
+            while self.__processes or self.__pending:
+                sleep(self.poll_interval)
+                self._poll()
+        except KeyboardInterrupt:
+            self.logger.info("Stopping %s shards", len(self.__processes))
+        finally:
+            self.stop()
+            listener.stop()
+
+            if self.__server is not None:
+                self.__server.shutdown()
+                self.__server.server_close()
+                self.__server = None
+
+        if self.snapshots:
+            self.logger.info("Events across every shard: %s", self.metrics()["events"])
@@ -0,0 +1,113 @@
+"""Subscription implementation."""
+from json import dumps as json_dumps
+from typing import Any, Dict, List, Optional, Tuple
+
+__all__ = ("Subscription",)
+
+# A form compiles to the ``(path, expected)`` pairs of its leaves, an empty
+# dict leaf only asks for the path to exist.
+Check = Tuple[Tuple[Any, ...], Any]
+Form = Tuple[Check, ...]
+
+_PRESENT = object()
+_WILDCARD: str = "*"
+
+
+def _compile_form(form: Any, path: Tuple[Any, ...] = ()) -> List[Check]:
+    if not isinstance(form, dict):
+        return [(path, form)]
+
+    if not form:
+        return [(path, _PRESENT)]
+
+    return [check for key, value in form.items() for check in _compile_form(value, (*path, key))]
+
+
+def _intersects(form: Form, data: Any) -> bool:
+    for path, expected in form:
+        value = data
+
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                return False
+
+            value = value[key]
+
+        if expected is not _PRESENT and value != expected:
+            return False
+
+    return True
+
+
+def _compile_filter(spec: Any) -> Tuple[Tuple[Form, ...], Tuple[Form, ...]]:
+    if spec is True or spec is None:
+        return (), ()
+
+    if not isinstance(spec, dict) or set(spec) - {"include", "exclude"}:
+        raise ValueError(f"a filter is true or a table of include and exclude forms, not {spec!r}")
+
+    include, exclude = (spec.get(kind) or [] for kind in ("include", "exclude"))
+
+    if not isinstance(include, list) or not isinstance(exclude, list):
+        raise ValueError(f"include and exclude must be lists of forms, not {spec!r}")
+
+    return (
+        tuple(tuple(_compile_form(form)) for form in include),
+        tuple(tuple(_compile_form(form)) for form in exclude),
+    )
+
+
+class Subscription:
+    """The events a websocket client asked for, and the predicates on their data.
+
+    ``events`` maps an event type (``"*"`` for any other type) to its
+    filter, ``true`` for every event of the type or a table of ``include``
+    and ``exclude`` forms, the same filters the TUI console is configured
+    with. A form is matched against the data (``"d"``) of a frame, every
+    nested key of it must be present with an equal value and an empty
+    table only asks for the key to be present. An event passes a filter if
+    every include form and no exclude form matches, and a type may be given
+    a list of filters of which any has to pass.
+
+    >>> Subscription({"MESSAGE_CREATE": {"exclude": [{"author": {"bot": True}}]}})
+
+    Parameters
+    ----------
+    events : Dict[:class:`str`, Any]
+        The filter of every event type to receive.
+
+    Raises
+    ------
+    ValueError
+        The filters are malformed.
+    """
+
+    __slots__ = ("events", "key", "__weakref__")
+
+    def __init__(self, events: Dict[str, Any]):
+        if not isinstance(events, dict):
+            raise ValueError(f"events must be a table of event types, not {events!r}")
+
+        self.key = json_dumps(events, sort_keys=True, default=repr)
+        self.events: Dict[str, Tuple[Any, ...]] = {
+            str(event_type): tuple(
+                _compile_filter(spec) for spec in (specs if isinstance(specs, list) else [specs])
+            )
+            for event_type, specs in events.items()
+        }
+
+    def __repr__(self) -> str:
+        return f"<Subscription events={sorted(self.events)!r}>"
+
+    def matches(self, event_type: Optional[str], data: Any) -> bool:
+        """Whether an event of ``event_type`` with ``data`` was subscribed to."""
+        filters = self.events.get(event_type) if event_type is not None else None
+
+        if filters is None and (filters := self.events.get(_WILDCARD)) is None:
+            return False
+
+        return any(
+            all(_intersects(form, data) for form in include)
+            and not any(_intersects(form, data) for form in exclude)
+            for include, exclude in filters
+        )
@@ -0,0 +1,190 @@
+"""TaskSupervisor implementation."""
+from asyncio import AbstractEventLoop, CancelledError, Future, Task, current_task, gather, sleep
+from collections import Counter
+from itertools import count
+from logging import Logger, getLogger
+from typing import Any, Callable, Coroutine, Dict, List, NamedTuple, Optional
+
+__all__ = ("TaskSupervisor", "TaskInfo")
+
+
+class TaskInfo(NamedTuple):
+    """A snapshot of a supervised task."""
+
+    name: str
+    owner: Any
+    age: float
+    restarts: int
+
+
+class _Entry(NamedTuple):
+    name: str
+    owner: Any
+    created: float
+
+
+class TaskSupervisor:
+    """Schedules tasks and keeps track of them grouped by the object that owns them.
+
+    Exceptions are logged instead of printed, :meth:`cancel` tears down every
+    task of an owner (e.g. a cog being ejected) and :meth:`supervise` restarts
+    a coroutine function with exponential backoff when it fails.
+
+    Parameters
+    ----------
+    loop : :class:`asyncio.AbstractEventLoop`
+        The loop to create tasks on.
+    logger : Optional[:class:`logging.Logger`]
+        The logger to report failures to.
+    """
+
+    backoff: float = 1.0
+    max_backoff: float = 300.0
+
+    def __init__(self, loop: AbstractEventLoop, *, logger: Optional[Logger] = None):
+        self.loop = loop
+        self.logger = logger or getLogger(__name__)
+        self.restarts: Counter = Counter()
+
+        self.__tasks: Dict[Task, _Entry] = {}
+        self.__counter = count()
+
+    def __len__(self) -> int:
+        return len(self.__tasks)
+
+    @staticmethod
+    def _infer_owner(coro: Coroutine) -> Any:
+        # A coroutine of a cog method that hasn't started yet still has
+        # its ``self`` argument in its frame, e.g. ``self._hook(path)``
+        from .cog import Cog  # pylint: disable=import-outside-toplevel
+
+        frame = getattr(coro, "cr_frame", None)
+        owner = frame.f_locals.get("self", None) if frame is not None else None
+        return owner if isinstance(owner, Cog) else None
+
+    async def _run(self, coro: Coroutine, name: str) -> Any:
+        try:
+            return await coro
+        except CancelledError:
+            raise
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.error("Task %s failed", repr(name), exc_info=exc)
+
+    def spawn(self, coro: Coroutine, *, name: Optional[str] = None, owner: Any = None) -> Task:
+        """Wrap a coroutine in a supervised :class:`asyncio.Task`.
+
+        Parameters
+        ----------
+        coro : Coroutine
+            The coroutine to schedule.
+        name : Optional[:class:`str`]
+            The name of the task, derived from the coroutine if ``None``.
+        owner : Any
+            The owner of the task, inferred for coroutines of cog methods.
+        """
+        if name is None:
+            name = f"{getattr(coro, '__qualname__', 'task')}-{next(self.__counter)}"
+
+        if owner is None:
+            owner = self._infer_owner(coro)
+
+        task = self.loop.create_task(self._run(coro, name), name=name)
+        self.__tasks[task] = _Entry(name, owner, self.loop.time())
+        task.add_done_callback(self.__forget)
+        return task
+
+    def __forget(self, task: Future) -> None:
+        self.__tasks.pop(task, None)
+
+    def supervise(
+        self,
+        corofunc: Callable[[], Coroutine],
+        *,
+        name: Optional[str] = None,
+        owner: Any = None,
+    ) -> Task:
+        """Run a coroutine function in a task, restarting it with backoff if it raises.
+
+        The backoff starts at :attr:`backoff` seconds and doubles after every
+        failure up to :attr:`max_backoff`, it resets once the coroutine has
+        run for longer than :attr:`max_backoff` without failing.
+        """
+        if name is None:
+            name = getattr(corofunc, "__qualname__", repr(corofunc))
+
+        async def supervised() -> Any:
+            delay = self.backoff
+
+            while True:
+                started = self.loop.time()
+
+                try:
+                    return await corofunc()
+                except CancelledError:
+                    raise
+                except Exception as exc:  # pylint: disable=broad-except
+                    self.logger.error("Task %s failed, restarting", repr(name), exc_info=exc)
+
+                if self.loop.time() - started > self.max_backoff:
+                    delay = self.backoff
+
+                await sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+                self.restarts[name] += 1
+
+        return self.spawn(supervised(), name=name, owner=owner)
+
+    def tasks(self, owner: Any = None) -> List[Task]:
+        """The live tasks of ``owner``, or every live task if ``None``."""
+        return [
+            task
+            for task, entry in self.__tasks.items()
+            if owner is None or entry.owner is owner
+        ]
+
+    def snapshot(self) -> List[TaskInfo]:
+        """Snapshot every live task, oldest first."""
+        now = self.loop.time()
+
+        return sorted(
+            (
+                TaskInfo(entry.name, entry.owner, now - entry.created, self.restarts[entry.name])
+                for entry in self.__tasks.values()
+            ),
+            key=lambda info: info.age,
+            reverse=True,
+        )
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """The amount of live tasks and the age of the oldest one, per owner."""
+        stats: Dict[str, Dict[str, float]] = {}
+
+        for info in self.snapshot():
+            owner = getattr(info.owner, "__cog_name__", None) or repr(info.owner)
+
+            if owner not in stats:
+                stats[owner] = {"count": 0, "oldest": info.age}
+
+            stats[owner]["count"] += 1
+
+        return stats
+
+    def cancel(self, owner: Any = None) -> Future:
+        """Cancel the tasks of ``owner``, or every task if ``None``.
+
+        The task calling this is left running, e.g. a handler closing the
+        client, so it can finish what it is doing. Returns a future that
+        resolves once the other tasks have finished.
+        """
+        caller = current_task(self.loop) if self.loop.is_running() else None
+        tasks = [task for task in self.tasks(owner) if task is not caller]
+
+        if not tasks:
+            future = self.loop.create_future()
+            future.set_result([])
+            return future
+
+        for task in tasks:
+            task.cancel()
+
+        return gather(*tasks, return_exceptions=True)
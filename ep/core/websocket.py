@@ -1,51 +1,472 @@
 """Websocket server implementation."""
-from pickle import dumps as pickle_dumps
+from asyncio import Event, TimeoutError as AsyncTimeoutError, sleep, wait_for
+from collections import deque
+from hmac import compare_digest
+from http import HTTPStatus
+from json import loads as json_loads
+from pathlib import Path
 from contextlib import suppress
-from functools import partial
-from typing import Any
+from time import time
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+from weakref import WeakValueDictionary
 
 import websockets
+from websockets.exceptions import ConnectionClosed
+
+from .codec import CODECS, Codec, Compressor, negotiate
+from .limits import DROP_OLDEST
+from .ring import FrameRing
+from .subscription import Subscription
+
+__all__ = ("WebsocketServer", "DROP_OLDEST", "COALESCE", "DISCONNECT", "SLOW_CONSUMER_POLICIES")
+
+COALESCE: str = "coalesce"
+DISCONNECT: str = "disconnect"
+
+SLOW_CONSUMER_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+
+def _replay_request(path: str) -> Tuple[Optional[int], Optional[int]]:
+    # The ``resume`` sequence and the ``last`` amount of frames a client asked for.
+    params = parse_qs(urlsplit(path or "").query)
+    requested = []
+
+    for name in ("resume", "last"):
+        value = params.get(name, [None])[-1]
+
+        try:
+            requested.append(None if value is None else int(value))
+        except ValueError:
+            raise ValueError(f"{name} must be an integer, not {value!r}") from None
+
+    return requested[0], requested[1]
+
+
+def _control_request(path: str) -> Optional[str]:
+    # The token a client asked to be allowed control commands with.
+    return parse_qs(urlsplit(path or "").query).get("token", [None])[-1]
+
+
+class _Peer:
+    """A connected socket, its bounded send queue and the counters reported for it.
+
+    Frames are queued encoded, as ``(key, payload)`` pairs, and sent in
+    order by :meth:`write`, which runs as a task per socket so a slow socket
+    only ever holds up its own queue. Compression is stateful so it happens
+    as frames are sent, after any frame was dropped. Broadcasts are only
+    queued if they match the :class:`Subscription` of the socket, if it has
+    one.
+
+    A batching socket is sent the frames queued within ``batch_window``
+    seconds of the first one, up to ``batch_size`` of them, joined into a
+    single frame.
+    """
+
+    __slots__ = (
+        "socket",
+        "size",
+        "policy",
+        "codec",
+        "compressor",
+        "subscription",
+        "batch_window",
+        "batch_size",
+        "queue",
+        "sent",
+        "frames",
+        "sent_bytes",
+        "dropped",
+        "coalesced",
+        "filtered",
+        "control",
+        "_ready",
+        "_full",
+    )
+
+    def __init__(
+        self,
+        socket: Any,
+        size: int,
+        policy: str,
+        codec: Codec,
+        compressor: Optional[Compressor] = None,
+        batch_window: Optional[float] = None,
+        batch_size: int = 1,
+    ):
+        self.socket = socket
+        self.size = size
+        self.policy = policy
+        self.codec = codec
+        self.compressor = compressor
+        self.subscription: Optional[Subscription] = None
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.queue: Deque[Tuple[Optional[str], bytes]] = deque()
+        self.sent = 0
+        self.frames = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.filtered = 0
+        self.control = False
+        self._ready = Event()
+        self._full = Event()
+
+    def put(self, payload: bytes, key: Optional[str] = None) -> bool:
+        """Queue a frame, ``False`` if the queue is full and the socket should be disconnected."""
+        queue = self.queue
+
+        if len(queue) >= self.size:
+            if self.policy == DISCONNECT:
+                return False
+
+            # Coalescing replaces the oldest queued frame of the same key,
+            # e.g. an older metrics snapshot, before dropping anything else.
+            index = (
+                next((index for index, (queued, _) in enumerate(queue) if queued == key), None)
+                if self.policy == COALESCE and key is not None
+                else None
+            )
+
+            if index is None:
+                queue.popleft()
+                self.dropped += 1
+            else:
+                del queue[index]
+                self.coalesced += 1
+
+        queue.append((key, payload))
+        self._ready.set()
+
+        if len(queue) >= self.batch_size:
+            self._full.set()
+
+        return True
+
+    async def write(self) -> None:
+        """Send the queued frames until the socket closes."""
+        queue = self.queue
+        compressor = self.compressor
+        batch = self.codec.batch if self.batch_window is not None else None
+
+        while True:
+            await self._ready.wait()
+
+            if batch is not None and self.batch_window and len(queue) < self.batch_size:
+                try:
+                    await wait_for(self._full.wait(), self.batch_window)
+                except AsyncTimeoutError:
+                    pass
+
+            self._ready.clear()
+            self._full.clear()
+
+            while queue:
+                if batch is None:
+                    _, payload = queue.popleft()
+                    count = 1
+                else:
+                    count = min(len(queue), self.batch_size)
+                    payload = batch([queue.popleft()[1] for _ in range(count)])
+
+                if compressor is not None:
+                    payload = compressor.compress(payload)
+
+                try:
+                    await self.socket.send(payload)
+                except ConnectionClosed:
+                    return
+
+                self.sent += count
+                self.frames += 1
+                self.sent_bytes += len(payload)
+
+    def stats(self) -> Dict[str, Any]:
+        """The queue depth and counters of the socket."""
+        return {
+            "remote": str(getattr(self.socket, "remote_address", None)),
+            "encoding": self.codec.name,
+            "compress": self.compressor.method if self.compressor is not None else None,
+            "batch": self.batch_window is not None,
+            "subscribed": sorted(self.subscription.events) if self.subscription is not None else None,
+            "depth": len(self.queue),
+            "sent": self.sent,
+            "frames": self.frames,
+            "sent_bytes": self.sent_bytes,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "filtered": self.filtered,
+        }
 
 
 class WebsocketServer:
-    """A Websocket server."""
+    """A Websocket server.
+
+    Every ``metrics_interval`` seconds a snapshot of the client metrics is
+    broadcast as an ``EP_METRICS`` frame, and when ``prometheus`` is enabled
+    plain http requests for ``metrics_path`` are answered with the metrics
+    in the prometheus text format on the same port.
+
+    Connected clients may send commands as json text frames of the form
+    ``{"op": <command>, "d": <arguments>}``, the reply (if any) is sent
+    back as an ``EP_<COMMAND>`` frame. The supported commands are:
+
+     - ``profile`` with an ``action`` of ``"start"``, ``"stop"`` or
+       ``"toggle"``. Stopping writes the samples into :attr:`profile_dir`.
+       This is a control command, see below.
+     - ``clients`` replies with the queue depth and counters of every
+       connected client.
+     - ``subscribe`` with the ``events`` to receive, see
+       :class:`ep.core.subscription.Subscription`. Broadcasts nobody
+       subscribed to are neither encoded nor queued, ``null`` subscribes
+       to every event again, which is what clients start with.
+
+    The commands in :attr:`control_commands` act on the bot, rather than
+    reading from it, and are only run for clients that connected with
+    ``token=<control_token>``. They are refused for everyone while no
+    :attr:`control_token` is configured.
+
+    Every socket has a send queue of :attr:`queue_size` frames drained by a
+    task of its own, so broadcasting never waits on a socket. Once the
+    queue of a slow socket is full the :attr:`slow_consumer` policy applies:
+
+     - ``"drop_oldest"`` drops the oldest queued frame.
+     - ``"coalesce"`` replaces the oldest queued frame of the same type,
+       e.g. an older ``EP_METRICS`` snapshot, and drops the oldest frame
+       otherwise.
+     - ``"disconnect"`` closes the socket.
+
+    Clients pick the wire format of the frames they receive when they
+    connect, with the ``encoding`` (``msgpack``, ``json`` or ``pickle``)
+    and ``compress`` (``zlib`` or, with :mod:`zstandard` installed,
+    ``zstd``) query parameters, e.g. ``ws://localhost:9876/?encoding=msgpack&compress=zlib``.
+    Clients that ask for nothing get :attr:`default_encoding`, pickle unless
+    configured otherwise, which is only safe to unpickle from a trusted bot.
+
+    Clients on the firehose may also ask for ``batch=true``, every frame
+    they receive is then a list of the frames queued within
+    :attr:`batch_window` seconds of the first one, at most
+    :attr:`batch_size` of them, encoded once as a whole.
+
+    Unless :attr:`replay_size` is ``0`` every broadcast is numbered, in the
+    ``"q"`` field of the frame, and kept encoded with
+    :attr:`replay_encoding`, :attr:`default_encoding` unless configured
+    otherwise, in a :class:`ep.core.ring.FrameRing`, memory mapped from
+    :attr:`replay_file` if one is set. Clients connecting with
+    ``resume=<q>`` are sent the frames after the one they saw last and
+    clients connecting with ``last=<n>`` the latest ``n`` frames, followed
+    by an ``EP_REPLAY`` frame telling how many frames were missed for good.
+    Replays skip subscriptions and are bounded by :attr:`queue_size`.
+
+    Keeping the ring costs an encode per broadcast, even while nobody is
+    connected or subscribed to it, which the clients of the replay encoding
+    reuse rather than encode the frame again. Frames of the types in
+    :attr:`replay_exclude`, the periodic ``EP_METRICS`` snapshots, are
+    neither numbered nor kept, and a frame :attr:`replay_encoding` can't
+    encode is only left out of the ring.
+    """
     host: str = "localhost"
     port: int = 9876
 
+    queue_size: int = 256
+    slow_consumer: str = DROP_OLDEST
+    default_encoding: str = "pickle"
+    batch_window: float = 0.05
+    batch_size: int = 128
+
+    replay_size: int = 1024
+    replay_bytes: int = 8 * 1024 * 1024
+    replay_file: Optional[Path] = None
+    replay_encoding: Optional[str] = None
+    replay_exclude: Tuple[str, ...] = ("EP_METRICS",)
+
+    control_token: Optional[str] = None
+    control_commands: Tuple[str, ...] = ("profile",)
+
+    metrics_interval: float = 5.0
+    metrics_path: str = "/metrics"
+    prometheus: bool = False
+    profile_dir: Path = Path(".")
+
     def __init__(self, client):
         self._client = client
         self._coro = None
-        self._sockets = set()
+        self._peers: Dict[Any, _Peer] = {}
+        # Clients asking for the same events share one subscription, so
+        # broadcasting evaluates it once for all of them.
+        self._subscriptions: "WeakValueDictionary[str, Subscription]" = WeakValueDictionary()
+
+        config = client.config.get("ep", {}).get("metrics", {})
+        self.metrics_interval = config.get("interval", self.metrics_interval)
+        self.prometheus = config.get("prometheus", self.prometheus)
+
+        config = client.config.get("ep", {}).get("websocket", {})
+        self.queue_size = config.get("queue_size", self.queue_size)
+        self.slow_consumer = config.get("slow_consumer", self.slow_consumer)
+        self.default_encoding = config.get("default_encoding", self.default_encoding)
+        self.batch_window = config.get("batch_window", self.batch_window)
+        self.batch_size = config.get("batch_size", self.batch_size)
+        self.control_token = config.get("control_token") or self.control_token
+
+        self.replay_size = config.get("replay_size", self.replay_size)
+        self.replay_bytes = config.get("replay_bytes", self.replay_bytes)
+        self.replay_encoding = config.get("replay_encoding") or self.replay_encoding or self.default_encoding
+
+        if replay_file := config.get("replay_file"):
+            fp = getattr(client.config, "fp", None)
+            self.replay_file = fp.parent.joinpath(replay_file) if fp is not None else Path(replay_file)
+
+        if self.slow_consumer not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(
+                f"slow_consumer must be one of {SLOW_CONSUMER_POLICIES!r} not {self.slow_consumer!r}"
+            )
+
+        if self.replay_encoding not in CODECS:
+            raise ValueError(f"replay_encoding must be one of {tuple(CODECS)!r} not {self.replay_encoding!r}")
+
+        self.ring: Optional[FrameRing] = (
+            FrameRing(self.replay_size, capacity=self.replay_bytes, path=self.replay_file)
+            if self.replay_size
+            else None
+        )
+
+        if (metrics := getattr(client, "metrics", None)) is not None:
+            metrics.gauge("websocket_clients", lambda: len(self._peers))
+            metrics.gauge("websocket_queue_depth", lambda: sum(len(peer.queue) for peer in self._peers.values()))
+            metrics.gauge("websocket_dropped", lambda: sum(peer.dropped for peer in self._peers.values()))
+            metrics.gauge("websocket_replay_frames", lambda: len(self.ring) if self.ring is not None else 0)
 
     @property
     def sockets(self):
         """Set[socket] - All of the currently connected sockets."""
-        return self._sockets
+        return self._peers.keys()
 
-    async def broadcast(self, data: Any) -> None:
-        """Pickle and ``.send`` some ``data`` to all connected clients."""
-        if not self.sockets:
+    def stats(self) -> List[Dict[str, Any]]:
+        """The queue depth and sent, dropped and coalesced frames of every connected client."""
+        return [peer.stats() for peer in self._peers.values()]
+
+    def send(self, socket: Any, data: Any) -> None:
+        """Encode some ``data`` in the format of a single socket and queue it."""
+        if (peer := self._peers.get(socket)) is None:
             return
 
         try:
-            payload = await self._client.loop.run_in_executor(None, partial(pickle_dumps, data, protocol=5))
+            payload = peer.codec.encode(data)
         except Exception as err:  # pylint: disable=broad-except
             return self._client.logger.error("%s => %s", repr(data), err)
 
-        for socket in self.sockets:
-            await socket.send(payload)
+        self._queue(peer, payload, data.get("t") if isinstance(data, dict) else None)
+
+    def _queue(self, peer: _Peer, payload: bytes, key: Optional[str]) -> None:
+        # Applies the slow consumer policy.
+        if peer.put(payload, key):
+            return
+
+        self._client.logger.warning(
+            "ws: disconnecting slow client %s, %s frames queued", peer.stats()["remote"], len(peer.queue)
+        )
+
+        del self._peers[peer.socket]
+        self._client.schedule_task(peer.socket.close(1008, "slow consumer"), name="WebsocketServer.disconnect")
+
+    async def broadcast(self, data: Any) -> None:
+        """Encode some ``data`` once per format in use and queue it for every subscribed client."""
+        encoded: Dict[str, bytes] = {}
+
+        # Frames are kept for replays even while nobody is connected.
+        if (
+            (ring := self.ring) is not None
+            and isinstance(data, dict)
+            and data.get("t") not in self.replay_exclude
+        ):
+            numbered = {**data, "q": ring.sequence + 1}
+
+            try:
+                payload = CODECS[self.replay_encoding].encode(numbered)
+            except Exception as err:  # pylint: disable=broad-except
+                self._client.logger.error("ws: not replayable, %s => %s", repr(data), err)
+            else:
+                ring.append(payload)
+                data = numbered
+                encoded[self.replay_encoding] = payload
+
+        if not self._peers:
+            return
+
+        # Encoding holds the GIL wherever it runs, handing it to a thread
+        # only adds a hop on top and a worker process would need the data
+        # pickled to be sent there in the first place.
+        key, body = (data.get("t"), data.get("d")) if isinstance(data, dict) else (None, None)
+        matched: Dict[Subscription, bool] = {}
+        # Codecs that failed to encode the data aren't tried again for every
+        # one of their clients, clients of other codecs still get it.
+        failed: Set[str] = set()
 
-    async def handler(self, socket, _):
+        for peer in list(self._peers.values()):
+            if (subscription := peer.subscription) is not None:
+                if (match := matched.get(subscription)) is None:
+                    match = matched[subscription] = subscription.matches(key, body)
+
+                if not match:
+                    peer.filtered += 1
+                    continue
+
+            if (name := peer.codec.name) in failed:
+                continue
+
+            if (payload := encoded.get(name)) is None:
+                try:
+                    payload = encoded[name] = peer.codec.encode(data)
+                except Exception as err:  # pylint: disable=broad-except
+                    failed.add(name)
+                    self._client.logger.error("%s: %s => %s", name, repr(data), err)
+                    continue
+
+            self._queue(peer, payload, key)
+
+    async def handler(self, socket, path):
         """Client handler."""
-        self._client.logger.info("ws connect!")
-        self._sockets.add(socket)
+        try:
+            codec, compress, batch = negotiate(path, self.default_encoding)
+            resume, last = _replay_request(path)
+            token = _control_request(path)
+        except ValueError as err:
+            self._client.logger.warning("ws: refusing client => %s", err)
+            await socket.close(1003, str(err)[:120])
+            return
+
+        self._client.logger.info(
+            "ws connect! (%s%s%s)", codec.name, f", {compress}" if compress else "", ", batched" if batch else ""
+        )
+        self._peers[socket] = peer = _Peer(
+            socket,
+            self.queue_size,
+            self.slow_consumer,
+            codec,
+            Compressor(compress) if compress is not None else None,
+            self.batch_window if batch else None,
+            self.batch_size if batch else 1,
+        )
+        peer.control = (
+            self.control_token is not None
+            and token is not None
+            and compare_digest(token.encode("utf-8"), self.control_token.encode("utf-8"))
+        )
+        writer = self._client.schedule_task(peer.write(), name="WebsocketServer.write", owner=self)
 
         try:
+            # Queued before any await, so no broadcast can overtake the replay.
+            if resume is not None or last is not None:
+                self.replay(peer, resume, last)
+
             async for message in socket:
                 self._client.logger.info("ws: recv => %s", repr(message))
+                await self.receive(socket, message)
         finally:
             self._client.logger.info("ws disconnect!")
-            self._sockets.remove(socket)
+            writer.cancel()
+            self._peers.pop(socket, None)
 
             with suppress(Exception):
                 await socket.close()
@@ -53,10 +474,141 @@ class WebsocketServer:
 
             del socket
 
+    def replay(self, peer: _Peer, resume: Optional[int] = None, last: Optional[int] = None) -> None:
+        """Queue the frames after ``resume``, or the latest ``last`` frames, for a client."""
+        ring = self.ring
+        frames = []
+        # The queue keeps room for the closing ``EP_REPLAY`` frame.
+        limit = max(self.queue_size - 1, 1)
+
+        if ring is not None and resume is not None:
+            frames = ring.since(resume, limit)
+        elif ring is not None:
+            frames = ring.last(min(last or 0, limit))
+
+        codec = CODECS[self.replay_encoding]
+
+        for _, payload in frames:
+            # Only clients of another encoding pay for encoding frames again.
+            peer.put(payload if peer.codec is codec else peer.codec.encode(codec.decode(payload)))
+
+        sequence = ring.sequence if ring is not None else 0
+        start = resume if resume is not None else sequence - (last or 0)
+        missed = (frames[0][0] if frames else sequence + 1) - max(start, 0) - 1
+
+        self.send(
+            peer.socket,
+            {
+                "op": 0,
+                "t": "EP_REPLAY",
+                "s": None,
+                "d": {"replayed": len(frames), "missed": max(missed, 0), "sequence": sequence},
+            },
+        )
+
+    def close(self) -> None:
+        """Release the replay ring."""
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    async def receive(self, socket, message: Any) -> None:
+        """Run the command in a frame received from ``socket``."""
+        try:
+            peer = self._peers[socket]
+            frame = json_loads(message)
+            op = frame["op"]
+            command = self.commands[op]
+            arguments = frame.get("d") or {}
+        except (ValueError, TypeError, KeyError):
+            return
+
+        if op in self.control_commands and not peer.control:
+            self._client.logger.warning("ws: refusing control command %s", repr(op))
+            reply = {"error": f"{op} needs a control token"}
+            return self.send(socket, {"op": 0, "t": f"EP_{op.upper()}", "s": None, "d": reply})
+
+        try:
+            reply = await command(self, peer, **arguments)
+        except Exception as err:  # pylint: disable=broad-except
+            self._client.logger.error("ws: %s => %s", repr(op), err)
+            reply = {"error": str(err)}
+
+        if reply is not None:
+            self.send(socket, {"op": 0, "t": f"EP_{op.upper()}", "s": None, "d": reply})
+
+    async def command_profile(self, _: _Peer, action: str = "toggle") -> Dict[str, Any]:
+        """Start or stop the sampling profiler of the client."""
+        profiler = self._client.profiler
+        path: Optional[Path] = None
+
+        if action == "toggle":
+            action = "stop" if profiler.running else "start"
+
+        if action == "start":
+            profiler.reset()
+            profiler.start()
+        elif action == "stop":
+            profiler.stop()
+            path = profiler.dump(self.profile_dir.joinpath(f"ep-profile-{int(time())}.folded"))
+        else:
+            raise ValueError(f"unknown profile action {action!r}")
+
+        return {
+            "running": action == "start",
+            "samples": sum(profiler.samples.values()),
+            "path": str(path) if path is not None else None,
+        }
+
+    async def command_clients(self, _: _Peer) -> List[Dict[str, Any]]:
+        """The queue depth and counters of every connected client."""
+        return self.stats()
+
+    async def command_subscribe(self, peer: _Peer, events: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Only send the broadcasts matching ``events`` to the client, every broadcast if ``None``."""
+        if events is None:
+            peer.subscription = None
+            return {"events": None}
+
+        subscription = Subscription(events)
+
+        if (known := self._subscriptions.get(subscription.key)) is not None:
+            subscription = known
+        else:
+            self._subscriptions[subscription.key] = subscription
+
+        peer.subscription = subscription
+        return {"events": sorted(subscription.events)}
+
+    commands = {"profile": command_profile, "clients": command_clients, "subscribe": command_subscribe}
+
+    def process_request(self, path: str, _):
+        """Answer prometheus scrapes, any other request is upgraded to a websocket."""
+        metrics = getattr(self._client, "metrics", None)
+
+        if not self.prometheus or metrics is None or path != self.metrics_path:
+            return None
+
+        headers = [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")]
+        return HTTPStatus.OK, headers, metrics.prometheus().encode("utf-8")
+
+    async def stream_metrics(self):
+        """Periodically broadcast a snapshot of the client metrics."""
+        while (metrics := getattr(self._client, "metrics", None)) is not None:
+            await sleep(self.metrics_interval)
+
+            if self.sockets:
+                await self.broadcast({"op": 0, "t": "EP_METRICS", "s": None, "d": metrics.snapshot()})
+
     async def serve(self):
         """Attempt to serve the websocket server."""
         if self._coro is not None:
             raise RuntimeError
 
-        self._coro = coro = websockets.serve(self.handler, self.host, self.port)
+        self._coro = coro = websockets.serve(
+            self.handler, self.host, self.port, process_request=self.process_request
+        )
         await coro
+
+        if self.metrics_interval:
+            self._client.schedule_task(self.stream_metrics(), name="WebsocketServer.stream_metrics")
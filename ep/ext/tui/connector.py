@@ -1,15 +1,17 @@
 from abc import ABC, abstractmethod
 from asyncio import AbstractEventLoop, Task, get_event_loop
 from dataclasses import dataclass, field
-from functools import partial, wraps
-from json import loads as json_loads
-from pickle import loads as pickle_loads
+from functools import wraps
+from json import dumps as json_dumps, loads as json_loads
 from traceback import format_exc
-from typing import TYPE_CHECKING, Any, Optional, Coroutine, Callable, Union
+from urllib.parse import urlencode
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Coroutine, Callable, Union
 
 import websockets
 from discord import Client, Message
 
+from ...core.codec import CODECS, Decompressor, query
+
 if TYPE_CHECKING:
     import ep
 
@@ -34,23 +36,102 @@ class BaseConnector(ABC):
         for widget in self.window.widgets:
             widget.update(data, self.config.get("ep", {}).get("tui", {}))
 
+    def subscription(self) -> Optional[Dict[str, Any]]:
+        """The events any widget displays, ``None`` if one of them displays every event."""
+        config = self.config.get("ep", {}).get("tui", {})
+        events: Dict[str, List[Any]] = {}
+
+        for widget in self.window.widgets:
+            if (wanted := widget.subscription(config)) is None:
+                return None
+
+            for type_, spec in wanted.items():
+                events.setdefault(type_, []).append(spec)
+
+        return events
+
+    def command(self, op: str, **arguments) -> None:
+        """Send a command to the bot, the reply arrives as an ``EP_<OP>`` payload."""
+        self.loop.create_task(self.send({"op": op, "d": arguments}))
+
+    async def send(self, data: Any) -> None:
+        """Send some data to the bot, not every connector is able to."""
+        self.update_widgets(f"{type(self).__name__} can not send commands.")
+
     @abstractmethod
     async def exhaust(self, *args, **kwargs):
         """Exhaust the connector."""
 
 
 class WebsocketConnector(BaseConnector):
-    """A websocket based connector."""
+    """A websocket based connector.
+
+    The wire format is negotiated when connecting, ``encoding``,
+    ``compress`` and ``batch`` of the ``[ep.tui]`` config pick it (batches
+    of msgpack compressed with zlib by default.) Once connected the events
+    the widgets display are subscribed to, so the server filters out the
+    rest.
+
+    The first connection asks for the latest ``replay`` frames (50 by
+    default) and a reconnection resumes after the last frame received.
+    Control commands, e.g. ``/profile``, are sent with the ``token`` of the
+    ``[ep.tui]`` config, or the ``control_token`` of ``[ep.websocket]``.
+    """
+
+    encoding: str = "msgpack"
+    compress: Optional[str] = "zlib"
+    batch: bool = True
+    replay: int = 50
+
+    # The sequence number of the last frame received, to resume from.
+    sequence: Optional[int] = None
 
     __socket = None
 
     async def exhaust(self, uri: str):  # type: ignore
-        async with websockets.connect(uri) as websocket:
+        config = self.config.get("ep", {}).get("tui", {})
+        encoding = config.get("encoding", self.encoding)
+        compress = config.get("compress", self.compress) or None
+        batch = config.get("batch", self.batch)
+
+        codec = CODECS[encoding]
+        decode = codec.unbatch if batch else codec.decode
+        decompress = Decompressor(compress).decompress if compress is not None else None
+
+        if self.sequence is not None:
+            extra = {"resume": self.sequence}
+        else:
+            extra = {"last": config.get("replay", self.replay)}
+
+        websocket_config = self.config.get("ep", {}).get("websocket", {})
+
+        if token := config.get("token") or websocket_config.get("control_token"):
+            extra["token"] = token
+
+        separator = "&" if "?" in uri else "?"
+        params = f"{query(encoding, compress, batch)}&{urlencode(extra)}"
+
+        async with websockets.connect(f"{uri}{separator}{params}") as websocket:
             self.__socket = websocket
 
+            if (events := self.subscription()) is not None:
+                await self.send({"op": "subscribe", "d": {"events": events}})
+
             async for message in websocket:
-                data = await self.loop.run_in_executor(None, partial(pickle_loads, message))
-                self.update_widgets(data)
+                if decompress is not None:
+                    message = decompress(message)
+
+                for data in decode(message) if batch else [decode(message)]:
+                    if isinstance(data, dict) and data.get("q") is not None:
+                        self.sequence = data["q"]
+
+                    self.update_widgets(data)
+
+    async def send(self, data: Any) -> None:
+        if self.__socket is None:
+            return self.update_widgets("Not connected.")
+
+        await self.__socket.send(json_dumps(data))
 
 
 @dataclass
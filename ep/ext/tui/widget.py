@@ -37,13 +37,21 @@ class AbstractWidget(ABC):
         return self._dirty
 
     @property
-    def terminal(self):
+    def window(self) -> "Window":
         base = self.root
 
         while isinstance(base, AbstractWidget):
             base = base.root
 
-        return base.terminal
+        return base
+
+    @property
+    def terminal(self):
+        return self.window.terminal
+
+    def subscription(self, config: Dict) -> Optional[Dict[str, Any]]:
+        """The events the widget displays and their filters, ``None`` for every event."""
+        return None
 
     @abstractmethod
     def update(self, payload: Any, config: Dict) -> None:
@@ -80,6 +88,27 @@ class Console(AbstractWidget):
 
         return base + f" => {data['content']!r}"
 
+    @staticmethod
+    def _format_profile(_, data):
+        if "error" in data:
+            return f"Profiler error: {data['error']}"
+
+        if data["running"]:
+            return "Profiler started"
+
+        return f"Profiler stopped, {data['samples']} samples written to {data['path']}"
+
+    @staticmethod
+    def _format_clients(_, data):
+        if "error" in data:
+            return f"Clients error: {data['error']}"
+
+        return [
+            f"{client['remote']}: {client['depth']} queued, {client['sent']} sent,"
+            f" {client['dropped']} dropped, {client['coalesced']} coalesced"
+            for client in data
+        ]
+
     formatters: Dict[str, Callable[[Terminal, Dict], str]] = field(default_factory=dict)
 
     def __post_init__(self):
@@ -87,11 +116,30 @@ class Console(AbstractWidget):
         self.msg_buf = deque(maxlen=512)
 
         self.formatters.update({
-            "MESSAGE_CREATE": self._format_message_create
+            "MESSAGE_CREATE": self._format_message_create,
+            "EP_PROFILE": self._format_profile,
+            "EP_CLIENTS": self._format_clients,
         })
 
     def _eval_inp(self, source: str) -> None:
-        pass
+        # Commands are forwarded to the bot, e.g. "/profile start"
+        if not source.startswith("/") or not (parts := source[1:].split()):
+            return
+
+        op, *args = parts
+
+        if op == "profile":
+            self.window.connector.command("profile", action=args[0] if args else "toggle")
+        elif op == "clients":
+            self.window.connector.command("clients")
+        else:
+            self.update(f"Unknown command: {op!r}", {})
+
+    def subscription(self, config: Dict) -> Optional[Dict[str, Any]]:
+        # Only the formatted events are displayed, filtered the same way
+        # the server is asked to filter them.
+        filters = config.get("filters", {})
+        return {type_: filters.get(type_) or True for type_ in self.formatters}
 
     def stdinp(self, char):
         if char in (b"\r", b"\n"):
@@ -109,7 +157,7 @@ class Console(AbstractWidget):
 
         if (
             isinstance(payload, dict)
-            and set(payload) == {"d", "t", "s", "op"}
+            and {"d", "t", "s", "op"} <= set(payload)
             and payload["op"] == 0
         ):
             data_, type_ = payload["d"], payload["t"]
@@ -77,6 +77,19 @@ async def http_probe(token: str, config: "ep.Config") -> bool:
         await http.close()
     return False
 
+
+def _shard_field(factory: Callable[..., logging.LogRecord]) -> Callable[..., logging.LogRecord]:
+    """Wrap a record factory to default the ``shard`` field of records that weren't logged by a shard."""
+
+    def make_record(*args, **kwargs) -> logging.LogRecord:
+        record = factory(*args, **kwargs)
+        record.shard = ""
+        return record
+
+    make_record.shard_field = True  # type: ignore
+    return make_record
+
+
 def get_logger(
     name: str, level: str = "INFO", fmt: Optional[str] = None
 ) -> logging.Logger:
@@ -84,7 +97,13 @@ def get_logger(
     logger.setLevel(getattr(logging, level))
 
     fmt = fmt or (
-        "[%(asctime)s] %(levelname)s - %(funcName)s:%(lineno)d - %(module)s - %(message)s"
+        "[%(asctime)s] %(levelname)s - %(funcName)s:%(lineno)d - %(module)s - %(shard)s%(message)s"
     )
     coloredlogs.install(fmt=fmt, level=level, logger=logger)
+
+    # The handler may end up on any ancestor, e.g. replacing one on the root
+    # logger, so every record gets the field rather than those of a handler.
+    if not getattr(factory := logging.getLogRecordFactory(), "shard_field", False):
+        logging.setLogRecordFactory(_shard_field(factory))
+
     return logger
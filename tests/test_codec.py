@@ -0,0 +1,89 @@
+import pytest
+
+from ep.core.codec import CODECS, COMPRESSIONS, Compressor, Decompressor, negotiate, pack, query, unpack
+
+FRAMES = [
+    {"op": 0, "t": "MESSAGE_CREATE", "s": 1, "d": {"content": "hello", "author": {"id": 1, "bot": False}}},
+    {"op": 0, "t": "TYPING_START", "s": 2, "d": {"channel_id": 2 ** 40, "timestamp": 1.5}},
+    {"op": 0, "t": "EP_METRICS", "s": None, "d": {"events": {}, "gauges": {"lag": -0.25}}},
+]
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        None,
+        True,
+        False,
+        0,
+        127,
+        -32,
+        -33,
+        255,
+        2 ** 16,
+        2 ** 32,
+        2 ** 64 - 1,
+        -(2 ** 63),
+        1.5,
+        "",
+        "é" * 40,
+        "x" * 70_000,
+        b"\x00\xff",
+        [],
+        list(range(20)),
+        {"a": {"b": [1, None]}},
+        {str(key): key for key in range(20)},
+    ],
+)
+def test_pack_round_trip(obj):
+    assert unpack(pack(obj)) == obj
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_codec_round_trip(name):
+    codec = CODECS[name]
+
+    for frame in FRAMES:
+        assert codec.decode(codec.encode(frame)) == frame
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_batch_round_trip(name):
+    codec = CODECS[name]
+
+    assert codec.unbatch(codec.batch([codec.encode(frame) for frame in FRAMES])) == FRAMES
+    assert codec.unbatch(codec.batch([])) == []
+
+
+@pytest.mark.parametrize("name", CODECS)
+@pytest.mark.parametrize("method", COMPRESSIONS)
+def test_compressed_stream_round_trip(name, method):
+    codec = CODECS[name]
+    compressor, decompressor = Compressor(method), Decompressor(method)
+
+    for frame in FRAMES * 3:
+        assert codec.decode(decompressor.decompress(compressor.compress(codec.encode(frame)))) == frame
+
+
+def test_unsupported_compression():
+    with pytest.raises(ValueError):
+        Compressor("lz4")
+
+    with pytest.raises(ValueError):
+        Decompressor("lz4")
+
+
+def test_negotiate_round_trips_query():
+    codec, compress, batch = negotiate("/?" + query("msgpack", "zlib", batch=True))
+    assert (codec.name, compress, batch) == ("msgpack", "zlib", True)
+
+    codec, compress, batch = negotiate("/", default="json")
+    assert (codec.name, compress, batch) == ("json", None, False)
+
+
+@pytest.mark.parametrize(
+    "path", ["/?encoding=yaml", "/?encoding=json&compress=lz4", "/?encoding=json&batch=maybe"]
+)
+def test_negotiate_rejects_unknown_options(path):
+    with pytest.raises(ValueError):
+        negotiate(path)
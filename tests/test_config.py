@@ -0,0 +1,54 @@
+from types import MappingProxyType
+
+import pytest
+
+from ep.config import Config, ConfigValue
+
+
+@pytest.fixture
+def config(tmp_path):
+    path = tmp_path / "ep.toml"
+    path.write_text('[ep.cpu]\nmax_workers = 2\n\n[a]\nb = [1, 2]\n\n[a.d]\ne = 1\n')
+    return Config.from_file(path)
+
+
+def test_snapshot_is_flat_and_immutable(config):
+    snapshot = config.snapshot
+
+    assert snapshot["ep", "cpu", "max_workers"] == 2
+    assert snapshot["a", "d"] == {"e": 1}
+    assert isinstance(snapshot["a", "d"], MappingProxyType)
+
+    config["a"]["d"]["e"] = 9
+    assert snapshot["a", "d", "e"] == 1
+    assert config.snapshot is snapshot
+
+
+def test_replace_bumps_the_version_and_keeps_overrides(config):
+    snapshot = config.snapshot
+    config.override("ep", "eager_dispatch", value=True)
+    assert config.snapshot is not snapshot
+
+    assert config.replace({"ep": {"cpu": {"max_workers": 4}}}) == 1
+    assert config.version == config.snapshot.version == 1
+    assert config.snapshot["ep", "cpu", "max_workers"] == 4
+    assert config["ep"]["eager_dispatch"] is True
+
+
+def test_reload_reads_the_file_again(config):
+    config.fp.write_text("[ep.cpu]\nmax_workers = 8\n")
+
+    assert config.reload() == 1
+    assert ConfigValue("ep", "cpu", "max_workers").resolve(config) == 8
+    assert ConfigValue("a", "d", "e", default=0).resolve(config) == 0
+
+
+def test_resolve_walks_the_live_config(config):
+    config.snapshot
+    config["a"]["d"]["e"] = 9
+
+    assert ConfigValue("a", "d", "e").resolve(config) == 9
+    assert ConfigValue("a", "b", 1).resolve(config) == 2
+    assert ConfigValue("a", "d").resolve(config) is config["a"]["d"]
+    assert ConfigValue("a", "x", default=5).resolve(config) == 5
+    assert ConfigValue("a", "d", "e").resolve({"a": {"d": {"e": 3}}}) == 3
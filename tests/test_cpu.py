@@ -0,0 +1,66 @@
+import asyncio
+import importlib
+import sys
+
+import pytest
+
+from ep.core.cpu import CpuBoundFunction, CpuPool, ResultTooLarge
+from ep.core.manifest import import_cog_module
+
+
+def run(pool, func, *args):
+    async def main():
+        try:
+            return await pool.run(func, *args)
+        finally:
+            pool.shutdown()
+
+    return asyncio.run(main())
+
+
+def write(path, value):
+    path.write_text(f"from ep.core.cpu import CpuBoundFunction\n\n\n@CpuBoundFunction\ndef answer():\n    return {value!r}\n")
+
+
+@pytest.fixture
+def module(tmp_path):
+    write(tmp_path / "ep_cpu_cog.py", 1)
+    yield tmp_path
+    sys.modules.pop("ep_cpu_cog", None)
+
+
+def test_function_runs_in_worker(module):
+    func = import_cog_module(module, "ep_cpu_cog").answer
+
+    assert isinstance(func, CpuBoundFunction)
+    assert run(CpuPool(1), func) == 1
+
+
+def test_recycle_runs_reloaded_code(module):
+    pool = CpuPool(1)
+
+    async def main():
+        try:
+            first = await pool.run(import_cog_module(module, "ep_cpu_cog").answer)
+
+            write(module / "ep_cpu_cog.py", 2)
+            sys.modules.pop("ep_cpu_cog")
+            importlib.invalidate_caches()
+            func = import_cog_module(module, "ep_cpu_cog").answer
+
+            stale = await pool.run(func)
+            assert pool.recycle()
+            return first, stale, await pool.run(func)
+        finally:
+            pool.shutdown()
+
+    assert asyncio.run(main()) == (1, 1, 2)
+
+
+def test_recycle_unstarted_pool():
+    assert not CpuPool(1).recycle()
+
+
+def test_result_too_large():
+    with pytest.raises(ResultTooLarge):
+        run(CpuPool(1, max_result_size=16), bytes, 64)
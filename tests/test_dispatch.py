@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+from ep.core.dispatch import DispatchTable, _PrefixTrie
+
+
+def message(content="", channel_id=0, bot=False):
+    return SimpleNamespace(
+        content=content, channel=SimpleNamespace(id=channel_id), author=SimpleNamespace(bot=bot)
+    )
+
+
+async def on_any(*_):
+    pass
+
+
+async def on_channel(*_):
+    pass
+
+
+async def on_other_channel(*_):
+    pass
+
+
+async def on_human(*_):
+    pass
+
+
+async def on_ping(*_):
+    pass
+
+
+async def on_prefix(*_):
+    pass
+
+
+def test_trie_collects_every_prefix_along_the_content():
+    trie = _PrefixTrie()
+    trie.add("!", on_prefix)
+    trie.add("!ping", on_ping)
+
+    assert list(trie.lookup("!ping me")) == [on_prefix, on_ping]
+    assert list(trie.lookup("!pong")) == [on_prefix]
+    assert not trie.lookup("ping")
+
+
+def test_trie_remove_prunes_empty_nodes():
+    trie = _PrefixTrie()
+    trie.add("!p", on_prefix)
+    trie.add("!ping", on_ping)
+
+    trie.remove("!ping", on_ping)
+    assert list(trie.lookup("!ping")) == [on_prefix]
+    assert not trie.root[0]["!"][0]["p"][0]
+
+    trie.remove("!p", on_prefix)
+    assert not trie
+
+
+def test_unindexed_listeners_are_always_candidates():
+    table = DispatchTable()
+    table.add("on_message", on_any)
+
+    assert table.lookup("on_message", (message(),)) == [on_any]
+    assert table.lookup("on_typing", (message(),)) == []
+
+
+def test_equality_index_narrows_candidates():
+    table = DispatchTable()
+    table.add("on_message", on_any)
+    table.add("on_message", on_channel, key=((0, ("channel", "id")), 1))
+    table.add("on_message", on_other_channel, key=((0, ("channel", "id")), 2))
+    table.add("on_message", on_human, key=((0, ("author", "bot")), False))
+
+    assert table.lookup("on_message", (message(channel_id=1),)) == [on_any, on_channel, on_human]
+    assert table.lookup("on_message", (message(channel_id=2, bot=True),)) == [on_any, on_other_channel]
+    assert table.lookup("on_message", (message(channel_id=3, bot=True),)) == [on_any]
+
+
+def test_index_skips_missing_attributes_and_arguments():
+    table = DispatchTable()
+    table.add("on_message", on_channel, key=((0, ("channel", "id")), 1))
+    table.add("on_message", on_human, key=((1, ()), "x"))
+
+    assert table.lookup("on_message", (SimpleNamespace(),)) == []
+    assert table.lookup("on_message", (message(channel_id=1),)) == [on_channel]
+
+
+def test_prefixes_take_precedence_over_keys():
+    table = DispatchTable()
+    table.add("on_message", on_ping, key=((0, ("channel", "id")), 1), prefixes=(0, ("!ping",)))
+    table.add("on_message", on_prefix, prefixes=(0, ("!", "?")))
+
+    assert table.lookup("on_message", (message("!ping", channel_id=2),)) == [on_prefix, on_ping]
+    assert table.lookup("on_message", (message("?", channel_id=1),)) == [on_prefix]
+    assert table.lookup("on_message", (message("ping", channel_id=1),)) == []
+
+
+def test_add_is_idempotent_and_remove_cleans_up():
+    table = DispatchTable()
+    table.add("on_message", on_channel, key=((0, ("channel", "id")), 1))
+    table.add("on_message", on_channel, key=((0, ("channel", "id")), 1))
+    table.add("on_message", on_ping, prefixes=(0, ("!ping",)))
+
+    assert len(table) == 2
+    assert table.remove("on_message", on_channel)
+    assert not table.remove("on_message", on_channel)
+    assert table.remove("on_message", on_ping)
+    assert not table.remove("on_typing", on_ping)
+
+    assert "on_message" not in table
+    assert len(table) == 0
+
+
+def test_remove_owner_removes_only_its_listeners():
+    cog, other = object(), object()
+    table = DispatchTable()
+    table.add("on_message", on_channel, key=((0, ("channel", "id")), 1), owner=cog)
+    table.add("on_message", on_ping, prefixes=(0, ("!ping",)), owner=cog)
+    table.add("on_typing", on_any, owner=cog)
+    table.add("on_message", on_any, owner=other)
+
+    assert table.remove_owner(cog) == 3
+    assert table.remove_owner(cog) == 0
+    assert table.listeners("on_message") == [on_any]
+    assert "on_typing" not in table
+
+    table.remove("on_message", on_any)
+    assert table.remove_owner(other) == 0
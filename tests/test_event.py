@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import pytest
+
+from ep.config import ConfigValue
+from ep.core.event import Event
+
+CONFIG = {"ids": {"channel": 1}}
+
+
+def message(channel_id=1, bot=False):
+    return SimpleNamespace(channel=SimpleNamespace(id=channel_id), author=SimpleNamespace(bot=bot))
+
+
+async def on_message(self, message):
+    pass
+
+
+def handler(**attrs):
+    return Event("message", attrs=attrs)(on_message)
+
+
+def test_attrs_split_on_single_underscores():
+    event = Event("message", attrs={"message_channel_id": 1, "message_author__id": 2})
+
+    assert event.event_type == "on_message"
+    assert event.attrs == {("message", "channel", "id"): 1, ("message", "author_id"): 2}
+
+
+def test_unknown_argument_is_rejected():
+    with pytest.raises(NameError):
+        handler(msg_channel_id=1)
+
+
+def test_compiled_predicate_resolves_config_values():
+    predicate = handler(message_channel_id=ConfigValue("ids", "channel")).compile_predicate(CONFIG)
+
+    assert predicate((message(1),))
+    assert not predicate((message(2),))
+    assert not predicate((SimpleNamespace(),))
+    assert not predicate(())
+
+
+def test_compiled_predicate_checks_every_attr():
+    predicate = handler(
+        message_channel_id=ConfigValue("ids", "channel"), message_author_bot=False
+    ).compile_predicate(CONFIG)
+
+    assert predicate((message(1),))
+    assert not predicate((message(1, bot=True),))
+    assert not predicate((message(2),))
+
+
+def test_no_attrs_always_pass():
+    assert handler().compile_predicate(CONFIG)(())
+
+
+def test_index_key_resolves_config_values():
+    key = handler(message_channel_id=ConfigValue("ids", "channel")).index_key(CONFIG)
+
+    assert key == ((0, ("channel", "id")), 1)
+    assert handler(message_channel_id=ConfigValue("ids", "missing", default=3)).index_key({}) == (
+        (0, ("channel", "id")),
+        3,
+    )
+
+
+def test_unhashable_values_are_not_indexed():
+    assert handler(message_channel_id=[1]).index_key(CONFIG) is None
+    assert handler(message_channel_id=[1], message_author_bot=False).index_key(CONFIG) == (
+        (0, ("author", "bot")),
+        False,
+    )
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from ep.core.limits import DROP_OLDEST, REJECT, HandlerLimit
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def hold(event, result=None):
+    await event.wait()
+    return result
+
+
+def test_queue_runs_in_order_within_the_limit():
+    limit = HandlerLimit(max_concurrency=2)
+    running, peak = [], []
+
+    async def handler(index):
+        running.append(index)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(index)
+        return index
+
+    async def main():
+        return await asyncio.gather(*(limit.run(handler(index)) for index in range(6)))
+
+    assert run(main()) == list(range(6))
+    assert max(peak) == 2
+    assert limit.in_flight == limit.queued == 0
+
+
+def test_reject_drops_new_invocations():
+    limit = HandlerLimit(max_concurrency=1, overflow=REJECT)
+
+    async def main():
+        event = asyncio.Event()
+        first = asyncio.ensure_future(limit.run(hold(event, "first")))
+        await asyncio.sleep(0)
+        second = await limit.run(hold(event, "second"))
+        event.set()
+        return await first, second
+
+    assert run(main()) == ("first", None)
+    assert limit.rejected == 1
+
+
+def test_drop_oldest_cancels_the_oldest():
+    limit = HandlerLimit(max_concurrency=1, overflow=DROP_OLDEST)
+
+    async def main():
+        event = asyncio.Event()
+        first = asyncio.ensure_future(limit.run(hold(event, "first")))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(limit.run(hold(event, "second")))
+        await asyncio.sleep(0)
+        event.set()
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = run(main())
+
+    assert isinstance(first, asyncio.CancelledError)
+    assert second == "second"
+    assert limit.dropped == 1
+    assert limit.in_flight == 0
+
+
+def test_cancelled_waiter_keeps_the_queue_moving():
+    limit = HandlerLimit(max_concurrency=1)
+
+    async def main():
+        event = asyncio.Event()
+        first = asyncio.ensure_future(limit.run(hold(event, 1)))
+        waiting = asyncio.ensure_future(limit.run(hold(event, 2)))
+        last = asyncio.ensure_future(limit.run(hold(event, 3)))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        event.set()
+        return await first, await last
+
+    assert run(main()) == (1, 3)
+    assert limit.queued == 0
+
+
+def test_deadline_cancels_and_counts():
+    limit = HandlerLimit(deadline=0.01)
+
+    async def main():
+        return await limit.run(asyncio.sleep(1, "late"))
+
+    assert run(main()) is None
+    assert limit.timeouts == 1
+
+
+def test_handler_timeout_is_not_a_missed_deadline():
+    limit = HandlerLimit(deadline=1)
+
+    async def handler():
+        raise asyncio.TimeoutError
+
+    with pytest.raises(asyncio.TimeoutError):
+        run(limit.run(handler()))
+
+    assert limit.timeouts == 0
+    assert run(limit.run(asyncio.sleep(0, "on time"))) == "on time"
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        HandlerLimit(overflow="spill")
+
+    with pytest.raises(ValueError):
+        HandlerLimit(max_concurrency=0)
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import sys
+
+import discord
+import pytest
+from toml import loads as toml_loads
+
+from ep.config import RAW_DEFAULT, Config
+from ep.core.client import Client
+from ep.core.manifest import CogManifest
+
+PING = '''from ep import Cog
+
+__all__ = ("Ping",)
+
+
+@Cog.export
+class Ping(Cog):
+    @Cog.regex(r"!ping")
+    async def ping(self, message):
+        pass
+'''
+
+
+@pytest.fixture
+def cogs(tmp_path):
+    directory = tmp_path / "cogs"
+    directory.mkdir()
+    directory.joinpath("ep_lazy_ping.py").write_text(PING)
+    yield directory
+    sys.modules.pop("ep_lazy_ping", None)
+
+
+def client(cogs):
+    table = toml_loads(RAW_DEFAULT)
+    table["ep"].pop("cog_path", None)
+    table["ep"].pop("record", None)
+
+    instance = Client(config=Config(table, fp=cogs.parent / "ep.toml"), disable=True, intents=discord.Intents.none())
+    # Newer discord.py only binds the loop on login.
+    instance.loop = asyncio.get_running_loop()
+    instance.load_cogs(cogs, lazy=True)
+    return instance
+
+
+def run(func, *args):
+    async def main():
+        return func(*args)
+
+    return asyncio.run(main())
+
+
+def test_manifest_describes_imported_modules(cogs):
+    loaded = run(client, cogs)
+    data = json.loads(cogs.joinpath(CogManifest.filename).read_text())
+    (entry,) = data["modules"].values()
+
+    assert "Ping" in loaded.cogs
+    assert not loaded.lazy_modules
+    assert entry["lazy"]
+    assert entry["cogs"][0]["events"] == {"on_message": [0, ["!ping"]]}
+    assert not cogs.joinpath(f"{CogManifest.filename}.partial").exists()
+
+
+def test_manifest_ignores_stale_entries(cogs):
+    run(client, cogs)
+    path = cogs / "ep_lazy_ping.py"
+    manifest = CogManifest(cogs / CogManifest.filename)
+
+    assert manifest.get(path) is not None
+
+    path.write_text(PING + "\n")
+    assert manifest.get(path) is None
+
+
+def test_lazy_module_loads_on_first_event(cogs):
+    run(client, cogs)
+    sys.modules.pop("ep_lazy_ping")
+
+    async def main():
+        lazy = client(cogs)
+        module = lazy.lazy_modules["ep_lazy_ping"]
+        triggers = lazy.extra_events.listeners("on_message")
+
+        assert "Ping" not in lazy.cogs
+        assert "ep_lazy_ping" not in sys.modules
+        assert len(triggers) == 1
+
+        (cog,) = module.load()
+
+        assert lazy.cogs["Ping"] is cog
+        assert triggers[0] not in lazy.extra_events.listeners("on_message")
+        assert module.load() == (cog,)
+
+    asyncio.run(main())
+
+
+def test_lazy_module_that_fails_to_import_keeps_its_triggers(cogs, tmp_path):
+    run(client, cogs)
+    sys.modules.pop("ep_lazy_ping")
+    broken = tmp_path / "broken"
+    broken.mkdir()
+    broken.joinpath("ep_lazy_ping.py").write_text("raise RuntimeError('broken')\n")
+
+    async def main():
+        lazy = client(cogs)
+        module = lazy.lazy_modules["ep_lazy_ping"]
+        module.directory = broken
+        triggers = lazy.extra_events.listeners("on_message")
+
+        with pytest.raises(RuntimeError):
+            module.load()
+
+        assert module.cogs is None
+        assert lazy.extra_events.listeners("on_message") == triggers
+
+        module.directory = cogs
+        assert [cog.__cog_name__ for cog in module.load()] == ["Ping"]
+        assert triggers[0] not in lazy.extra_events.listeners("on_message")
+
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from time import perf_counter
+from types import SimpleNamespace
+
+from ep.core.profiler import IDLE, OFF_CPU, ON_CPU, SamplingProfiler
+
+
+def spin(seconds):
+    until = perf_counter() + seconds
+    while perf_counter() < until:
+        pass
+
+
+def profile(main):
+    async def run():
+        client = SimpleNamespace(
+            loop=asyncio.get_running_loop(), cogs={}, logger=logging.getLogger("ep.tests")
+        )
+        profiler = SamplingProfiler(client, interval=0.002, task_interval=0.02)
+        profiler.start()
+
+        try:
+            await main()
+        finally:
+            profiler.stop()
+
+        return profiler.samples
+
+    return asyncio.run(run())
+
+
+def stacks(samples, root):
+    return {stack: count for stack, count in samples.items() if stack.split(";")[0] == root}
+
+
+def test_waiting_loop_is_idle():
+    samples = profile(lambda: asyncio.sleep(0.1))
+
+    assert samples[IDLE] > samples.get(ON_CPU, 0)
+    assert not any(name.startswith(ON_CPU) and "select" in name for name in samples)
+
+
+def test_busy_task_is_on_cpu():
+    async def busy():
+        await asyncio.sleep(0)
+        spin(0.1)
+
+    async def main():
+        await asyncio.create_task(busy(), name="busy")
+
+    on_cpu = stacks(profile(main), ON_CPU)
+
+    assert sum(count for stack, count in on_cpu.items() if stack.startswith(f"{ON_CPU};busy;")) > 10
+
+
+def test_pending_tasks_are_off_cpu_and_weighted():
+    async def main():
+        sleeper = asyncio.create_task(asyncio.sleep(1), name="sleeper")
+        await asyncio.sleep(0.15)
+        sleeper.cancel()
+
+    off_cpu = stacks(profile(main), OFF_CPU)
+    counts = [count for stack, count in off_cpu.items() if stack.startswith(f"{OFF_CPU};sleeper")]
+
+    assert counts and all(count % 10 == 0 for count in counts)
@@ -0,0 +1,125 @@
+import asyncio
+import re
+
+import pytest
+
+from ep import Cog
+from ep.config import Config
+from ep.core.regex import RegexExecutor, is_redos_prone, literal_prefixes
+
+
+class Owner:
+    def __init__(self, config):
+        self.config = config
+        self.client = self
+
+
+async def callback(self, message):
+    pass
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        (r"!ping", ("!ping",)),
+        (r"^!ping\s+(\d+)", ("!ping",)),
+        (r"!(t|tag) (?P<tag_id>\d+)", ("!t ", "!tag ")),
+        (r"!(?:ab|c)(?:d|ef)", ("!abd", "!abef", "!cd", "!cef")),
+        (r"!(?:a|b)", ("!",)),
+        (r"(!p|\?p)ing", ("!ping", "?ping")),
+        (r"\d+", None),
+        (r"(a|)b", ("ab", "b")),
+        (r"(a|)\d", None),
+        (r"(?i)!ping", None),
+    ],
+)
+def test_literal_prefixes(pattern, expected):
+    assert literal_prefixes(re.compile(pattern)) == expected
+
+
+def test_prefix_combinations_are_bounded():
+    prefixes = literal_prefixes(re.compile("(ab|cd)(ef|gh)(ij|kl)(mn|op)(qr|st)"))
+
+    assert len(prefixes) == 16
+    assert prefixes[0] == "abefijmn"
+
+
+def test_regex_handler_prefixes():
+    handler = Cog.regex(r"!ping (?P<count>\d+)")(callback)
+
+    assert handler.literal_prefixes(None) == (0, ("!ping ",))
+    assert Cog.regex(r"!ping", filter_=True)(callback).literal_prefixes(None) is None
+
+
+def test_formatted_regex_handler_prefixes_follow_the_config(tmp_path):
+    def formatter(client):
+        return {"prefix": re.escape(client.config["bot"]["prefix"])}
+
+    handler = Cog.formatted_regex(formatter, r"${prefix}ping")(callback)
+    config = Config({"bot": {"prefix": "!"}}, fp=tmp_path / "ep.toml")
+    owner = Owner(config)
+
+    assert handler.literal_prefixes(config) is None
+    assert handler.literal_prefixes(config, owner) == (0, ("!ping",))
+
+    config.replace({"bot": {"prefix": "?"}})
+    assert handler.literal_prefixes(config, owner) == (0, ("?ping",))
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        (r"(a+)+$", True),
+        (r"(\w+\s?)*$", True),
+        (r"(?:a|b+)*c", True),
+        (r"a+b+", False),
+        (r"(ab){1,3}", False),
+    ],
+)
+def test_is_redos_prone(pattern, expected):
+    assert is_redos_prone(re.compile(pattern)) is expected
+
+
+RUNAWAY = re.compile(r"(a+)+$")
+
+
+@pytest.fixture
+def executor():
+    executor = RegexExecutor(max_workers=2, timeout=0.5)
+    yield executor
+    executor.shutdown()
+
+
+def test_executor_matches(executor):
+    async def main():
+        match = await executor.fullmatch(re.compile(r"!(?P<n>\d+)"), "!12")
+        return match, await executor.fullmatch(RUNAWAY, "ab")
+
+    match, missing = asyncio.run(main())
+
+    assert match["n"] == "12"
+    assert missing is None
+    assert executor.pending == 0
+
+
+def test_executor_overrun_spares_other_matches(executor):
+    async def main():
+        return await asyncio.gather(
+            executor.fullmatch(RUNAWAY, "a" * 40 + "b", timeout=0.2),
+            *(executor.fullmatch(re.compile(r"a+"), "aaa") for _ in range(6)),
+        )
+
+    overrun, *matches = asyncio.run(main())
+
+    assert overrun is None
+    assert all(match is not None for match in matches)
+    assert executor.overruns == {RUNAWAY.pattern: 1}
+
+
+def test_executor_restarts_after_shutdown(executor):
+    async def main():
+        await executor.fullmatch(re.compile("a"), "a")
+        executor.shutdown()
+        return await executor.fullmatch(re.compile("a"), "a")
+
+    assert asyncio.run(main()) is not None
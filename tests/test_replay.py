@@ -0,0 +1,103 @@
+import asyncio
+import gzip
+from types import SimpleNamespace
+
+import pytest
+
+from ep.core.replay import GatewayRecorder, GatewayReplayer, read_log
+
+
+def payload(sequence):
+    return {"op": 0, "t": "MESSAGE_CREATE", "s": sequence, "d": {"content": str(sequence)}}
+
+
+def sequences(path):
+    return [record["s"] for _, record in read_log(path)]
+
+
+def test_round_trip_across_members(tmp_path):
+    path = tmp_path / "gateway.log"
+
+    with GatewayRecorder(path) as recorder:
+        recorder.record(payload(1), timestamp=1.0)
+
+    with GatewayRecorder(path) as recorder:
+        recorder.record(payload(2), timestamp=2.0)
+
+    assert list(read_log(path)) == [(1.0, payload(1)), (2.0, payload(2))]
+
+
+def test_not_a_log(tmp_path):
+    path = tmp_path / "other.gz"
+
+    with gzip.open(path, "wb") as file:
+        file.write(b"hello world")
+
+    with pytest.raises(ValueError):
+        list(read_log(path))
+
+
+def test_crash_keeps_the_flushed_records(tmp_path):
+    path = tmp_path / "gateway.log"
+    recorder = GatewayRecorder(path)
+    recorder.flush_every = 2
+
+    for sequence in range(5):
+        recorder.record(payload(sequence))
+
+    # Nothing is closed, as if the process died here.
+    crashed = path.read_bytes()
+    recorder.close()
+    path.write_bytes(crashed)
+
+    assert sequences(path) == [0, 1, 2, 3]
+
+
+def test_damaged_member_followed_by_another(tmp_path, caplog):
+    path = tmp_path / "gateway.log"
+    recorder = GatewayRecorder(path)
+    recorder.flush_every = 1
+
+    for sequence in range(3):
+        recorder.record(payload(sequence))
+
+    crashed = path.read_bytes()
+    recorder.close()
+    path.write_bytes(crashed[:-3])
+
+    with GatewayRecorder(path) as recorder:
+        recorder.record(payload(3))
+
+    assert sequences(path)[:2] == [0, 1]
+    assert "damaged" in caplog.text
+
+
+def test_replayer_feeds_the_client(tmp_path):
+    path = tmp_path / "gateway.log"
+
+    with GatewayRecorder(path) as recorder:
+        for sequence in range(3):
+            recorder.record(payload(sequence), timestamp=sequence / 1000)
+
+        recorder.record({"op": 0, "t": "UNKNOWN", "s": 3, "d": {}})
+
+    dispatched, parsed = [], []
+
+    def parse(data):
+        if data["content"] == "1":
+            raise KeyError("guild")
+
+        parsed.append(data["content"])
+
+    async def main():
+        client = SimpleNamespace(
+            loop=asyncio.get_running_loop(),
+            dispatch=lambda event, data: dispatched.append(data["t"]),
+            _connection=SimpleNamespace(parsers={"MESSAGE_CREATE": parse}),
+        )
+        replayer = GatewayReplayer(client, path, speed=None)
+        return await replayer.replay(), replayer.failed
+
+    assert asyncio.run(main()) == (4, 1)
+    assert len(dispatched) == 4
+    assert parsed == ["0", "2"]
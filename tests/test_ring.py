@@ -0,0 +1,75 @@
+import pytest
+
+from ep.core.ring import FrameRing
+
+
+def frames(ring, count, size=10):
+    return [ring.append(bytes([sequence % 256]) * size) for sequence in range(count)]
+
+
+def test_size_evicts_the_oldest_frames():
+    ring = FrameRing(4)
+    assert frames(ring, 6) == [1, 2, 3, 4, 5, 6]
+
+    assert len(ring) == 4
+    assert ring.first == 3
+    assert [sequence for sequence, _ in ring.last(10)] == [3, 4, 5, 6]
+
+
+def test_wraparound_keeps_payloads_intact():
+    ring = FrameRing(100, capacity=35)
+    frames(ring, 7)
+
+    # Only three 10 byte frames fit, the fourth wrapped to the start.
+    assert ring.first == 5
+    assert ring.last(3) == [(5, b"\x04" * 10), (6, b"\x05" * 10), (7, b"\x06" * 10)]
+
+
+def test_wraparound_with_uneven_frames():
+    ring = FrameRing(100, capacity=16)
+
+    for sequence, size in enumerate((5, 7, 3, 9, 0, 6, 16, 2), 1):
+        assert ring.append(bytes([sequence]) * size) == sequence
+
+        for stored, payload in ring.last(len(ring)):
+            assert payload == bytes([stored]) * len(payload)
+
+    # The frame filling the whole buffer was overwritten by the last one.
+    assert ring.last(10) == [(8, b"\x08" * 2)]
+
+
+def test_oversized_frames_are_numbered_but_not_stored():
+    ring = FrameRing(capacity=8)
+    ring.append(b"a")
+
+    assert ring.append(b"b" * 9) == 2
+    assert ring.since(0) == [(1, b"a")]
+    assert ring.append(b"c") == 3
+    assert ring.since(1) == [(3, b"c")]
+
+
+def test_since_resumes_after_a_sequence():
+    ring = FrameRing(8)
+    frames(ring, 5, size=1)
+
+    assert [sequence for sequence, _ in ring.since(3)] == [4, 5]
+    assert [sequence for sequence, _ in ring.since(0, limit=2)] == [4, 5]
+    assert ring.since(5) == []
+    assert ring.last(0) == []
+
+
+def test_memory_mapped_ring(tmp_path):
+    ring = FrameRing(4, capacity=64, path=tmp_path / "replay")
+    frames(ring, 3)
+
+    assert ring.since(1) == [(2, b"\x01" * 10), (3, b"\x02" * 10)]
+    ring.close()
+    assert len(ring) == 0
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        FrameRing(0)
+
+    with pytest.raises(ValueError):
+        FrameRing(capacity=0)
@@ -0,0 +1,90 @@
+import json
+import logging
+import urllib.request
+
+import pytest
+
+from ep.config import Config
+from ep.core.metrics import Metrics
+from ep.core.shard import ShardSupervisor, _ShardFilter, _shard_config
+from ep.utils import get_logger
+
+
+def snapshot(events, latency):
+    metrics = Metrics()
+    metrics.events["MESSAGE_CREATE"] += events
+    metrics.handler("Cog.on_message").latency.observe(latency)
+    return metrics.snapshot()
+
+
+@pytest.fixture
+def config(tmp_path):
+    return Config(
+        {"ep": {"record": "gateway.log", "websocket": {"replay_file": "replay.ring"}, "metrics": {}}},
+        fp=tmp_path / "ep.toml",
+    )
+
+
+def test_shards_get_their_own_files(config):
+    _shard_config(config, 2)
+
+    assert config["ep"]["record"] == "gateway.log.2"
+    assert config["ep"]["websocket"]["replay_file"] == "replay.ring.2"
+
+    # Overrides survive a reload.
+    config.replace({"ep": {}})
+    assert config["ep"]["websocket"]["replay_file"] == "replay.ring.2"
+
+
+def test_shard_filter_tags_records_without_touching_the_message():
+    record = logging.makeLogRecord({"msg": "hello %s", "args": ("world",)})
+    shard_filter = _ShardFilter(3)
+
+    assert shard_filter.filter(record) and shard_filter.filter(record)
+    assert record.getMessage() == "hello world"
+    assert (record.shard_id, record.shard) == (3, "[shard 3] ")
+
+
+def test_merged_metrics_render_as_prometheus():
+    merged = Metrics.merge([snapshot(2, 0.002), snapshot(3, 3.0)])
+    text = Metrics.render(merged)
+
+    assert 'ep_events_total{event="MESSAGE_CREATE"} 5' in text
+    assert 'ep_handler_latency_seconds_bucket{handler="Cog.on_message",le="0.0025"} 1' in text
+    assert 'ep_handler_latency_seconds_count{handler="Cog.on_message"} 2' in text
+
+
+def test_render_matches_the_live_metrics():
+    metrics = Metrics()
+    metrics.handler("Cog.on_message").latency.observe(0.01)
+    metrics.gauge("lag", lambda: 0.5)
+
+    assert Metrics.render(metrics.snapshot()) == metrics.prometheus()
+
+
+def test_supervisor_serves_merged_metrics(config):
+    config["ep"]["metrics"].update(prometheus=True, supervisor_port=0)
+    supervisor = ShardSupervisor(config, 2)
+    supervisor.snapshots = {0: snapshot(2, 0.1), 1: snapshot(3, 0.1)}
+    server = supervisor._serve_metrics()
+
+    try:
+        url = f"http://localhost:{server.server_address[1]}"
+
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert 'ep_events_total{event="MESSAGE_CREATE"} 5' in response.read().decode()
+
+        with urllib.request.urlopen(f"{url}/metrics.json") as response:
+            assert json.loads(response.read())["events"] == {"MESSAGE_CREATE": 5}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_records_default_to_no_shard():
+    get_logger("ep.tests")
+
+    record = logging.getLogger("elsewhere").makeRecord("elsewhere", logging.INFO, "", 0, "", (), None)
+
+    assert record.shard == ""
+    assert logging.makeLogRecord({"shard": "[shard 1] "}).shard == "[shard 1] "
@@ -0,0 +1,79 @@
+import pytest
+
+from ep.core.subscription import Subscription
+
+HUMAN = {"content": "hi", "channel_id": 1, "author": {"id": 2, "bot": False}}
+BOT = {"content": "beep", "channel_id": 1, "author": {"id": 3, "bot": True}}
+
+
+def test_true_matches_every_event_of_the_type():
+    subscription = Subscription({"MESSAGE_CREATE": True})
+
+    assert subscription.matches("MESSAGE_CREATE", HUMAN)
+    assert subscription.matches("MESSAGE_CREATE", None)
+    assert not subscription.matches("TYPING_START", HUMAN)
+    assert not subscription.matches(None, HUMAN)
+
+
+def test_wildcard_catches_other_types():
+    subscription = Subscription({"MESSAGE_CREATE": {"include": [{"channel_id": 2}]}, "*": True})
+
+    assert not subscription.matches("MESSAGE_CREATE", HUMAN)
+    assert subscription.matches("TYPING_START", HUMAN)
+    assert subscription.matches(None, HUMAN)
+
+
+def test_include_and_exclude_forms():
+    subscription = Subscription(
+        {
+            "MESSAGE_CREATE": {
+                "include": [{"channel_id": 1}],
+                "exclude": [{"author": {"bot": True}}],
+            }
+        }
+    )
+
+    assert subscription.matches("MESSAGE_CREATE", HUMAN)
+    assert not subscription.matches("MESSAGE_CREATE", BOT)
+    assert not subscription.matches("MESSAGE_CREATE", {**HUMAN, "channel_id": 2})
+
+
+def test_empty_form_only_requires_presence():
+    subscription = Subscription({"MESSAGE_CREATE": {"include": [{"author": {"id": {}}}]}})
+
+    assert subscription.matches("MESSAGE_CREATE", HUMAN)
+    assert not subscription.matches("MESSAGE_CREATE", {"author": {}})
+    assert not subscription.matches("MESSAGE_CREATE", {"author": 1})
+    assert not subscription.matches("MESSAGE_CREATE", "not a dict")
+
+
+def test_any_filter_of_a_list_may_pass():
+    subscription = Subscription(
+        {"MESSAGE_CREATE": [{"include": [{"channel_id": 2}]}, {"include": [{"author": {"bot": True}}]}]}
+    )
+
+    assert subscription.matches("MESSAGE_CREATE", BOT)
+    assert subscription.matches("MESSAGE_CREATE", {**HUMAN, "channel_id": 2})
+    assert not subscription.matches("MESSAGE_CREATE", HUMAN)
+
+
+def test_equal_subscriptions_share_a_key():
+    first = Subscription({"A": True, "B": {"include": [{"x": 1}]}})
+    second = Subscription({"B": {"include": [{"x": 1}]}, "A": True})
+
+    assert first.key == second.key
+    assert first.key != Subscription({"A": True}).key
+
+
+@pytest.mark.parametrize(
+    "events",
+    [
+        ["MESSAGE_CREATE"],
+        {"MESSAGE_CREATE": "yes"},
+        {"MESSAGE_CREATE": {"only": []}},
+        {"MESSAGE_CREATE": {"include": {"channel_id": 1}}},
+    ],
+)
+def test_malformed_filters(events):
+    with pytest.raises(ValueError):
+        Subscription(events)
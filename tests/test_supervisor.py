@@ -0,0 +1,93 @@
+import asyncio
+
+from ep.core.supervisor import TaskSupervisor
+
+
+class Owner:
+    __cog_name__ = "Owner"
+
+
+def supervisor():
+    supervisor = TaskSupervisor(asyncio.get_running_loop())
+    supervisor.backoff = 0.001
+    return supervisor
+
+
+def test_tasks_are_tracked_until_done():
+    async def main():
+        tasks = supervisor()
+        event = asyncio.Event()
+        task = tasks.spawn(event.wait(), name="wait")
+
+        assert len(tasks) == 1
+        assert [info.name for info in tasks.snapshot()] == ["wait"]
+
+        event.set()
+        await task
+        return len(tasks)
+
+    assert asyncio.run(main()) == 0
+
+
+def test_failures_are_logged_not_raised(caplog):
+    async def fail():
+        raise ValueError("boom")
+
+    async def main():
+        return await supervisor().spawn(fail(), name="fail")
+
+    assert asyncio.run(main()) is None
+    assert "Task 'fail' failed" in caplog.text
+
+
+def test_supervise_restarts_with_backoff():
+    calls = []
+
+    async def flaky():
+        calls.append(None)
+
+        if len(calls) < 3:
+            raise RuntimeError("again")
+
+        return "done"
+
+    async def main():
+        tasks = supervisor()
+        result = await tasks.supervise(flaky, name="flaky")
+        return result, tasks.restarts["flaky"]
+
+    assert asyncio.run(main()) == ("done", 2)
+
+
+def test_cancel_by_owner():
+    async def main():
+        tasks = supervisor()
+        owner = Owner()
+        owned = [tasks.spawn(asyncio.sleep(10), owner=owner) for _ in range(2)]
+        other = tasks.spawn(asyncio.sleep(10))
+        await asyncio.sleep(0)
+
+        assert tasks.stats()["Owner"]["count"] == 2
+
+        await tasks.cancel(owner)
+        cancelled = [task.cancelled() for task in owned]
+        await tasks.cancel()
+        return cancelled, other.cancelled(), await tasks.cancel()
+
+    assert asyncio.run(main()) == ([True, True], True, [])
+
+
+def test_cancel_spares_the_caller():
+    async def main():
+        tasks = supervisor()
+        other = tasks.spawn(asyncio.sleep(10))
+        await asyncio.sleep(0)
+
+        async def shutdown():
+            await tasks.cancel()
+            return "finished"
+
+        result = await tasks.spawn(shutdown())
+        return result, other.cancelled()
+
+    assert asyncio.run(main()) == ("finished", True)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from ep.core.codec import CODECS
+from ep.core.websocket import WebsocketServer, _Peer
+
+JSON = CODECS["json"]
+
+
+class Profiler:
+    running = False
+    samples = {}
+
+    def reset(self):
+        pass
+
+    def start(self):
+        self.running = True
+
+
+def server(**websocket):
+    client = SimpleNamespace(
+        config={"ep": {"websocket": {"replay_size": 0, **websocket}}},
+        logger=logging.getLogger("ep.tests"),
+        metrics=None,
+        profiler=Profiler(),
+        schedule_task=lambda coro, **_: asyncio.ensure_future(coro),
+    )
+    return WebsocketServer(client)
+
+
+def connect(server, control=False):
+    socket = object()
+    server._peers[socket] = peer = _Peer(socket, 16, "drop_oldest", JSON)
+    peer.control = control
+    return socket, peer
+
+
+def replies(peer):
+    return [JSON.decode(payload) for _, payload in peer.queue]
+
+
+@pytest.mark.parametrize("token, control", [(None, False), ("s3cret", False)])
+def test_control_commands_need_a_token(token, control):
+    wss = server(control_token=token)
+    socket, peer = connect(wss, control)
+
+    asyncio.run(wss.receive(socket, '{"op": "profile", "d": {"action": "start"}}'))
+
+    assert replies(peer) == [
+        {"op": 0, "t": "EP_PROFILE", "s": None, "d": {"error": "profile needs a control token"}}
+    ]
+    assert not wss._client.profiler.running
+
+
+def test_control_commands_run_for_control_clients():
+    wss = server(control_token="s3cret")
+    socket, peer = connect(wss, control=True)
+
+    asyncio.run(wss.receive(socket, '{"op": "profile", "d": {"action": "start"}}'))
+
+    assert wss._client.profiler.running
+    assert replies(peer)[0]["d"]["running"] is True
+
+
+def test_reading_commands_need_no_token():
+    wss = server()
+    socket, peer = connect(wss)
+
+    asyncio.run(wss.receive(socket, '{"op": "clients"}'))
+
+    assert replies(peer)[0]["t"] == "EP_CLIENTS"
+
+
+class Socket:
+    def __init__(self, *messages):
+        self.messages = list(messages)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.messages:
+            raise StopAsyncIteration
+
+        return self.messages.pop(0)
+
+    async def close(self, *_):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+@pytest.mark.parametrize(
+    "path, running", [("/?token=s3cret", True), ("/?token=guess", False), ("/", False)]
+)
+def test_clients_connect_with_the_control_token(path, running):
+    wss = server(control_token="s3cret")
+    socket = Socket('{"op": "profile", "d": {"action": "start"}}')
+
+    asyncio.run(wss.handler(socket, path))
+
+    assert wss._client.profiler.running is running
+
+
+@pytest.mark.parametrize(
+    "websocket, encoding",
+    [({}, "pickle"), ({"default_encoding": "json"}, "json"), ({"replay_encoding": "msgpack"}, "msgpack")],
+)
+def test_ring_uses_the_default_encoding(websocket, encoding):
+    wss = server(replay_size=4, **websocket)
+
+    assert wss.replay_encoding == encoding
+    wss.close()
+
+
+def test_clients_of_the_replay_encoding_reuse_the_ring_payload(monkeypatch):
+    encodes = []
+    encode = CODECS["pickle"].encode
+    codec = CODECS["pickle"]._replace(encode=lambda data: encodes.append(data) or encode(data))
+    monkeypatch.setitem(CODECS, "pickle", codec)
+    wss = server(replay_size=4)
+    socket = object()
+    wss._peers[socket] = peer = _Peer(socket, 16, "drop_oldest", codec)
+
+    asyncio.run(wss.broadcast({"op": 0, "t": "MESSAGE_CREATE", "s": 1, "d": {}}))
+
+    (_, payload), = peer.queue
+    assert len(encodes) == 1
+    assert wss.ring.last(1) == [(1, payload)]
+    wss.close()